@@ -5,32 +5,42 @@
 #############################################################################
 
 import asyncio
+import json
+import os
 import time
 from concurrent.futures import ThreadPoolExecutor
 
+from crawler.async_html_crawler import AsyncHtmlCrawler
 from crawler.config import CrawlerConfig
 from crawler.crawler import Crawler
 from logger.logger import get_logger
 
 LOGGER = get_logger()
-CONFIG = CrawlerConfig(LOGGER)
+# CRAWL_UNITS names a JSON/TOML/YAML units file replacing the built-in units (see units.example.toml)
+CONFIG = CrawlerConfig(LOGGER, crawler_class=AsyncHtmlCrawler, units_path=os.environ.get('CRAWL_UNITS'))
 CONCURRENCY = CONFIG.concurrency
 LOGGER.debug("concurrency = %s", CONCURRENCY)
 EXECUTOR = ThreadPoolExecutor(CONCURRENCY)
+# METRICS_FILE is written in the Prometheus text format at the end; METRICS_PORT serves it while crawling
+METRICS_FILE = os.environ.get('METRICS_FILE')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
 
 
 async def worker(name, queue):
     unit = await queue.get()
-    crawler: Crawler = unit['crawler']
+    crawler: Crawler = CONFIG.crawler(unit)
     try:
-        loop = asyncio.get_event_loop()
-        (files_downloaded, exceptions) = await loop.run_in_executor(
-            EXECUTOR, crawler.crawl, unit['targets'])
+        if asyncio.iscoroutinefunction(crawler.crawl):
+            (files_downloaded, exceptions) = await crawler.crawl(unit['targets'])
+        else:
+            loop = asyncio.get_event_loop()
+            (files_downloaded, exceptions) = await loop.run_in_executor(
+                EXECUTOR, crawler.crawl, unit['targets'])
         LOGGER.info("Downloaded %s files", files_downloaded)
         if exceptions:
             LOGGER.error("found %s errors!", len(exceptions))
             for ex in exceptions:
-                LOGGER.error(ex.message, ex)
+                LOGGER.error(ex)
     except Exception as ex:
         raise ex
     finally:
@@ -39,6 +49,8 @@ async def worker(name, queue):
 
 
 async def main():
+    if METRICS_PORT:
+        CONFIG.telemetry.serve(METRICS_PORT, host=os.environ.get('METRICS_HOST', '127.0.0.1'))
     # push our units of work onto the queue
     queue = asyncio.Queue(maxsize=CONCURRENCY)
     for unit in CONFIG.workload:
@@ -62,6 +74,9 @@ async def main():
     await asyncio.gather(*tasks, return_exceptions=True)
 
     LOGGER.info("Elapsed time: %.2f", elasped_time)
+    LOGGER.info("Telemetry: %s", json.dumps(CONFIG.telemetry.report(), indent=2))
+    if METRICS_FILE:
+        CONFIG.telemetry.write_prometheus(METRICS_FILE)
 
 
 if __name__ == "__main__":
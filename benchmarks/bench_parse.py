@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+""" Parse throughput of the link extractors over the saved fixture pages.
+
+Compares every registered extractor with the original approach of building a
+full BeautifulSoup tree and walking it once for img and once for a tags::
+
+    PYTHONPATH=. python3 benchmarks/bench_parse.py
+"""
+import glob
+import json
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from crawler.parsers import PARSERS, get_parser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'fixtures')
+ROUNDS = int(os.environ.get('ROUNDS', '20'))
+
+
+def full_tree(content: bytes):
+    soup = BeautifulSoup(content, 'html.parser')
+    return ([img.get('src') for img in soup.find_all('img')], [a.get('href') for a in soup.find_all('a')])
+
+
+def pages() -> list:
+    found = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, 'https*'))):
+        with open(path, 'rb') as file:
+            content = file.read()
+        if content[:512].lstrip().lower().startswith((b'<!doctype', b'<html')):
+            found.append(content)
+    return found
+
+
+def throughput(parse, contents: list) -> dict:
+    size = sum(len(content) for content in contents)
+    started_at = time.perf_counter()
+    for _ in range(ROUNDS):
+        for content in contents:
+            parse(content)
+    elapsed = time.perf_counter() - started_at
+    return {'pages_per_s': round(ROUNDS * len(contents) / elapsed, 1),
+            'mb_per_s': round(ROUNDS * size / elapsed / (1024 * 1024), 2)}
+
+
+def main():
+    contents = pages()
+    results = {'pages': len(contents), 'rounds': ROUNDS, 'parsers': {'bs4-full-tree': throughput(full_tree, contents)}}
+    for name in sorted(PARSERS):
+        try:
+            parser = get_parser(name)
+        except ValueError:  # optional dependency missing
+            continue
+        results['parsers'][name] = throughput(parser.parse, contents)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+""" Near-duplicate lookups among many stored perceptual hashes.
+
+Compares the multi-index HammingIndex with a vectorized scan of every hash::
+
+    PYTHONPATH=. IMAGES=1000000 python3 benchmarks/bench_phash.py
+"""
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from crawler.phash import HammingIndex, perceptual_hash
+
+IMAGES = int(os.environ.get('IMAGES', '1000000'))
+QUERIES = int(os.environ.get('QUERIES', '1000'))
+MAX_DISTANCE = int(os.environ.get('MAX_DISTANCE', '8'))
+
+
+def per_query_us(lookup, queries: list) -> float:
+    started_at = time.perf_counter()
+    for query in queries:
+        lookup(query)
+    return round((time.perf_counter() - started_at) / len(queries) * 1e6, 1)
+
+
+def main():
+    rng = random.Random(1)
+    values = [rng.getrandbits(64) for _ in range(IMAGES)]
+    started_at = time.perf_counter()
+    index = HammingIndex(MAX_DISTANCE)
+    for (num, value) in enumerate(values):
+        index.add(str(num), value)
+    build_seconds = time.perf_counter() - started_at
+    # half of the queries have a near-duplicate, half do not
+    queries = [values[rng.randrange(IMAGES)] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+               for _ in range(QUERIES // 2)] + [rng.getrandbits(64) for _ in range(QUERIES // 2)]
+    stored = np.array(values, dtype=np.uint64)
+
+    def scan(query: int):
+        return np.flatnonzero(np.bitwise_count(stored ^ np.uint64(query)) <= MAX_DISTANCE)
+
+    assert all(len(index.query(query)) == len(scan(query)) for query in queries[:50]), \
+        "the index should find what the scan finds"
+    pixels = np.random.default_rng(1).random((400, 311)) * 255
+    print(json.dumps({
+        'images': IMAGES,
+        'max_distance': MAX_DISTANCE,
+        'build_seconds': round(build_seconds, 2),
+        'index_us_per_query': per_query_us(index.query, queries),
+        'scan_us_per_query': per_query_us(scan, queries[::10]),
+        'phash_us_per_image': per_query_us(perceptual_hash, [pixels] * 100),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
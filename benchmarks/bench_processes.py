@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+""" Parse-bound crawl rate of the process runner by number of workers.
+
+Serves a synthetic site spread over HOSTS local servers (one host each, so
+pages shard across workers) whose pages are large enough that parsing, not the
+network, dominates. The crawl rate should grow with the workers up to the
+number of CPU cores::
+
+    PYTHONPATH=. WORKERS=1,2,4 python3 benchmarks/bench_processes.py
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawler.process_runner import ProcessRunner
+from logger.logger import get_logger
+
+HOSTS = int(os.environ.get('HOSTS', '8'))
+PAGES = int(os.environ.get('PAGES', '25'))  # pages per host
+FILLER = int(os.environ.get('FILLER', '4000'))  # tags per page the parser has to get through
+WORKERS = [int(workers) for workers in os.environ.get('WORKERS', '1,2,4').split(',')]
+PARSER = os.environ.get('PARSER', 'html.parser')
+
+
+class Handler(BaseHTTPRequestHandler):
+    hosts = []
+    filler = ''.join(f'<div class="row"><span title="cell {num}">cell {num}</span></div>' for num in range(FILLER))
+
+    def do_GET(self):  # pylint: disable=C0103
+        if self.path.endswith('.png'):
+            self._send(self.path.encode('utf-8'), 'image/png')
+            return
+        links = ''.join(f'<a href="{host}/page{page}">p</a>' for host in self.hosts for page in range(PAGES))
+        html = f'<html><body><img src="{self.path}.png">{self.filler}{links}</body></html>'
+        self._send(html.encode('utf-8'), 'text/html')
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+def main():
+    servers = [ThreadingHTTPServer(('127.0.0.1', 0), Handler) for _ in range(HOSTS)]
+    Handler.hosts = [f'http://127.0.0.1:{server.server_address[1]}' for server in servers]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = {'cpus': multiprocessing.cpu_count(), 'hosts': HOSTS, 'pages': HOSTS * PAGES + 1, 'parser': PARSER,
+               'runs': []}
+    for workers in WORKERS:
+        with tempfile.TemporaryDirectory() as output:
+            runner = ProcessRunner(get_logger(), workers=workers, think_time=0, max_depth=1, parser=PARSER,
+                                   output=output)
+            started_at = time.monotonic()
+            (files_downloaded, exceptions) = runner.crawl([Handler.hosts[0]])
+            elapsed = time.monotonic() - started_at
+        results['runs'].append({'workers': workers, 'seconds': round(elapsed, 2),
+                                'pages_per_s': round(runner.stats.get('pages', 0) / elapsed, 1),
+                                'parse_seconds': round(runner.stats.get('parse_seconds', 0), 2),
+                                'files': files_downloaded, 'errors': len(exceptions)})
+    for server in servers:
+        server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
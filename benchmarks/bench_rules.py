@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+""" Per-link cost of the ignore/follow rules with many patterns.
+
+Compares the compiled RuleSet with the original loop over substring patterns::
+
+    PYTHONPATH=. PATTERNS=10000 python3 benchmarks/bench_rules.py
+"""
+import json
+import os
+import random
+import string
+import time
+
+from crawler.rules import RuleSet
+
+PATTERNS = int(os.environ.get('PATTERNS', '10000'))
+LINKS = int(os.environ.get('LINKS', '10000'))
+ALPHABET = string.ascii_lowercase + '/._-'
+
+
+def substring_loop(patterns: list, url: str) -> bool:
+    for pattern in patterns:
+        if pattern in url:
+            return True
+    return False
+
+
+def per_link_us(match, links: list) -> float:
+    started_at = time.perf_counter()
+    for link in links:
+        match(link)
+    return round((time.perf_counter() - started_at) / len(links) * 1e6, 2)
+
+
+def main():
+    rng = random.Random(1)
+    patterns = [''.join(rng.choices(ALPHABET, k=rng.randint(8, 30))) for _ in range(PATTERNS)]
+    links = [f'https://www.fbi.gov/wanted/{"".join(rng.choices(ALPHABET, k=60))}' for _ in range(LINKS)]
+    links += [f'https://www.fbi.gov/{pattern}' for pattern in rng.sample(patterns, min(100, PATTERNS))]
+    started_at = time.perf_counter()
+    rules = RuleSet(patterns)
+    compile_seconds = time.perf_counter() - started_at
+    sample = links[-200:]
+    assert [rules.matches(link) for link in sample] == [substring_loop(patterns, link) for link in sample], \
+        "the compiled rules should match what the loop matches"
+    print(json.dumps({
+        'patterns': PATTERNS,
+        'links': len(links),
+        'compile_seconds': round(compile_seconds, 3),
+        'rules_us_per_link': per_link_us(rules.matches, links),
+        'loop_us_per_link': per_link_us(lambda link: substring_loop(patterns, link), links[::20]),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
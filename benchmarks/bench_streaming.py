@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+""" Peak RSS while downloading large images from a local server.
+
+Serves FILES distinct bodies of FILE_MB megabytes each and downloads them with
+``HtmlCrawler.download_file``; peak RSS is sampled after every file and should
+stay flat instead of growing with the body size::
+
+    PYTHONPATH=. python3 benchmarks/bench_streaming.py
+"""
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawler.html_crawler import HtmlCrawler
+from logger.logger import get_logger
+
+FILE_MB = int(os.environ.get('FILE_MB', '100'))
+FILES = int(os.environ.get('FILES', '3'))
+CHUNK = 64 * 1024
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _headers(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(FILE_MB * 1024 * 1024))
+        self.end_headers()
+
+    def do_HEAD(self):  # pylint: disable=C0103
+        self._headers()
+
+    def do_GET(self):  # pylint: disable=C0103
+        self._headers()
+        chunk = self.path.encode('utf-8').ljust(CHUNK, b'\0')  # distinct body per path
+        for _ in range(FILE_MB * 1024 * 1024 // CHUNK):
+            self.wfile.write(chunk)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{httpd.server_address[1]}'
+    results = {'file_mb': FILE_MB, 'files': FILES, 'baseline_rss_mb': round(peak_rss_mb(), 1), 'peak_rss_mb': []}
+    with tempfile.TemporaryDirectory() as output:
+        crawler = HtmlCrawler(get_logger(), think_time=0, output=output)
+        started_at = time.monotonic()
+        for num in range(FILES):
+            crawler.download_file(f'{base}/image-{num}.png')
+            results['peak_rss_mb'].append(round(peak_rss_mb(), 1))
+        elapsed = time.monotonic() - started_at
+    httpd.shutdown()
+    results['mb_per_second'] = round(FILE_MB * FILES / elapsed, 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
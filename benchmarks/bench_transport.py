@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+""" TLS handshakes and throughput of per-crawler sessions versus a shared transport.
+
+Serves the synthetic site over TLS with a throwaway certificate (needs the
+openssl command) and downloads every image of it from several crawlers, each
+with its own download threads::
+
+    PYTHONPATH=. CRAWLERS=4 THREADS=8 python3 benchmarks/bench_transport.py
+"""
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic_site import SyntheticSite
+from crawler.html_crawler import HtmlCrawler
+from crawler.transport import Transport
+from logger.logger import get_logger
+
+CRAWLERS = int(os.environ.get('CRAWLERS', '4'))
+THREADS = int(os.environ.get('THREADS', '8'))
+IMAGES = int(os.environ.get('IMAGES', '400'))
+LATENCY_MS = float(os.environ.get('LATENCY_MS', '20'))
+
+
+def certificate(directory: str) -> (str, str):
+    (cert, key) = (os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem'))
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+                    '-days', '1', '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1'],
+                   check=True, capture_output=True)
+    return (cert, key)
+
+
+def run(site: SyntheticSite, url: str, transports: list, output: str) -> dict:
+    crawlers = [HtmlCrawler(get_logger(), think_time=0, http_retries=0, output=os.path.join(output, str(num)),
+                            transport=transport) for (num, transport) in enumerate(transports)]
+    images = [f'{url}image/{num}.png' for num in range(IMAGES)]
+    connections = site.connections
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(CRAWLERS * THREADS) as executor:
+        list(executor.map(lambda args: crawlers[args[0] % CRAWLERS].download_file(args[1]), enumerate(images)))
+    elapsed = time.perf_counter() - started_at
+    stats = [transport.stats() for transport in {id(transport): transport for transport in transports}.values()]
+    return {'seconds': round(elapsed, 3), 'images_per_s': round(IMAGES / elapsed, 1),
+            'handshakes': site.connections - connections,
+            'reuse_ratio': [transport_stats['reuse_ratio'] for transport_stats in stats]}
+
+
+def main():
+    site = SyntheticSite(pages=1, images_per_page=IMAGES, shared_images=0, image_kb=8, latency_ms=LATENCY_MS)
+    with tempfile.TemporaryDirectory() as directory:
+        (cert, key) = certificate(directory)
+        os.environ['REQUESTS_CA_BUNDLE'] = cert  # requests prefers it over Session.verify
+        url = site.start(certfile=cert, keyfile=key)
+        try:
+            results = {
+                'per_crawler_default_pools': run(site, url, [Transport(http_retries=0) for _ in range(CRAWLERS)],
+                                                 os.path.join(directory, 'a')),
+                'shared_transport': run(site, url, [Transport(http_retries=0, pool_maxsize=CRAWLERS * THREADS)]
+                                        * CRAWLERS, os.path.join(directory, 'b')),
+            }
+        finally:
+            site.stop()
+    print(json.dumps({'crawlers': CRAWLERS, 'threads_per_crawler': THREADS, 'images': IMAGES, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+""" Crawler benchmark suite against a local synthetic web site.
+
+Every mode crawls the same seeded site in a fresh process with ``think_time=0``
+and reports pages/sec, images/sec, peak RSS and CPU time. Results are written
+to a JSON file named after the current commit so runs can be compared::
+
+    PYTHONPATH=. python3 benchmarks/run.py --pages 500 --latency-ms 10 --modes sync,async,processes
+    PYTHONPATH=. python3 benchmarks/run.py --compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_site import SyntheticSite
+
+MODES = ('sync', 'async', 'processes')
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def rss_mb(usage) -> float:
+    return usage.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+
+
+def crawl(mode: str, url: str, options: dict, output: str):
+    """ Run one crawl; returns (telemetry, files downloaded, errors).
+    """
+    from crawler.async_html_crawler import AsyncHtmlCrawler  # pylint: disable=C0415
+    from crawler.html_crawler import HtmlCrawler  # pylint: disable=C0415
+    from crawler.process_runner import ProcessRunner  # pylint: disable=C0415
+    from logger.logger import get_logger  # pylint: disable=C0415
+
+    kwargs = {'think_time': 0, 'max_depth': options['depth'], 'http_retries': 0, 'retry_backoff': 0,
+              'output': output}
+    if mode == 'sync':
+        crawler = HtmlCrawler(get_logger(), **kwargs)
+        (files, exceptions) = crawler.crawl([url])
+    elif mode == 'async':
+        crawler = AsyncHtmlCrawler(get_logger(), concurrency=options['concurrency'], **kwargs)
+        (files, exceptions) = asyncio.run(crawler.crawl([url]))
+    elif mode == 'processes':
+        crawler = ProcessRunner(get_logger(), workers=options['workers'], **kwargs)
+        (files, exceptions) = crawler.crawl([url])
+    else:
+        raise ValueError(f"unknown mode: {mode}")
+    return (crawler.telemetry, files, len(exceptions))
+
+
+def run_mode(mode: str, url: str, options: dict, results):
+    """ Child process: crawl once and report throughput and resource usage.
+    """
+    with tempfile.TemporaryDirectory() as output:
+        started_at = time.monotonic()
+        (telemetry, files, errors) = crawl(mode, url, options, output)
+        elapsed = time.monotonic() - started_at
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    pages = telemetry.counter('pages_total')
+    images = telemetry.counter('images_total')
+    statuses = telemetry.export()['counters'].get('responses_total', {})
+    results.put({
+        'mode': mode,
+        'seconds': round(elapsed, 3),
+        'pages': pages,
+        'images': images,
+        'files_downloaded': files,
+        'exceptions': errors,
+        'http_errors': sum(count for (labels, count) in statuses.items() if int(dict(labels)['status']) >= 400),
+        'pages_per_s': round(pages / elapsed, 2),
+        'images_per_s': round(images / elapsed, 2),
+        'bytes_per_s': round(telemetry.counter('downloaded_bytes_total') / elapsed),
+        'peak_rss_mb': round(max(rss_mb(own), rss_mb(children)), 1),
+        'cpu_seconds': round(own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime, 3),
+        'p95_request_seconds': telemetry.histogram('request_seconds').quantile(0.95),
+    })
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """ Print the candidate/baseline ratio of every metric of every mode.
+    """
+    with open(baseline_path) as file:
+        baseline = {run['mode']: run for run in json.load(file)['runs']}
+    with open(candidate_path) as file:
+        candidate = {run['mode']: run for run in json.load(file)['runs']}
+    ratios = {}
+    for mode in sorted(set(baseline) & set(candidate)):
+        ratios[mode] = {metric: round(candidate[mode][metric] / baseline[mode][metric], 3)
+                        for metric in ('pages_per_s', 'images_per_s', 'peak_rss_mb', 'cpu_seconds')
+                        if baseline[mode].get(metric)}
+    print(json.dumps(ratios, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawler against a local synthetic site.')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--fanout', type=int, default=5, help='links per page')
+    parser.add_argument('--depth', type=int, default=None, help='crawl depth; defaults to the whole site')
+    parser.add_argument('--images-per-page', type=int, default=4)
+    parser.add_argument('--shared-images', type=int, default=1, help='images embedded by every page')
+    parser.add_argument('--image-kb', type=float, default=32, help='median image size')
+    parser.add_argument('--image-sigma', type=float, default=0.5, help='log-normal spread of image sizes')
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--concurrency', type=int, default=20, help='async requests in flight')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='processes mode workers')
+    parser.add_argument('--output', help='results file; defaults to benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    site = SyntheticSite(pages=args.pages, fanout=args.fanout, images_per_page=args.images_per_page,
+                         shared_images=args.shared_images, image_kb=args.image_kb, image_sigma=args.image_sigma,
+                         latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                         error_status=args.error_status, seed=args.seed)
+    depth = site.depth() if args.depth is None else args.depth
+    options = {'depth': depth, 'concurrency': args.concurrency, 'workers': args.workers}
+    (pages, images) = site.reachable(depth)
+    settings = {key: value for (key, value) in vars(args).items() if key not in ('modes', 'output', 'compare')}
+    results = {'commit': commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+               'cpus': multiprocessing.cpu_count(),
+               'site': {**settings, 'depth': depth, 'reachable_pages': pages, 'reachable_images': images},
+               'runs': []}
+    url = site.start()
+    context = multiprocessing.get_context('spawn')  # fresh interpreter per mode for clean RSS and CPU figures
+    try:
+        for mode in args.modes.split(','):
+            queue = context.Queue()
+            child = context.Process(target=run_mode, args=(mode, url, options, queue))
+            child.start()
+            results['runs'].append(queue.get())
+            child.join()
+    finally:
+        site.stop()
+    output = args.output or os.path.join(RESULTS, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps(results['runs'], indent=2))
+    print(f'results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
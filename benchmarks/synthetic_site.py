@@ -0,0 +1,159 @@
+""" Deterministic synthetic web site for benchmarks.
+
+Page ``/page/<n>`` links to its ``fanout`` children in a breadth-first tree,
+so every page is reachable and the tree depth grows with log(pages). Every
+page embeds ``images_per_page`` images of its own, sized from a seeded
+log-normal distribution, and ``shared_images`` images that all pages use
+(logos, icons). Requests can be slowed down by a fixed latency plus jitter,
+and a seeded share of them fails with ``error_status``. Connections are kept
+alive and can be served over TLS; ``connections`` counts the ones accepted
+(TCP/TLS handshakes).
+"""
+import hashlib
+import math
+import random
+import ssl
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK = 64 * 1024
+
+
+class SyntheticSite:  # pylint: disable=R0902
+    def __init__(self, pages=200, fanout=5, images_per_page=4, shared_images=1, image_kb=32, image_sigma=0.5,
+                 latency_ms=5.0, jitter_ms=0.0, error_rate=0.0, error_status=503, seed=1):
+        self.pages = pages
+        self.fanout = fanout
+        self.images_per_page = images_per_page
+        self.shared_images = shared_images
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        rng = random.Random(seed)
+        mean = math.log(image_kb * 1024)
+        self.image_sizes = [max(64, int(rng.lognormvariate(mean, image_sigma)))
+                            for _ in range(pages * images_per_page + shared_images)]
+        self.requests = Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer = None
+
+    def depth(self) -> int:
+        """ Depth of the deepest page below the home page.
+        """
+        (depth, last, width) = (0, 0, 1)
+        while last < self.pages - 1:
+            width *= self.fanout
+            last += width
+            depth += 1
+        return depth
+
+    def reachable(self, max_depth: int) -> (int, int):
+        """ Pages and distinct images a crawl down to max_depth finds.
+        """
+        (pages, width) = (0, 1)
+        for _ in range(max_depth + 1):
+            pages += width
+            width *= self.fanout
+        pages = min(pages, self.pages)
+        return (pages, pages * self.images_per_page + self.shared_images)
+
+    def fails(self, path: str) -> bool:
+        """ Does the request fail? Stable for a seed so runs stay comparable.
+        """
+        if not self.error_rate:
+            return False
+        digest = hashlib.sha1(f'{self.seed}:{path}'.encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'big') / 2 ** 32 < self.error_rate
+
+    def page(self, num: int) -> bytes:
+        children = range(num * self.fanout + 1, min(num * self.fanout + self.fanout, self.pages - 1) + 1)
+        links = ''.join(f'<li><a href="/page/{child}">page {child}</a></li>' for child in children)
+        own = range(self.shared_images + num * self.images_per_page,
+                    self.shared_images + (num + 1) * self.images_per_page)
+        images = ''.join(f'<img src="/image/{image}.png" alt="image {image}">'
+                         for image in list(range(self.shared_images)) + list(own))
+        return (f'<!DOCTYPE html><html><head><title>page {num}</title></head>'
+                f'<body><h1>page {num}</h1>{images}<ul>{links}</ul></body></html>').encode('utf-8')
+
+    def image_chunks(self, num: int):
+        """ Body of an image, distinct per image, in chunks.
+        """
+        size = self.image_sizes[num]
+        pattern = hashlib.sha256(f'{self.seed}:{num}'.encode('utf-8')).digest() * (CHUNK // 32)
+        for offset in range(0, size, CHUNK):
+            yield pattern[:min(CHUNK, size - offset)]
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_GET(self):  # pylint: disable=C0103
+                with site._lock:  # pylint: disable=W0212
+                    site.requests[self.path.split('/')[1] or 'page'] += 1
+                if site.latency_ms or site.jitter_ms:
+                    time.sleep((site.latency_ms + random.uniform(-site.jitter_ms, site.jitter_ms)) / 1000)
+                parts = self.path.strip('/').split('/')
+                if site.fails(self.path):
+                    self.send_error(site.error_status)
+                elif parts == ['']:
+                    self._send(site.page(0), 'text/html; charset=utf-8')
+                elif len(parts) == 2 and parts[0] == 'page' and parts[1].isdigit() and int(parts[1]) < site.pages:
+                    self._send(site.page(int(parts[1])), 'text/html; charset=utf-8')
+                elif len(parts) == 2 and parts[0] == 'image' and parts[1][:-len('.png')].isdigit() \
+                        and int(parts[1][:-len('.png')]) < len(site.image_sizes):
+                    num = int(parts[1][:-len('.png')])
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/png')
+                    self.send_header('Content-Length', str(site.image_sizes[num]))
+                    self.end_headers()
+                    for chunk in site.image_chunks(num):
+                        self.wfile.write(chunk)
+                else:
+                    self.send_error(404)
+
+            def _send(self, body: bytes, content_type: str):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=W0221
+                pass
+
+        return Handler
+
+    def start(self, host: str = '127.0.0.1', port: int = 0, certfile: str = None, keyfile: str = None) -> str:
+        """ Serve the site from a daemon thread, over TLS with a certificate; returns its base URL.
+        """
+        site = self
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def get_request(self):
+                request = super().get_request()
+                with site._lock:  # pylint: disable=W0212
+                    site.connections += 1
+                return request
+
+        self._server = Server((host, port), self.handler())
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        threading.Thread(target=self._server.serve_forever, name='synthetic-site', daemon=True).start()
+        return f'{"https" if certfile else "http"}://{host}:{self._server.server_address[1]}/'
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
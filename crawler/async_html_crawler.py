@@ -0,0 +1,284 @@
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from logging import Logger
+from typing import Callable, List, Set
+
+import aiohttp
+
+from .blob_store import BlobWriter
+from .frontier import Frontier
+from .health import RETRY_STATUSES, CircuitOpen, RetryableError, RetryQueue, is_retryable
+from .html_crawler import HtmlCrawler
+from .scheduler import host_key, parse_retry_after
+
+
+class _NullAsyncContext:  # pylint: disable=R0903
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+Fetched = namedtuple('Fetched', ['url', 'status', 'reason', 'headers', 'content'])
+
+
+class AsyncHtmlCrawler(HtmlCrawler):
+    """ Inherits from HtmlCrawler; fetches pages and images on a single event loop.
+
+    All requests issued by one ``crawl`` call share a non-blocking
+    ``aiohttp`` session and are bounded by ``concurrency`` in-flight requests.
+    """
+
+    def __init__(self, logger: Logger, concurrency=100, **kwargs):
+        super().__init__(logger, **kwargs)
+        self.concurrency = concurrency  # max in-flight requests per crawl
+        self._semaphore: asyncio.Semaphore = None
+        self._render_executor: ThreadPoolExecutor = None
+
+    async def _request_async(self, session: aiohttp.ClientSession, method: str, url: str, headers: dict = None,
+                             open_body: Callable[[dict], BlobWriter] = None, **kwargs) -> Fetched:
+        """ Send a request once the host's politeness slot is free; 429 responses slow the host down.
+
+        Waiting for a host happens outside of the concurrency limit, so a cooling
+        host never holds slots needed by requests to other hosts. The body of a
+        successful GET is streamed into the writer returned by open_body (skipped
+        if it returns None) and returned as content; without open_body it is read
+        into memory.
+        """
+        headers = {**self.headers, **headers} if headers else self.headers
+        host = host_key(url)
+        self.health.check(url)
+        for _ in range(self.http_retries + 1):
+            with self.telemetry.timer('think_seconds', host=host):
+                await self.scheduler.wait_async(url)
+            async with self._semaphore, self._health(url):
+                started_at = time.perf_counter()
+                async with session.request(method, url, headers=headers, **kwargs) as res:
+                    latency = time.perf_counter() - started_at
+                    self.telemetry.observe('request_seconds', latency, method=method, host=host)
+                    self.health.record(url, failed=res.status in RETRY_STATUSES, latency=latency)
+                    self.telemetry.count('responses_total', status=res.status)
+                    content = None
+                    if method == 'GET' and res.status == 200:
+                        if open_body is None:
+                            content = await res.read()
+                        else:
+                            content = open_body(dict(res.headers))
+                            if content:
+                                async for chunk in res.content.iter_chunked(self.chunk_size):
+                                    content.write(chunk)
+                    fetched = Fetched(str(res.url), res.status, res.reason, dict(res.headers), content)
+            if fetched.status != 429:
+                self.scheduler.recover(url)
+                break
+            retry_after = parse_retry_after(fetched.headers.get('Retry-After'))
+            self._logger.info("rate limited: %s ; retry_after=%s", url, retry_after)
+            self.scheduler.backoff(url, retry_after)
+        return fetched
+
+    @asynccontextmanager
+    async def _health(self, url: str):
+        """ Record connection errors with the host health.
+        """
+        try:
+            yield
+        except aiohttp.ClientConnectionError:
+            self.health.record(url, failed=True)
+            raise
+
+    def reserve_memory_async(self, size: int):
+        """ Hold size bytes of the shared byte budget, if any, without blocking the event loop.
+        """
+        return self.byte_budget.reserve_async(size) if self.byte_budget else _NullAsyncContext()
+
+    async def fetch_async(self, session: aiohttp.ClientSession, url: str, accept: Callable[[dict], bool] = None) -> dict:
+        """ Fetch an asset into the blob store with a single conditional GET; returns its metadata.
+        """
+        metadata = self.index.get(url)
+        conditional = self.validators(metadata)
+        writer = self.store.writer(max_size=self.max_asset_bytes)
+
+        def open_body(headers: dict) -> BlobWriter:
+            if accept and not accept(headers):
+                return None
+            # pages are always read; see HtmlCrawler.fetch
+            if accept is None and self.unchanged(headers, conditional) and self.cached(headers, metadata):
+                return None
+            self.check_size(url, headers)
+            return writer
+
+        async with self.reserve_memory_async(self.buffer_size({})):
+            try:
+                res = await self._request_async(session, 'GET', url, headers=conditional, open_body=open_body,
+                                                allow_redirects=True)
+                self.revalidation['requests'] += 1
+                self.revalidation['round_trips_saved'] += 1  # a HEAD used to precede every GET
+                if conditional:
+                    self.revalidation['conditional'] += 1
+                    if res.status == 304:
+                        self.not_modified(url, metadata)
+                        return metadata
+                if res.status in RETRY_STATUSES:
+                    raise RetryableError(url, res.status)
+                if res.status != 200:
+                    self._logger.info("ignored url: %s ; status_code=%s", url, res.status)
+                    return None
+                if not res.content:  # rejected by accept or unchanged
+                    return None if accept and not accept(res.headers) else metadata
+                ext = self.guess_file_extension(res.headers.get('Content-Type'))
+                (destination, blob_digest, size) = writer.commit(ext)
+                self.downloaded(url, size)
+            finally:
+                writer.abort()
+        metadata = {
+            'url': res.url,
+            'headers': res.headers,
+            'status_code': res.status,
+            'reason': res.reason,
+            'blob': destination,
+            'blob_digest': blob_digest,
+            'size': size,
+        }
+        self._logger.info("write file: %s", destination)
+        self.index.put(url, metadata)
+        self.digester.submit(self.index, url, metadata)
+        return metadata
+
+    async def fetch_content(self, session: aiohttp.ClientSession, url: str) -> bytes:
+        """ Download and return page content.
+        """
+        self._logger.info("url: %s", url)
+        if self.render:  # selenium is blocking; render in pooled browsers off the event loop
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self._render_executor, self.get_content, url)
+
+        content = None
+        metadata = await self.fetch_async(session, url, accept=self.is_html)
+        if metadata:
+            with open(metadata['blob'], 'rb') as file:
+                content = file.read()
+        if content:
+            self.telemetry.count('pages_total', host=host_key(url))
+        return content
+
+    async def fetch_file(self, session: aiohttp.ClientSession, url: str) -> str:
+        """ Download a file from a URL to the content-addressed store; returns the blob path.
+        """
+        metadata = await self.fetch_async(session, url)
+        if metadata:
+            self.telemetry.count('images_total', host=host_key(url))
+        return metadata['blob'] if metadata else None
+
+    def fetch_due(self, frontier: Frontier, batch: List[tuple]) -> List[tuple]:
+        """ Queue the stored links of pages not due for a revisit; returns the pages to fetch.
+        """
+        due = []
+        for (page, depth) in batch:
+            links = self.revisit(page)
+            if links is None:
+                due.append((page, depth))
+            else:
+                self.queue_links(frontier, page, depth, links, revisited=True)
+                frontier.done(page)
+        return due
+
+    def defer(self, retries: RetryQueue, item: tuple, ex: Exception) -> bool:
+        """ Put a transiently failed page or image on the retry queue; False if it is not retried.
+        """
+        sent = not isinstance(ex, CircuitOpen)
+        retryable = is_retryable(ex) or isinstance(ex, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+        if not retryable or not retries.defer(item, getattr(ex, 'retry_in', 0.0), sent):
+            return False
+        self._logger.info("retrying %s later: %s", item[1], ex)
+        return True
+
+    @staticmethod
+    async def pop_due(retries: RetryQueue, wait: bool) -> List[tuple]:
+        """ Deferred items that are due; with wait, sleeps until the next one is.
+        """
+        if wait and len(retries):
+            await asyncio.sleep(retries.next_due_in())
+        return [item[1:] for item in retries.pop_due()]
+
+    async def crawl_pages(self, session: aiohttp.ClientSession, frontier: Frontier, exceptions: List[Exception],
+                          retries: RetryQueue) -> Set[str]:
+        """ Breadth-first crawl for img tags; up to ``concurrency`` queued pages are fetched at once.
+
+        Pages that fail transiently are deferred and fetched again with a later batch.
+        """
+        batch = frontier.pop_many(self.concurrency)
+        while batch or len(retries):
+            batch = self.fetch_due(frontier, batch + await self.pop_due(retries, wait=not batch))
+            contents = await asyncio.gather(*(self.fetch_content(session, page) for (page, _) in batch),
+                                            return_exceptions=True)
+            for (page, depth), content in zip(batch, contents):
+                if isinstance(content, Exception) and self.defer(retries, ('page', page, depth), content):
+                    continue
+                frontier.done(page)
+                if isinstance(content, Exception):
+                    self._logger.warning("failed to fetch %s: %s", page, content)
+                    exceptions.append(content)
+                    continue
+                if not content:
+                    continue
+                self.enqueue_links(frontier, page, depth, content)
+            batch = frontier.pop_many(self.concurrency)
+        return frontier.images()
+
+    async def fetch_files(self, session: aiohttp.ClientSession, frontier: Frontier, img_urls: List[str],
+                          exceptions: List[Exception], retries: RetryQueue) -> int:
+        """ Download images concurrently; returns the number of files downloaded.
+
+        Images that fail transiently are deferred and downloaded again once they are due.
+        """
+        files_downloaded = 0
+        while img_urls or len(retries):
+            img_urls += [url for (url,) in await self.pop_due(retries, wait=not img_urls)]
+            results = await asyncio.gather(*(self.fetch_file(session, img_url) for img_url in img_urls),
+                                           return_exceptions=True)
+            for img_url, result in zip(img_urls, results):
+                if isinstance(result, Exception):
+                    if not self.defer(retries, ('image', img_url), result):
+                        exceptions.append(result)
+                elif result:
+                    files_downloaded += 1
+                    frontier.image_done(img_url)
+            img_urls = []
+        return files_downloaded
+
+    async def crawl(self, urls: List[str]) -> (int, List[Exception]):
+        """ Search the HTML for img tags and download all images concurrently.
+        """
+        exceptions = []
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.render:
+            self._render_executor = ThreadPoolExecutor(self.render_pool_size)
+        frontier = self.new_frontier()
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        try:
+            timeout = aiohttp.ClientTimeout(sock_connect=self.request_timeout, sock_read=self.request_timeout)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                for url in urls:
+                    self.enqueue(frontier, url)
+                retries = RetryQueue(max_attempts=self.http_retries, base_delay=self.retry_backoff)
+                img_urls = list(await self.crawl_pages(session, frontier, exceptions, retries))
+                files_downloaded = await self.fetch_files(session, frontier, img_urls, exceptions, retries)
+            if not exceptions:
+                frontier.clear()  # crawl completed; the next run starts from the targets again
+        finally:
+            frontier.close()
+            self.flush_index()
+            if self._render_executor:
+                self._render_executor.shutdown()
+                self._render_executor = None
+            self.shutdown_selenium()
+        self._logger.info("canonicalization: %s", self.canonicalizer.stats)
+        self._logger.info("blob store: %s", self.store.stats)
+        self._logger.info("digests: %s", self.digester.stats)
+        self._logger.info("revalidation: %s", dict(self.revalidation))
+        self._logger.info("caches: %s", self.cache_stats())
+        return (files_downloaded, exceptions)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+""" Content-addressed blob store.
+
+Blobs no asset of the metadata index refers to any more (near-duplicates
+skipped after download, for instance) are removed with::
+
+    python3 -m crawler.blob_store output [--index output/index.sqlite] [--min-age 3600]
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Iterable, Set, Tuple
+
+from .metadata_index import MetadataIndex
+
+
+class AssetTooLarge(Exception):
+    """ Raised when an asset exceeds the per-asset size cap.
+    """
+
+
+class BlobWriter:
+    """ Incrementally hashes and buffers one body for a BlobStore.
+
+    Bodies up to the store's ``spool_size`` are held in memory until the hash is
+    known, so a duplicate never touches the disk; larger bodies spill to a temp
+    file in the store, so memory per download never exceeds ``spool_size``.
+    """
+
+    def __init__(self, store: 'BlobStore', max_size: int = None):
+        self.store = store
+        self.max_size = max_size
+        self.size = 0
+        self._hasher = hashlib.new(store.algorithm)
+        self._spool = []
+        self._temp_file = None
+        self._temp_path: str = None
+
+    def write(self, chunk: bytes):
+        """ Append a chunk of the body.
+        """
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise AssetTooLarge(f"asset exceeds {self.max_size} bytes")
+        self._hasher.update(chunk)
+        if self._temp_file:
+            self._temp_file.write(chunk)
+            return
+        self._spool.append(chunk)
+        if self.size > self.store.spool_size:  # too big to hold; spill to disk
+            self._open_temp()
+            self._temp_file.writelines(self._spool)
+            self._spool = []
+
+    def _open_temp(self):
+        os.makedirs(self.store.root, exist_ok=True)
+        (handle, self._temp_path) = tempfile.mkstemp(dir=self.store.root, prefix='.blob-')
+        self._temp_file = os.fdopen(handle, 'wb')
+
+    def commit(self, ext: str = None) -> Tuple[str, str, int]:
+        """ Atomically move the body into place unless an identical blob exists; returns (path, digest, size).
+        """
+        try:
+            digest = self._hasher.hexdigest()
+            destination = self.store.blob_path(digest, ext)
+            if os.path.exists(destination):
+                self.store.record(self.size, duplicate=True)
+                return (destination, digest, self.size)
+            if not self._temp_file:
+                self._open_temp()
+                self._temp_file.writelines(self._spool)
+            self._temp_file.close()
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(self._temp_path, destination)
+            self._temp_path = None
+            self.store.record(self.size, duplicate=False)
+            return (destination, digest, self.size)
+        finally:
+            self.abort()
+
+    def abort(self):
+        """ Discard anything buffered for the body.
+        """
+        self._spool = []
+        if self._temp_file:
+            self._temp_file.close()
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._temp_path = None
+
+
+class BlobStore:
+    """ Content-addressed asset store; every distinct body is written once.
+
+    Blobs are named by the hash of their bytes, computed while the body streams
+    in through a ``BlobWriter``.
+    """
+
+    def __init__(self, root='output', algorithm='sha256', spool_size=1024 * 1024):
+        self.root = root
+        self.algorithm = algorithm
+        self.spool_size = spool_size  # max bytes of one body held in memory
+        self.blobs_written = 0
+        self.bytes_written = 0
+        self.duplicates = 0
+        self.bytes_deduped = 0
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str, ext: str = None) -> str:
+        """ Path of the blob with the given content digest.
+        """
+        return os.path.join(self.root, 'blobs', digest[:2], digest + (ext or ''))
+
+    def writer(self, max_size: int = None) -> BlobWriter:
+        """ Start streaming a new body into the store.
+        """
+        return BlobWriter(self, max_size)
+
+    def put(self, chunks: Iterable[bytes], ext: str = None, max_size: int = None) -> Tuple[str, str, int]:
+        """ Store a body given as chunks; returns (path, digest, size).
+        """
+        writer = self.writer(max_size)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit(ext)
+
+    def record(self, size: int, duplicate: bool):
+        """ Account for a committed body.
+        """
+        with self._lock:
+            if duplicate:
+                self.duplicates += 1
+                self.bytes_deduped += size
+            else:
+                self.blobs_written += 1
+                self.bytes_written += size
+
+    def collect(self, referenced: Set[str], min_age: float = 3600.0) -> Tuple[int, int]:
+        """ Remove the blobs whose digest is not referenced; returns (blobs, bytes) removed.
+
+        Blobs younger than min_age seconds are kept: a running crawl may have
+        committed them without having indexed them yet.
+        """
+        (removed, size) = (0, 0)
+        cutoff = time.time() - min_age
+        for (directory, _, files) in os.walk(os.path.join(self.root, 'blobs')):
+            for name in files:
+                blob = os.path.join(directory, name)
+                stat = os.stat(blob)
+                if name.split('.', 1)[0] in referenced or stat.st_mtime > cutoff:
+                    continue
+                os.remove(blob)
+                removed += 1
+                size += stat.st_size
+        return (removed, size)
+
+    @property
+    def stats(self) -> dict:
+        """ Write and dedup counters for the end of run report.
+        """
+        return {
+            'blobs_written': self.blobs_written,
+            'bytes_written': self.bytes_written,
+            'duplicates': self.duplicates,
+            'bytes_deduped': self.bytes_deduped,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Remove blobs that no asset of the metadata index refers to.')
+    parser.add_argument('directory', help='output directory holding the blobs')
+    parser.add_argument('--index', help='index database; defaults to <directory>/index.sqlite')
+    parser.add_argument('--min-age', type=float, default=3600.0, help='keep blobs younger than this many seconds')
+    args = parser.parse_args()
+    index = MetadataIndex(args.index or os.path.join(args.directory, 'index.sqlite'))
+    (removed, size) = BlobStore(args.directory).collect(index.blob_digests(), args.min_age)
+    index.close()
+    print(f'removed {removed} unreferenced blobs ({size} bytes) from {args.directory}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+
+class ByteBudget:
+    """ Caps the bytes held in memory by downloads across all workers.
+
+    A download reserves the memory it may buffer before it starts and releases
+    it when done; reservations block while the budget is exhausted. A single
+    reservation larger than the whole budget is admitted once nothing else is
+    in flight so it can never deadlock.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def _admissible(self, size: int) -> bool:
+        return self.in_flight == 0 or self.in_flight + size <= self.max_bytes
+
+    def _take(self, size: int):
+        self.in_flight += size
+        self.peak = max(self.peak, self.in_flight)
+
+    def acquire(self, size: int):
+        """ Block until size bytes fit into the budget.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._admissible(size))
+            self._take(size)
+
+    def try_acquire(self, size: int) -> bool:
+        """ Take size bytes if they fit right now.
+        """
+        with self._condition:
+            if not self._admissible(size):
+                return False
+            self._take(size)
+            return True
+
+    def release(self, size: int):
+        """ Return size bytes to the budget.
+        """
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+    @contextmanager
+    def reserve(self, size: int):
+        """ Hold size bytes of the budget for the duration of the block.
+        """
+        self.acquire(size)
+        try:
+            yield
+        finally:
+            self.release(size)
+
+    @asynccontextmanager
+    async def reserve_async(self, size: int, poll_interval=0.01):
+        """ Hold size bytes of the budget without blocking the event loop.
+        """
+        import asyncio  # pylint: disable=C0415; only async crawls need it
+        while not self.try_acquire(size):
+            await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            self.release(size)
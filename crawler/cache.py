@@ -0,0 +1,110 @@
+""" Memory-bounded caches scoped to one crawler.
+
+``functools.lru_cache`` on a method shares one cache between all instances,
+keeps every instance alive and only bounds the number of entries. A ``Cache``
+belongs to one crawler, is bounded by entries and by bytes, can expire entries
+after a time to live and counts its hits, misses and evictions.
+"""
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def sizeof(value) -> int:
+    """ Approximate bytes held by a cached value.
+    """
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class Cache:
+    """ Thread-safe LRU cache with optional entry, byte and time-to-live limits.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, ttl: float = None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl  # seconds an entry stays valid; forever if None
+        self.clock = clock
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key):
+        (_, size, _) = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key, default=None):
+        """ Cached value of key, or default if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """ Cache value, evicting the least recently used entries beyond the limits.
+        """
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # would evict everything else and still not fit
+            expires_at = self.clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (value, size, expires_at)
+            self.bytes += size
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) \
+                    or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """ Cached value of key; computed and cached on a miss.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None}
+
+
+def cached_method(method):
+    """ Memoize a one-argument method in the instance's ``caches[method name]``.
+    """
+    @functools.wraps(method)
+    def wrapper(self, key):
+        return self.caches[method.__name__].get_or_compute(key, lambda: method(self, key))
+    return wrapper
@@ -0,0 +1,71 @@
+from fnmatch import fnmatchcase
+from typing import Iterable
+from urllib.parse import urlsplit, urlunsplit
+
+from .frontier import fingerprint
+
+# tracking parameters that never change the served content
+DEFAULT_STRIP_PARAMS = ('utm_*', 'gclid', 'fbclid', 'mc_cid', 'mc_eid', '_ga')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class Canonicalizer:
+    """ Normalizes URLs so trivially different links dedupe onto one fetch.
+
+    Lowercases scheme and host, drops default ports, fragments and query params
+    matching ``strip_params`` (fnmatch patterns), sorts the remaining query and,
+    with ``strip_trailing_slash``, drops trailing slashes. ``saved`` counts distinct
+    raw URLs that collapsed onto an already queued canonical URL, i.e. fetches avoided.
+    """
+
+    def __init__(self, strip_params: Iterable[str] = DEFAULT_STRIP_PARAMS, strip_trailing_slash=False, sort_query=True):
+        self.strip_params = tuple(strip_params or ())
+        self.strip_trailing_slash = strip_trailing_slash
+        self.sort_query = sort_query
+        self.rewritten = 0  # distinct raw URLs that differ from their canonical form
+        self.saved = 0  # ... of which the canonical form had already been queued
+        self._variants = set()
+
+    def _keep_param(self, name: str) -> bool:
+        return not any(fnmatchcase(name, pattern) for pattern in self.strip_params)
+
+    def canonicalize(self, url: str) -> str:
+        """ Canonical form of an absolute URL.
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS:  # mailto:, data:, javascript: ...
+            return url
+        host = (parts.hostname or '').lower()
+        if ':' in host:  # IPv6 literal
+            host = f'[{host}]'
+        if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+            host = f'{host}:{parts.port}'
+        if parts.username:
+            userinfo = parts.username + (f':{parts.password}' if parts.password else '')
+            host = f'{userinfo}@{host}'
+        path = parts.path or '/'
+        if self.strip_trailing_slash and len(path) > 1:
+            path = path.rstrip('/') or '/'
+        # keep params percent-encoded exactly as served; only their order changes
+        query = [param for param in parts.query.split('&') if param and self._keep_param(param.split('=', 1)[0])]
+        if self.sort_query:
+            query.sort()
+        return urlunsplit((scheme, host, path, '&'.join(query), ''))
+
+    def count(self, url: str, canonical: str, added: bool):
+        """ Account for a discovered url whose canonical form was queued (added) or already known.
+        """
+        if canonical != url:
+            key = fingerprint(url)
+            if key not in self._variants:
+                self._variants.add(key)
+                self.rewritten += 1
+                if not added:
+                    self.saved += 1
+
+    @property
+    def stats(self) -> dict:
+        """ Canonicalization counters for the end of run report.
+        """
+        return {'rewritten': self.rewritten, 'saved': self.saved}
@@ -1,34 +1,75 @@
 import abc
 import logging
 import multiprocessing
+import os
+import threading
 from logging import Logger
-from typing import List
+from typing import Dict, List
 
+from .budget import ByteBudget
+from .crawler import Crawler
+from .health import HealthTracker
 from .html_crawler import HtmlCrawler
+from .responsive import ImagePolicy
+from .scheduler import HostScheduler
+from .telemetry import Telemetry
+from .units import load_units
+
+# Units are declarative: a name, the targets and the keyword arguments of the unit's crawler.
+# Crawlers are only built once a unit is crawled; see CrawlerConfig.crawler. A units file
+# (see crawler/units.py) replaces the built-in FBI_UNIT.
+FBI_UNIT = {
+    'name': 'fbi',
+    'targets': [
+        'https://www.fbi.gov/wanted/topten',
+    ],
+    'options': {
+        'render': False,
+        'follow_href_patterns': [
+            'wanted/topten',
+            'wanted/fugitives',
+            'wanted/terrorism',
+            'wanted/kidnap',
+            'wanted/seeking-info',
+            'wanted/parental-kidnappings',
+            'wanted/bank-robbers',
+            'wanted/ecap',
+            'wanted/vicap',
+        ],
+        'ignore': ['theme/images/fbibannerseal.png'],
+        'strip_params': ['utm_*', 'fbclid', 'gclid'],
+        'image_policy': ImagePolicy('largest'),
+    },
+}
 
 INTERPOL_UNIT = {
-    'crawler': HtmlCrawler,
-    'render': True,
+    'name': 'interpol',
     'targets': [
         'https://www.interpol.int/en/How-we-work/Notices/View-Red-Notices',
     ],
-    'image_ignore_patterns': ['images/arrow-down.svg',
-                              'images/arrow-up-stroke.svg',
-                              'images/socials/Facebook.svg',
-                              'images/socials/Twitter.svg',
-                              'images/socials/Youtube.svg',
-                              'images/socials/Instagram.svg',
-                              'images/socials/LinkedIn.svg',
-                              'images/socials/icon-Facebook.svg',
-                              'images/socials/icon-Twitter.svg',
-                              'interpolfront/images/rednotice',
-                              'interpolfront/images/photo-not-available',
-                              'interpolfront/images/logo-blanc',
-                              'interpolfront/images/logo-text-only',
-                              'images/1/1/1/6/76111-12-eng-GB/RedNoticeEnLR',
-                              'interpolfront/images/logo.png',
-                              'data:image/svg+xml',
-                              ]
+    'options': {
+        'render': True,
+        'render_pool_size': 4,
+        'image_policy': ImagePolicy('largest'),
+        'strip_params': ['utm_*', 'fbclid', 'gclid'],
+        'ignore': ['images/arrow-down.svg',
+                   'images/arrow-up-stroke.svg',
+                   'images/socials/Facebook.svg',
+                   'images/socials/Twitter.svg',
+                   'images/socials/Youtube.svg',
+                   'images/socials/Instagram.svg',
+                   'images/socials/LinkedIn.svg',
+                   'images/socials/icon-Facebook.svg',
+                   'images/socials/icon-Twitter.svg',
+                   'interpolfront/images/rednotice',
+                   'interpolfront/images/photo-not-available',
+                   'interpolfront/images/logo-blanc',
+                   'interpolfront/images/logo-text-only',
+                   'images/1/1/1/6/76111-12-eng-GB/RedNoticeEnLR',
+                   'interpolfront/images/logo.png',
+                   'data:image/svg+xml',
+                   ],
+    },
 }
 
 
@@ -46,26 +87,52 @@ class CrawlerConfig(metaclass=abc.ABCMeta):
                 or NotImplemented)
 
     _logger = None
-    _crawlers = {}
 
-    def __init__(self, logger: Logger, max_depth=3, think_time=5):
+    def __init__(self, logger: Logger, max_depth=3, think_time=5, crawler_class=HtmlCrawler, frontier_dir=None,
+                 max_inflight_bytes: int = None, units_path: str = None, **crawler_kwargs):
         self._logger = logger
-        self.fbi_unit = {
-            'targets': [
-                'https://www.fbi.gov/wanted/topten',
-            ],
-            'crawler': HtmlCrawler(self._logger, render=False, follow_href_patterns=[
-                'wanted/topten',
-                'wanted/fugitives',
-                'wanted/terrorism',
-                'wanted/kidnap',
-                'wanted/seeking-info',
-                'wanted/parental-kidnappings',
-                'wanted/bank-robbers',
-                'wanted/ecap',
-                'wanted/vicap',
-            ], ignore=['theme/images/fbibannerseal.png'], max_depth=max_depth, think_time=think_time),
-        }
+        self.max_depth = max_depth
+        self.think_time = think_time
+        self.crawler_class = crawler_class
+        self.frontier_dir = frontier_dir
+        self.crawler_kwargs = crawler_kwargs  # override the options of every unit
+        # one politeness scheduler shared by all units so hosts are rate limited across crawlers
+        self.scheduler = HostScheduler(delay=think_time / 2, jitter=1.0)
+        # bytes all units together may buffer in memory while downloading
+        self.byte_budget = ByteBudget(max_inflight_bytes) if max_inflight_bytes else None
+        # one telemetry registry for the whole run
+        self.telemetry = Telemetry()
+        # error rates and circuit breakers per host, shared like the politeness scheduler
+        self.health = HealthTracker()
+        self.fbi_unit = FBI_UNIT
+        # units of a JSON/TOML/YAML file, validated before anything is crawled
+        self.units = load_units(units_path, crawler_class) if units_path else [self.fbi_unit]
+        self._crawlers: Dict[str, Crawler] = {}
+        self._lock = threading.Lock()
+
+    def crawler_options(self, unit: dict) -> dict:
+        """ Keyword arguments of the crawler of a unit: shared settings, then unit options, then overrides.
+        """
+        return {'max_depth': self.max_depth, 'think_time': self.think_time, 'scheduler': self.scheduler,
+                'byte_budget': self.byte_budget, 'telemetry': self.telemetry, 'health': self.health,
+                'frontier_path': self.frontier_path(self.frontier_dir, unit['name']),
+                **unit.get('options', {}), **self.crawler_kwargs}
+
+    def crawler(self, unit: dict) -> Crawler:
+        """ Crawler of a unit; built on first use.
+        """
+        with self._lock:
+            crawler = self._crawlers.get(unit['name'])
+            if crawler is None:
+                crawler = self._crawlers[unit['name']] = self.crawler_class(self._logger,
+                                                                            **self.crawler_options(unit))
+            return crawler
+
+    @staticmethod
+    def frontier_path(frontier_dir: str, name: str) -> str:
+        """ Resumable frontier file of a unit; None keeps the frontier in memory.
+        """
+        return os.path.join(frontier_dir, f'frontier-{name}.sqlite') if frontier_dir else None
 
     @property
     def logger(self) -> logging.Logger:
@@ -74,10 +141,10 @@ class CrawlerConfig(metaclass=abc.ABCMeta):
         return self._logger
 
     @property
-    def workload(self) -> List[dict]:  # pylint: disable=R0201
+    def workload(self) -> List[dict]:
         """ Get configured workload.
         """
-        return [self.fbi_unit]
+        return self.units
 
     @property
     def concurrency(self) -> int:
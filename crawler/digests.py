@@ -0,0 +1,114 @@
+""" Content digests of downloaded assets, computed off the download path.
+
+Download threads only stream a body into the blob store, which hashes it with
+its own algorithm on the way in. Any further digests, and an optional
+perceptual hash of images, are computed by a ``Digester``: its worker threads
+read each new blob back in chunks and complete the asset's metadata in the
+index. Blobs shared by several URLs are only digested once.
+"""
+import hashlib
+import queue
+import threading
+from typing import Callable, Dict, Iterable
+
+from requests.structures import CaseInsensitiveDict
+
+from .cache import Cache
+from .metadata_index import MetadataIndex
+from .phash import NearDuplicates
+
+DIGESTS = ('sha256',)
+
+
+def file_digests(path: str, algorithms: Iterable[str], chunk_size: int = 1024 * 1024) -> Dict[str, str]:
+    """ Hex digests of a file, read once in chunks for all algorithms.
+    """
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    if hashers:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+    return {algorithm: hasher.hexdigest() for (algorithm, hasher) in hashers.items()}
+
+
+class Digester:
+    """ Completes asset metadata with ``digests`` (and ``image_hash``) in background threads.
+
+    ``image_hash`` is called with the blob path of every image and returns a
+    perceptual hash to store for near-duplicate detection. ``near_duplicates``
+    hashes images with its own algorithm and flags the near-duplicates.
+    """
+
+    def __init__(self, algorithms: Iterable[str] = DIGESTS, image_hash: Callable[[str], str] = None,
+                 blob_algorithm='sha256', workers=2, chunk_size=1024 * 1024, cache_size=10000,
+                 near_duplicates: NearDuplicates = None):
+        self.algorithms = tuple(algorithms)
+        for algorithm in self.algorithms:
+            try:
+                hashlib.new(algorithm).hexdigest()
+            except (TypeError, ValueError) as ex:  # unknown, or variable length like shake_128
+                raise ValueError(f"unknown digest: {algorithm}; expected one of "
+                                 f"{sorted(hashlib.algorithms_available)}") from ex
+        self.near_duplicates = near_duplicates
+        self.image_hash = image_hash or (near_duplicates.image_hash if near_duplicates else None)
+        self.blob_algorithm = blob_algorithm
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = Cache(max_entries=cache_size)  # blob digest -> computed fields
+        self.stats = {'assets': 0, 'blobs_digested': 0, 'bytes_digested': 0, 'errors': 0}
+        self._inbox = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, index: MetadataIndex, url: str, metadata: dict):
+        """ Queue the asset of url, already in the index, for its digests; returns at once.
+        """
+        with self._lock:
+            self.stats['assets'] += 1
+            if len(self._threads) < self.workers:  # started on first use
+                thread = threading.Thread(target=self._work, name=f'digest-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._inbox.put((index, url, metadata))
+
+    def join(self):
+        """ Wait until every submitted asset has its digests in the index.
+        """
+        self._inbox.join()
+
+    def _work(self):
+        while True:
+            (index, url, metadata) = self._inbox.get()
+            try:
+                record = {**metadata, **self.fields(metadata)}
+                if self.near_duplicates:
+                    record = self.near_duplicates.check(index, url, record)
+                index.put(url, record)
+            except Exception:  # pylint: disable=W0703; the asset keeps its metadata without digests
+                with self._lock:
+                    self.stats['errors'] += 1
+            finally:
+                self._inbox.task_done()
+
+    def fields(self, metadata: dict) -> dict:
+        """ The digests (and image hash) of the blob of an asset.
+        """
+        return self.cache.get_or_compute(metadata['blob_digest'], lambda: self.compute(metadata))
+
+    def compute(self, metadata: dict) -> dict:
+        known = {self.blob_algorithm: metadata['blob_digest']}
+        missing = [algorithm for algorithm in self.algorithms if algorithm not in known]
+        digests = file_digests(metadata['blob'], missing, self.chunk_size)
+        fields = {'digests': {algorithm: known.get(algorithm) or digests[algorithm] for algorithm in self.algorithms}}
+        content_type = CaseInsensitiveDict(metadata.get('headers', {})).get('Content-Type') or ''
+        if self.image_hash and content_type.startswith('image/'):
+            try:
+                fields['image_hash'] = self.image_hash(metadata['blob'])
+            except (OSError, ValueError):  # not an image we can decode; keep the digests
+                with self._lock:
+                    self.stats['errors'] += 1
+        with self._lock:
+            self.stats['blobs_digested'] += 1
+            self.stats['bytes_digested'] += metadata.get('size', 0) if missing else 0
+        return fields
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import sqlite3
+from collections import deque
+from typing import List, Set, Tuple
+
+
+def fingerprint(url: str) -> bytes:
+    """ Compact fixed-size key for the URL-seen index.
+    """
+    return hashlib.sha1(url.encode('utf-8')).digest()[:12]
+
+
+class Frontier:
+    """ In-memory breadth-first crawl frontier with a hashed URL-seen set.
+
+    Pages are handed out in FIFO order, so a crawl never recurses and every
+    ``seen`` check is O(1) regardless of how many URLs have been discovered.
+    """
+
+    def __init__(self):
+        self._queue = deque()
+        self._seen = set()
+        self._images = {}  # url -> downloaded
+
+    def __len__(self) -> int:
+        """ Number of pages waiting to be crawled.
+        """
+        return len(self._queue)
+
+    def seen(self, url: str) -> bool:
+        """ Has the page ever been queued?
+        """
+        return fingerprint(url) in self._seen
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        """ Queue a page unless it was seen before; returns True if it was queued.
+        """
+        key = fingerprint(url)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self._queue.append((url, depth))
+        return True
+
+    def pop(self) -> Tuple[str, int]:
+        """ Next (url, depth) to crawl or None if the frontier is exhausted.
+        """
+        return self._queue.popleft() if self._queue else None
+
+    def pop_many(self, size: int) -> List[Tuple[str, int]]:
+        """ Up to size (url, depth) pairs in breadth-first order.
+        """
+        batch = []
+        while self._queue and len(batch) < size:
+            batch.append(self._queue.popleft())
+        return batch
+
+    def done(self, url: str):
+        """ Mark a popped page as crawled.
+        """
+
+    def add_image(self, url: str) -> bool:
+        """ Record a discovered image; returns True if it is new.
+        """
+        if url in self._images:
+            return False
+        self._images[url] = False
+        return True
+
+    def images(self) -> Set[str]:
+        """ Discovered images that were not downloaded yet.
+        """
+        return {url for url, downloaded in self._images.items() if not downloaded}
+
+    def image_done(self, url: str):
+        """ Mark an image as downloaded.
+        """
+        self._images[url] = True
+
+    def clear(self):
+        """ Forget all state once a crawl has completed.
+        """
+        self._queue.clear()
+        self._seen.clear()
+        self._images.clear()
+
+    def close(self):
+        """ Release any resources held by the frontier.
+        """
+
+
+class SqliteFrontier(Frontier):
+    """ Disk-backed frontier for very large crawls; survives a killed process.
+
+    Pages popped but not marked ``done`` before a crash are handed out again on
+    restart, so a resumed crawl continues where it stopped instead of starting
+    over from the targets. Writes are committed every ``commit_every`` changes.
+    """
+
+    PENDING, ACTIVE, DONE = 0, 1, 2
+
+    def __init__(self, path: str, commit_every=100):  # pylint: disable=W0231
+        self.path = path
+        self.commit_every = commit_every
+        self._changes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                fp BLOB NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                state INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS pages_state ON pages (state, seq);
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                downloaded INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        # pages that were in flight when a previous run died are crawled again
+        self._db.execute('UPDATE pages SET state = ? WHERE state = ?', (self.PENDING, self.ACTIVE))
+        self._db.commit()
+
+    @property
+    def resumed(self) -> bool:
+        """ Does the frontier hold state from a previous, unfinished run?
+        """
+        return self._db.execute('SELECT 1 FROM pages LIMIT 1').fetchone() is not None
+
+    def _changed(self, count=1):
+        self._changes += count
+        if self._changes >= self.commit_every:
+            self._db.commit()
+            self._changes = 0
+
+    def __len__(self) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM pages WHERE state = ?', (self.PENDING,)).fetchone()[0]
+
+    def seen(self, url: str) -> bool:
+        return self._db.execute('SELECT 1 FROM pages WHERE fp = ?', (fingerprint(url),)).fetchone() is not None
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        cursor = self._db.execute('INSERT OR IGNORE INTO pages (fp, url, depth) VALUES (?, ?, ?)',
+                                  (fingerprint(url), url, depth))
+        self._changed(cursor.rowcount)
+        return cursor.rowcount == 1
+
+    def pop(self) -> Tuple[str, int]:
+        batch = self.pop_many(1)
+        return batch[0] if batch else None
+
+    def pop_many(self, size: int) -> List[Tuple[str, int]]:
+        rows = self._db.execute('SELECT seq, url, depth FROM pages WHERE state = ? ORDER BY seq LIMIT ?',
+                                (self.PENDING, size)).fetchall()
+        self._db.executemany('UPDATE pages SET state = ? WHERE seq = ?', [(self.ACTIVE, row[0]) for row in rows])
+        self._changed(len(rows))
+        return [(url, depth) for (_, url, depth) in rows]
+
+    def done(self, url: str):
+        self._db.execute('UPDATE pages SET state = ? WHERE fp = ?', (self.DONE, fingerprint(url)))
+        self._changed()
+
+    def add_image(self, url: str) -> bool:
+        cursor = self._db.execute('INSERT OR IGNORE INTO images (url) VALUES (?)', (url,))
+        self._changed(cursor.rowcount)
+        return cursor.rowcount == 1
+
+    def images(self) -> Set[str]:
+        self._db.commit()
+        return {row[0] for row in self._db.execute('SELECT url FROM images WHERE downloaded = 0')}
+
+    def image_done(self, url: str):
+        self._db.execute('UPDATE images SET downloaded = 1 WHERE url = ?', (url,))
+        self._changed()
+
+    def clear(self):
+        self._db.executescript('DELETE FROM pages; DELETE FROM images;')
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
@@ -0,0 +1,226 @@
+""" Per-host health: error rates, latency and circuit breakers.
+
+Every response (or connection error) is recorded for its host. When most of
+the recent requests to a host failed, its circuit opens: requests to it fail
+fast with ``CircuitOpen`` for a cooldown instead of piling up behind retries.
+After the cooldown a single probe request is let through; its success closes
+the circuit, its failure reopens it for twice as long. A host whose circuit reopened
+``max_reopens`` times in a row is given up: its URLs fail with ``HostDown``.
+
+Failed URLs are not retried inline. Transient failures go to a
+``RetryQueue`` and come back after an exponential delay, so the crawl keeps
+going while a host recovers.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Tuple
+
+from requests import ConnectionError as RequestsConnectionError, Timeout
+
+from .scheduler import host_key
+
+RETRY_STATUSES = (500, 502, 503, 504)
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class RetryableError(Exception):
+    """ Transient server error response; the request may succeed later.
+    """
+
+    def __init__(self, url: str, status: int):
+        super().__init__(url, status)
+        self.url = url
+        self.status = status
+
+    def __str__(self) -> str:
+        return f"{self.url}: status_code={self.status}"
+
+
+class CircuitOpen(Exception):
+    """ The host of the URL is shedding load; retry in retry_in seconds.
+    """
+
+    def __init__(self, url: str, retry_in: float):
+        super().__init__(url, retry_in)
+        self.url = url
+        self.retry_in = retry_in
+
+    def __str__(self) -> str:
+        return f"{self.url}: circuit open for {self.retry_in:.1f}s"
+
+
+class HostDown(Exception):
+    """ The circuit of the host of the URL reopened too many times in a row; it is not retried.
+    """
+
+    def __init__(self, url: str, reopened: int):
+        super().__init__(url, reopened)
+        self.url = url
+        self.reopened = reopened
+
+    def __str__(self) -> str:
+        return f"{self.url}: host down, circuit reopened {self.reopened} times"
+
+
+def is_retryable(ex: Exception) -> bool:
+    """ Can the failed request succeed when it is sent again later?
+    """
+    return isinstance(ex, (RetryableError, CircuitOpen, RequestsConnectionError, Timeout))
+
+
+class _Host:  # pylint: disable=R0902,R0903
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)  # True for failures
+        self.requests = 0
+        self.failures = 0
+        self.latency = None  # exponentially weighted moving average, seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.probing = False
+        self.opened = 0
+        self.reopened = 0  # failed probes since the circuit last closed
+
+
+class HealthTracker:
+    """ Records the outcome of every request per host and trips circuit breakers.
+
+    A circuit opens when at least ``min_requests`` of the last ``window``
+    requests were made and ``failure_ratio`` of them failed. After ``max_reopens``
+    failed probes in a row the host is considered down for good.
+    """
+
+    def __init__(self, window=20, min_requests=5, failure_ratio=0.5, cooldown=30.0, max_cooldown=600.0,
+                 max_reopens=5, clock=time.monotonic):
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_reopens = max_reopens
+        self.clock = clock
+        self._hosts: Dict[str, _Host] = {}
+        self._lock = threading.Lock()
+
+    def settings(self) -> dict:
+        """ Keyword arguments creating an empty tracker with the same settings.
+        """
+        return {'window': self.window, 'min_requests': self.min_requests, 'failure_ratio': self.failure_ratio,
+                'cooldown': self.cooldown, 'max_cooldown': self.max_cooldown, 'max_reopens': self.max_reopens}
+
+    def _host(self, url: str) -> _Host:
+        key = host_key(url)
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = _Host(self.window)
+        return host
+
+    def check(self, url: str):
+        """ Raise CircuitOpen unless a request to the host of url may be sent now; HostDown once it is given up.
+        """
+        with self._lock:
+            host = self._host(url)
+            if host.state == CLOSED:
+                return
+            if host.reopened >= self.max_reopens:
+                raise HostDown(url, host.reopened)
+            retry_in = host.opened_at + host.cooldown - self.clock()
+            if retry_in > 0 or host.probing:
+                raise CircuitOpen(url, max(retry_in, 0.0))
+            host.state = HALF_OPEN
+            host.probing = True  # one probe at a time
+
+    def record(self, url: str, failed: bool, latency: float = None):
+        """ Record the outcome of a request to the host of url.
+        """
+        with self._lock:
+            host = self._host(url)
+            host.requests += 1
+            host.failures += failed
+            host.outcomes.append(failed)
+            if latency is not None:
+                host.latency = latency if host.latency is None else 0.8 * host.latency + 0.2 * latency
+            if host.state == HALF_OPEN:
+                host.probing = False
+                if failed:
+                    self._open(host, min(host.cooldown * 2, self.max_cooldown))
+                    host.reopened += 1
+                else:
+                    host.state = CLOSED
+                    host.reopened = 0
+                    host.outcomes.clear()
+            elif host.state == CLOSED and len(host.outcomes) >= self.min_requests \
+                    and sum(host.outcomes) >= self.failure_ratio * len(host.outcomes):
+                self._open(host, self.cooldown)
+
+    def _open(self, host: _Host, cooldown: float):
+        host.state = OPEN
+        host.opened_at = self.clock()
+        host.cooldown = cooldown
+        host.opened += 1
+
+    def state(self, url: str) -> str:
+        with self._lock:
+            return self._host(url).state
+
+    def stats(self) -> dict:
+        """ Requests, error rate, latency and circuit state per host.
+        """
+        with self._lock:
+            return {key: {'requests': host.requests, 'failures': host.failures,
+                          'error_rate': round(host.failures / host.requests, 3) if host.requests else 0.0,
+                          'latency_seconds': round(host.latency, 4) if host.latency is not None else None,
+                          'state': host.state, 'circuit_opened': host.opened}
+                    for (key, host) in self._hosts.items()}
+
+
+class RetryQueue:
+    """ Deferred retries with exponential delays: base_delay, 2 * base_delay, ... up to max_delay.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=5.0, max_delay=300.0, clock=time.monotonic):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.attempts: Dict[Tuple, int] = {}
+        self._heap: List[tuple] = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def defer(self, item: tuple, min_delay: float = 0.0, sent=True) -> bool:
+        """ Schedule item again; False once it ran out of attempts.
+        Items whose request was never sent (``sent=False``) do not use up an attempt.
+        """
+        with self._lock:
+            attempt = self.attempts.get(item, 0)
+            if attempt >= self.max_attempts:
+                return False
+            if sent:
+                self.attempts[item] = attempt + 1
+            delay = max(min(self.base_delay * 2 ** attempt, self.max_delay), min_delay)
+            heapq.heappush(self._heap, (self.clock() + delay, next(self._order), item))
+            return True
+
+    def pop_due(self) -> List[tuple]:
+        """ Items whose retry time has come.
+        """
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= self.clock():
+                due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def next_due_in(self) -> float:
+        """ Seconds until the next retry; None if nothing is deferred.
+        """
+        with self._lock:
+            return max(self._heap[0][0] - self.clock(), 0.0) if self._heap else None
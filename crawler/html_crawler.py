@@ -1,36 +1,52 @@
-import hashlib
-import json
 import mimetypes
 import os
 import random
+import threading
 import time
-from functools import lru_cache
+from collections import Counter
+from contextlib import nullcontext
 from logging import Logger
 from os import path
-from typing import List
+from typing import Callable, List, Set
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
-from requests import Response, Session
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from requests import RequestException, Response, Session
+from requests.structures import CaseInsensitiveDict
 
+from .blob_store import AssetTooLarge, BlobStore
+from .budget import ByteBudget
+from .cache import Cache, cached_method
+from .canonical import DEFAULT_STRIP_PARAMS, Canonicalizer
 from .crawler import Crawler
+from .digests import DIGESTS, Digester
+from .frontier import Frontier, SqliteFrontier
+from .health import RETRY_STATUSES, HealthTracker, RetryableError, RetryQueue
+from .metadata_index import MetadataIndex
+from .parsers import DEFAULT_PARSER, PageLinks, get_parser
+from .phash import NearDuplicates
+from .pipeline import Pipeline
+from .recrawl import RevisitPolicy, fingerprint, stored_links
+from .rules import RuleSet
+from .telemetry import Telemetry
+from .transport import Transport
+from .render_pool import RenderPool, chrome_driver
+from .responsive import ImagePolicy, candidates
+from .scheduler import HostScheduler, host_key, parse_retry_after
 
 USER_AGENTS = [
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.113 Safari/537.36',
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36',
     'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.87 Safari/537.36'
 ]
+# hrefs that never lead to HTML pages
+IGNORE_HREFS = ['re:(?i:^javascript:)', 'suffix:.jpg', 'suffix:.pdf', 'suffix:.png']
 
 
 class HtmlCrawler(Crawler):
     """ Inherits from Crawler.
     """
     _session: Session = None
-    _driver = None  # selenium webdriver
+    _render_pool: RenderPool = None  # pooled selenium webdrivers
 
     @classmethod
     def __subclasshook__(cls, subclass):
@@ -43,34 +59,86 @@ class HtmlCrawler(Crawler):
                 )
 
     def __init__(self, logger: Logger, render=False, ignore=[], follow_href_patterns=[], max_depth=1, think_time=10,
-                 http_retries=5, retry_backoff=5):
+                 http_retries=5, retry_backoff=5, output='output', scheduler: HostScheduler = None,
+                 frontier_path: str = None, strip_params=DEFAULT_STRIP_PARAMS, strip_trailing_slash=False,
+                 chunk_size=64 * 1024, max_asset_bytes: int = None, byte_budget: ByteBudget = None, render_pool_size=1,
+                 page_load_timeout=30, render_max_pages=50, driver_factory=chrome_driver, parser: str = DEFAULT_PARSER,
+                 fetch_workers=2, parse_workers=1, download_workers=4, pipeline_queue_size=16, telemetry: Telemetry = None,
+                 revisit_policy: RevisitPolicy = None, page_cache_bytes=8 * 1024 * 1024, page_cache_ttl=300,
+                 ignore_hrefs=IGNORE_HREFS, image_policy: ImagePolicy = None, transport: Transport = None,
+                 health: HealthTracker = None, digests=DIGESTS, image_hash: Callable[[str], str] = None,
+                 digest_workers=2, near_duplicates: NearDuplicates = None, request_timeout=30.0):
         super().__init__(logger)
         self.render = render
+        self.render_pool_size = render_pool_size  # browsers rendering in parallel
+        self.page_load_timeout = page_load_timeout
+        self.render_max_pages = render_max_pages  # pages before a browser is recycled
+        self.driver_factory = driver_factory
+        self.parser = get_parser(parser)
+        # worker threads per pipeline stage and the size of the queues between them
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.download_workers = download_workers
+        self.pipeline_queue_size = pipeline_queue_size
+        self.telemetry = telemetry or Telemetry()
+        self.revisit_policy = revisit_policy  # incremental recrawls; every page is fetched and parsed if None
+        # per-crawler memoization of page bodies, bounded by count, bytes and age
+        self.caches = {
+            'get_content': Cache(max_entries=100, max_bytes=page_cache_bytes, ttl=page_cache_ttl),
+        }
         self.ignore = ignore
         self.follow_href_patterns = follow_href_patterns
+        # rules compiled once per crawler; see crawler/rules.py for the rule syntax
+        self.ignore_rules = RuleSet(ignore)
+        self.follow_rules = RuleSet(follow_href_patterns)
+        self.ignore_href_rules = RuleSet(ignore_hrefs)
+        self.image_policy = image_policy  # variants of responsive images to download; only src if None
+        self._skipped_variants: Set[str] = set()
         self.max_depth = max_depth  # max recursion depth
         self.think_time = think_time
+        self.output = output  # download directory
+        self.store = BlobStore(output)
+        self._index: MetadataIndex = None
+        self._index_lock = threading.Lock()
+        # content digests (and perceptual hashes) are computed after download by background workers
+        self.digester = Digester(digests, image_hash, blob_algorithm=self.store.algorithm, workers=digest_workers,
+                                 near_duplicates=near_duplicates)
+        self.chunk_size = chunk_size  # bytes read per streamed chunk
+        self.max_asset_bytes = max_asset_bytes  # per-asset size cap; unlimited if None
+        self.byte_budget = byte_budget  # max in-flight download bytes shared across workers
+        self.revalidation = Counter()  # conditional request counters
+        self.http_retries = http_retries  # deferred attempts per failed URL
+        self.retry_backoff = retry_backoff  # seconds before the first deferred retry; doubles per attempt
+        self.health = health or HealthTracker()  # per-host error rates and circuit breakers
+        self.request_timeout = request_timeout  # seconds to connect and between bytes; waits forever if None
+        self.frontier_path = frontier_path  # sqlite file for a resumable frontier; in memory if None
+        # dedupes links; relative links still resolve against the URL a page was served from, see base_url
+        self.canonicalizer = Canonicalizer(strip_params, strip_trailing_slash)
+        # per-host politeness; uniform(0, think_time) spacing replaces the blocking random sleep
+        self.scheduler = scheduler or HostScheduler(delay=think_time / 2, jitter=1.0)
 
-        self._session = Session()
-        self.headers = {'User-Agent': self.random_agent()}
-        retry_strategy = Retry(
-            total=http_retries,
-            backoff_factor=retry_backoff,
-            status_forcelist=[429, 500, 502, 503, 504],
-            method_whitelist=["HEAD", "GET", "OPTIONS"]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self._session.mount("https://", adapter)
-        self._session.mount("http://", adapter)
-        mimetypes.init()
-
-    def init_selenium(self):
-        """ Initialize selenium webdriver.
-        """
-        if not self._driver:
-            driver_options = Options()
-            driver_options.headless = True
-            self._driver = webdriver.Chrome(options=driver_options)
+        # keep-alive connections are pooled by a transport shared with the other crawlers of the process;
+        # failed requests are not retried inline but deferred, see Pipeline
+        self.transport = transport or Transport.shared(http_retries=0)
+        self._session = self.transport.session
+        self.headers = {'User-Agent': self.random_agent()}  # mimetypes loads its tables on the first guess
+
+    def init_selenium(self) -> RenderPool:
+        """ Initialize the pool of selenium webdrivers.
+        """
+        if not self._render_pool:
+            self._render_pool = RenderPool(self._logger, size=self.render_pool_size,
+                                           driver_factory=self.driver_factory,
+                                           page_load_timeout=self.page_load_timeout,
+                                           max_pages=self.render_max_pages)
+        return self._render_pool
+
+    def shutdown_selenium(self):
+        """ Quit all selenium webdrivers.
+        """
+        if self._render_pool:
+            self._render_pool.shutdown()
+            self._render_pool = None
 
     def random_agent(self) -> str:
         """ Returns a random browser agent string
@@ -78,6 +146,36 @@ class HtmlCrawler(Crawler):
         idx = random.randint(0, len(USER_AGENTS) - 1)
         return USER_AGENTS[idx]
 
+    def _request(self, method: str, url: str, headers: dict = None, **kwargs) -> Response:
+        """ Send a request once the host's politeness slot is free; 429 responses slow the host down.
+        """
+        headers = {**self.headers, **headers} if headers else self.headers
+        host = host_key(url)
+        self.health.check(url)
+        for attempt in range(self.http_retries + 1):
+            with self.telemetry.timer('think_seconds', host=host):
+                self.scheduler.wait(url)
+            started_at = time.perf_counter()
+            try:
+                res: Response = self._session.request(method, url, headers=headers,
+                                                      **{'timeout': self.request_timeout, **kwargs})
+            except RequestException:
+                self.health.record(url, failed=True)
+                raise
+            latency = time.perf_counter() - started_at
+            self.telemetry.observe('request_seconds', latency, method=method, host=host)
+            self.telemetry.count('responses_total', status=res.status_code)
+            self.health.record(url, failed=res.status_code in RETRY_STATUSES, latency=latency)
+            if res.status_code != 429:
+                self.scheduler.recover(url)
+                break
+            retry_after = parse_retry_after(res.headers.get('Retry-After'))
+            if attempt < self.http_retries:
+                res.close()  # give the pooled connection back before the next attempt
+            self._logger.info("rate limited: %s ; retry_after=%s", url, retry_after)
+            self.scheduler.backoff(url, retry_after)
+        return res
+
     def guess_file_extension(self, content_type: str) -> str:  # pylint: disable=R0201
         """ Guess the file extension based on MIME Content-Type.
         """
@@ -86,169 +184,409 @@ class HtmlCrawler(Crawler):
             self._logger.warning("Could not determine file extension for: %s", content_type)
         return ext
 
-    def cached(self, headers: dict, metadata_file: str, destination: str) -> bool:
-        """ Do we already have asset in local cache?
+    def cached(self, headers: dict, metadata: dict) -> str:
+        """ Do we already have asset in local cache? Returns the path of the cached blob.
         """
-        asset_cached = False
+        blob: str = None
         try:
-            if path.exists(metadata_file):
-                with open(metadata_file) as file:
-                    metadata = json.load(file)
-                    if (headers['Content-Type'] == metadata['headers']['Content-Type']
-                            and headers['Content-Length'] == metadata['headers']['Content-Length']
-                            and path.exists(destination)
-                            and (os.stat(destination)).st_size == int(headers['Content-Length'])):
-                        self._logger.info("cache hit: %s", destination)
-                        asset_cached = True
-                    else:
-                        self._logger.info("cache miss: metadata did not match: %s\n %s", headers, metadata)
+            if metadata:
+                if (headers.get('Content-Type') == metadata['headers'].get('Content-Type')
+                        and headers.get('Content-Length') is not None
+                        and headers['Content-Length'] == metadata['headers'].get('Content-Length')
+                        and int(headers['Content-Length']) == metadata['size']
+                        and path.exists(metadata['blob'])
+                        and os.stat(metadata['blob']).st_size == metadata.get('blob_size', metadata['size'])):
+                    self._logger.info("cache hit: %s", metadata['blob'])
+                    self.telemetry.count('cache_total', result='hit')
+                    blob = metadata['blob']
+                else:
+                    self._logger.info("cache miss: metadata did not match: %s\n %s", headers, metadata)
         except Exception as ex:
             self._logger.warning("cache miss: exception: %s", str(ex))
-        return asset_cached
+        return blob
 
-    def download_file(self, url: str, output='output') -> str:
-        """ Download a file from a URL to the output directory.
+    @property
+    def index(self) -> MetadataIndex:
+        """ Metadata index of the output directory; opened on first use.
         """
-        destination: str = None
-        # sha1 hash based on full img src url
-        url_encoded = url.encode('utf-8')
-        sha1_digest = hashlib.sha1(url_encoded).hexdigest()
-        destination = os.path.join(output, sha1_digest)
-        try:
-            time.sleep(random.randint(0, self.think_time))  # introduce some natural wait time
-            head: Response = self._session.head(url, headers=self.headers, allow_redirects=True)
-            ext = self.guess_file_extension(head.headers.get('Content-Type'))
-            metadata_file = destination + '-metadata.json'
-            destination = (destination + ext) if ext else destination
-            if not self.cached(dict(head.headers), metadata_file, destination):
-                res: Response = self._session.get(url, headers=self.headers, allow_redirects=True)
-                metadata = {
-                    'url': res.url,
-                    'headers': dict(res.headers),
-                    'status_code': res.status_code,
-                    'elapsed_microseconds': str(res.elapsed.microseconds),
-                    'is_permanent_redirect': res.is_permanent_redirect,
-                    'is_redirect': res.is_redirect,
-                    'links': res.links,
-                    'reason': res.reason,
-                    'md5': hashlib.md5(url_encoded).hexdigest(),
-                    'sha1': sha1_digest,
-                    'sha256': hashlib.sha256(url_encoded).hexdigest(),
-                    'sha384': hashlib.sha384(url_encoded).hexdigest(),
-                    'sha512': hashlib.sha512(url_encoded).hexdigest(),
-                }
-                self._logger.info("write file: %s", destination)
-                with open(destination, 'wb') as file:
-                    file.write(res.content)
-                with open(metadata_file, 'w') as file:
-                    json.dump(metadata, file)
-        except Exception as ex:
-            raise ex
-        return destination
+        with self._index_lock:  # download threads may ask for it at the same time
+            if self._index is None:
+                self._index = MetadataIndex(os.path.join(self.output, 'index.sqlite'), background=True)
+        return self._index
+
+    def flush_index(self):
+        """ Wait for pending digests and commit the metadata index.
+        """
+        self.digester.join()
+        self.index.flush()
+
+    def storage(self, output: str = None) -> (BlobStore, MetadataIndex):
+        """ Blob store and metadata index of an output directory.
+        """
+        if output in (None, self.output):
+            return (self.store, self.index)
+        return (BlobStore(output), MetadataIndex(os.path.join(output, 'index.sqlite')))
+
+    def buffer_size(self, headers: dict, store: BlobStore = None) -> int:
+        """ Most bytes of an asset held in memory while it streams in.
+        """
+        spool_size = (store or self.store).spool_size
+        content_length = headers.get('Content-Length')
+        if content_length and content_length.isdigit():
+            spool_size = min(spool_size, int(content_length))
+        return spool_size + self.chunk_size
+
+    def check_size(self, url: str, headers: dict):
+        """ Refuse assets whose advertised Content-Length exceeds the size cap.
+        """
+        content_length = headers.get('Content-Length')
+        if self.max_asset_bytes is not None and content_length and content_length.isdigit() \
+                and int(content_length) > self.max_asset_bytes:
+            raise AssetTooLarge(f"{url} is {content_length} bytes; cap is {self.max_asset_bytes}")
+
+    def reserve_memory(self, size: int):
+        """ Hold size bytes of the shared byte budget, if any, while downloading.
+        """
+        return self.byte_budget.reserve(size) if self.byte_budget else nullcontext()
+
+    def validators(self, metadata: dict) -> dict:  # pylint: disable=R0201
+        """ Conditional request headers that revalidate a cached asset.
+        """
+        conditional = {}
+        if metadata and metadata.get('blob') and path.exists(metadata['blob']):
+            cached_headers = CaseInsensitiveDict(metadata.get('headers', {}))
+            if cached_headers.get('ETag'):
+                conditional['If-None-Match'] = cached_headers['ETag']
+            if cached_headers.get('Last-Modified'):
+                conditional['If-Modified-Since'] = cached_headers['Last-Modified']
+        return conditional
+
+    @staticmethod
+    def unchanged(headers: dict, conditional: dict) -> bool:
+        """ Does a 200 response carry the validators that were sent? True if none were sent.
+        """
+        headers = CaseInsensitiveDict(headers)
+        return (conditional.get('If-None-Match') in (None, headers.get('ETag'))
+                and conditional.get('If-Modified-Since') in (None, headers.get('Last-Modified')))
+
+    def not_modified(self, url: str, metadata: dict):
+        """ Account for a 304 response.
+        """
+        self.revalidation['not_modified'] += 1
+        self.revalidation['bytes_saved'] += metadata.get('size', 0)
+        self.telemetry.count('cache_total', result='hit')
+        self._logger.info("cache hit: not modified: %s", url)
+
+    def downloaded(self, url: str, size: int):
+        """ Account for an asset body written to the blob store.
+        """
+        self.telemetry.count('cache_total', result='miss')
+        self.telemetry.count('downloaded_bytes_total', size, host=host_key(url))
+
+    @staticmethod
+    def is_html(headers: dict) -> bool:
+        """ Is the response an HTML page?
+        """
+        return 'text/html' in (headers.get('Content-Type') or '').lower()
+
+    def fetch(self, url: str, store: BlobStore = None, index: MetadataIndex = None,
+              accept: Callable[[dict], bool] = None) -> dict:
+        """ Fetch an asset into the blob store with a single conditional GET; returns its metadata.
+
+        Stored ``ETag``/``Last-Modified`` validators are sent along, so an unchanged
+        asset costs one 304 round trip instead of the former HEAD+GET pair.
+        Returns None for error responses and for responses rejected by accept. An asset
+        whose Content-Type and Content-Length match the index is not downloaded again,
+        unless the server answered validators with a different ``ETag``/``Last-Modified``;
+        pages (fetched with accept) always are.
+        """
+        store = store or self.store
+        index = index or self.index
+        metadata = index.get(url)
+        conditional = self.validators(metadata)
+        res: Response = self._request('GET', url, headers=conditional, allow_redirects=True, stream=True)
+        with res:
+            self.revalidation['requests'] += 1
+            self.revalidation['round_trips_saved'] += 1  # a HEAD used to precede every GET
+            if conditional:
+                self.revalidation['conditional'] += 1
+                if res.status_code == 304:
+                    self.not_modified(url, metadata)
+                    return metadata
+            if res.status_code in RETRY_STATUSES:
+                raise RetryableError(url, res.status_code)
+            if res.status_code != 200:
+                self._logger.info("ignored url: %s ; status_code=%s", url, res.status_code)
+                return None
+            if accept and not accept(res.headers):
+                self._logger.info("ignored url: %s ; content_type=%s", url, res.headers.get('Content-Type'))
+                return None
+            if accept is None and self.unchanged(res.headers, conditional) and self.cached(dict(res.headers), metadata):
+                # server ignored validators it still matches and the asset looks unchanged; skip the body. Pages are always
+                # read: an edited page of the same length would otherwise be served stale
+                return metadata
+            self.check_size(url, res.headers)
+            ext = self.guess_file_extension(res.headers.get('Content-Type'))
+            with self.reserve_memory(self.buffer_size(res.headers, store)):
+                (destination, blob_digest, size) = store.put(res.iter_content(chunk_size=self.chunk_size), ext,
+                                                             max_size=self.max_asset_bytes)
+            self.downloaded(url, size)
+            metadata = {
+                'url': res.url,
+                'headers': dict(res.headers),
+                'status_code': res.status_code,
+                'elapsed_microseconds': str(res.elapsed.microseconds),
+                'is_permanent_redirect': res.is_permanent_redirect,
+                'is_redirect': res.is_redirect,
+                'links': res.links,
+                'reason': res.reason,
+                'blob': destination,
+                'blob_digest': blob_digest,
+                'size': size,
+            }
+        self._logger.info("write file: %s", destination)
+        index.put(url, metadata)
+        self.digester.submit(index, url, metadata)
+        return metadata
+
+    def download_file(self, url: str, output: str = None) -> str:
+        """ Download a file from a URL to the content-addressed store; returns the blob path.
+        """
+        (store, index) = self.storage(output)
+        metadata = self.fetch(url, store, index)
+        if index is not self._index:
+            self.digester.join()
+            index.close()
+        if metadata:
+            self.telemetry.count('images_total', host=host_key(url))
+        return metadata['blob'] if metadata else None
 
-    @lru_cache(maxsize=1000)
     def ignore_img(self, img_src: str) -> bool:
         """ Returns true if the image source should be ignored.
         """
-        matched = False
-        if self.ignore:
-            for ignore_pattern in self.ignore:
-                if ignore_pattern in img_src:
-                    matched = True
-                    break  # short circuit for loop
-        return matched
+        return self.ignore_rules.matches(img_src)
+
+    def parse(self, content: bytes) -> PageLinks:
+        """ Extract img and a links from HTML in a single pass.
+        """
+        with self.telemetry.timer('parse_seconds'):
+            return self.parser.parse(content)
 
-    def find_img_tags(self, soup: BeautifulSoup, url: str) -> List[str]:  # pylint: disable=R0201
-        """ Find all img tags in HTML and return src attribute.
+    def find_img_tags(self, links: PageLinks, url: str) -> List[str]:
+        """ Find all img tags in HTML and return the image URLs to download.
         """
-        for img in soup.find_all('img'):
-            src: str = img.get('src')
-            if not self.ignore_img(src):
+        for img in links.images:
+            if self.image_policy is None:
+                if img.src and not self.ignore_img(img.src):
+                    yield urljoin(url, img.src)
+                continue
+            variants = [variant for variant in candidates(img) if not self.ignore_img(variant.url)]
+            (chosen, skipped) = self.image_policy.select(variants)
+            self.skip_variants(url, skipped)
+            for src in chosen:
                 yield urljoin(url, src)
 
-    @lru_cache(maxsize=1000)
+    def skip_variants(self, page: str, skipped: List[str]):
+        """ Count the image variants not downloaded and, when probing, the bytes saved.
+        """
+        for src in skipped:
+            variant = urljoin(page, src)
+            if variant in self._skipped_variants:
+                continue
+            self._skipped_variants.add(variant)
+            host = host_key(variant)
+            self.telemetry.count('image_variants_skipped_total', host=host)
+            if self.image_policy.probe:
+                self.telemetry.count('image_bytes_saved_total', self.probe_size(variant), host=host)
+
+    def probe_size(self, url: str) -> int:
+        """ Content-Length of a URL from a HEAD request; 0 if unknown.
+        """
+        try:
+            res = self._request('HEAD', url, allow_redirects=True)
+        except RequestException as ex:
+            self._logger.info("cannot probe %s: %s", url, ex)
+            return 0
+        length = res.headers.get('Content-Length', '')
+        return int(length) if res.ok and length.isdigit() else 0
+
     def follow_href(self, href: str) -> bool:
         """ Returns true if the href should be followed.
         """
-        matched = False
-        if self.follow_href_patterns:
-            for follow_pattern in self.follow_href_patterns:
-                if href.startswith('mailto:'):  # ignore mailto links
-                    break
-                if follow_pattern in href:
-                    matched = True
-                    break  # short circuit for loop
-        else:  # Match on * if no patterns are passed
-            matched = True
-        return matched
-
-    def find_a_tags(self, soup: BeautifulSoup, url: str) -> List[str]:  # pylint: disable=R0201
+        if not self.follow_rules:  # Match on * if no patterns are passed
+            return True
+        return not href.startswith('mailto:') and self.follow_rules.matches(href)
+
+    def find_a_tags(self, links: PageLinks, url: str) -> List[str]:
         """ Find all anchor tags in HTML and return href attribute.
         """
-        for a in soup.find_all('a'):
-            href = a.get('href')
-            if href and self.follow_href(href):
+        for href in links.hrefs:
+            if self.follow_href(href):
                 yield urljoin(url, href)
 
-    @lru_cache(maxsize=100)
+    @cached_method
     def get_content(self, url: str) -> bytes:
         """ Download and return page content.
         """
         self._logger.info("url: %s", url)
         content = None
         if self.render:
-            self.init_selenium()
-            self._driver.get(url)
-            content = self._driver.page_source
+            content = self.init_selenium().render(url)
         else:
-            head: Response = self._session.head(url, headers=self.headers)
-            if head.status_code == 200:
-                content_type = head.headers['Content-Type']
-                if 'text/html' in content_type.lower():
-                    time.sleep(random.randint(0, self.think_time))  # introduce some natural wait time
-                    content = (self._session.get(url, headers=self.headers)).content
-            else:
-                self._logger.info("ignored url: %s ; status_code=%s", url, head.status_code)
+            metadata = self.fetch(url, accept=self.is_html)
+            if metadata:
+                with open(metadata['blob'], 'rb') as file:
+                    content = file.read()
+        if content:
+            self.telemetry.count('pages_total', host=host_key(url))
         return content
 
-    @lru_cache(maxsize=1000)
-    def ignore_href(self, href: str):
+    def ignore_href(self, href: str) -> bool:
         """ Should the href be ignored?
         """
-        return href.lower().startswith('javascript:') or href.endswith('.jpg') or href.endswith('.pdf') or href.endswith('.png')
+        return self.ignore_href_rules.matches(href)
 
-    def _crawl(self, url: str, visited=[], img_links=set(), depth=0) -> List[str]:
-        """ Recursive crawl web site for img tags.
+    def cache_stats(self) -> dict:
+        """ Size and hit rate of every cache of the crawler.
         """
-        if url in visited or depth > self.max_depth:  # base case
-            return
+        return {name: cache.stats for (name, cache) in self.caches.items()}
 
-        content = self.get_content(url)
-        visited.append(url)
-        if content:
-            soup: BeautifulSoup = BeautifulSoup(content, 'html.parser')
-            # add img links to results
-            for link in self.find_img_tags(soup, url):
-                img_links.add(link)
-            # discover other links on page and recurse
-            for link in self.find_a_tags(soup, url):
+    def new_frontier(self) -> Frontier:
+        """ Frontier for one crawl; disk backed and resumable when frontier_path is set.
+        """
+        if self.frontier_path:
+            return SqliteFrontier(self.frontier_path)
+        return Frontier()
+
+    def enqueue(self, frontier: Frontier, url: str, depth: int = 0) -> bool:
+        """ Queue the canonical form of a page; returns True if it is new.
+        """
+        canonical = self.canonicalizer.canonicalize(url)
+        added = frontier.add(canonical, depth)
+        self.canonicalizer.count(url, canonical, added)
+        return added
+
+    def enqueue_image(self, frontier: Frontier, url: str) -> bool:
+        """ Record the canonical form of an image; returns True if it is new.
+        """
+        canonical = self.canonicalizer.canonicalize(url)
+        added = frontier.add_image(canonical)
+        self.canonicalizer.count(url, canonical, added)
+        return added
+
+    def revisit(self, page: str) -> PageLinks:
+        """ Stored links of a page that is not due for a revisit yet; None if it has to be fetched.
+        """
+        if not self.revisit_policy:
+            return None
+        record = self.index.get_page(page)
+        if self.revisit_policy.due(record):
+            return None
+        self.telemetry.count('recrawl_total', result='skipped')
+        return stored_links(record)
+
+    def page_links(self, page: str, content: bytes) -> PageLinks:
+        """ Links of fetched page content; unchanged pages of incremental crawls are not parsed again.
+        """
+        if not self.revisit_policy:
+            return self.parse(content)
+        digest = fingerprint(content)
+        record = self.index.get_page(page)
+        unchanged = record is not None and record['fingerprint'] == digest
+        links = stored_links(record) if unchanged else self.parse(content)
+        self.index.put_page(page, self.revisit_policy.update(record, digest, links))
+        self.telemetry.count('recrawl_total', result='unchanged' if unchanged else 'changed' if record else 'new')
+        return links
+
+    def enqueue_links(self, frontier: Frontier, page: str, depth: int, content: bytes):
+        """ Parse a page and queue its images and, below max_depth, its links.
+        """
+        self.queue_links(frontier, page, depth, self.page_links(page, content))
+
+    def base_url(self, page: str) -> str:
+        """ URL relative links of a page resolve against: the URL it was served from, if it was fetched.
+
+        It differs from the canonical page URL after redirects and when trailing slashes are stripped.
+        """
+        metadata = self.index.get(page)
+        return (metadata.get('url') or page) if metadata else page
+
+    def queue_links(self, frontier: Frontier, page: str, depth: int, links: PageLinks, revisited=False):
+        """ Queue the images and, below max_depth, the links extracted from a page.
+
+        Images of a revisited page that are already in the index are not revalidated.
+        """
+        base = self.base_url(page)
+        # add img links to results
+        for link in self.find_img_tags(links, base):
+            if revisited and self.index.has_url(self.canonicalizer.canonicalize(link)):
+                continue
+            self.enqueue_image(frontier, link)
+        # discover other links on page and queue them for the next depth
+        if depth < self.max_depth:
+            for link in self.find_a_tags(links, base):
                 if not self.ignore_href(link):
-                    self._crawl(link, visited=visited, img_links=img_links, depth=depth + 1)
-        return img_links
+                    self.enqueue(frontier, link, depth + 1)
+
+    def visit(self, frontier: Frontier, page: str, depth: int):
+        """ Fetch a page, unless it is not due for a revisit, and queue its links.
+        """
+        links = self.revisit(page)
+        if links is not None:
+            self.queue_links(frontier, page, depth, links, revisited=True)
+            return
+        content = self.get_content(page)
+        if content:
+            self.enqueue_links(frontier, page, depth, content)
+
+    def _crawl(self, url: str, frontier: Frontier = None) -> Set[str]:
+        """ Breadth-first crawl of a web site for img tags.
+        """
+        frontier = frontier if frontier is not None else Frontier()
+        self.enqueue(frontier, url)
+        item = frontier.pop()
+        while item:
+            (page, depth) = item
+            self.visit(frontier, page, depth)
+            frontier.done(page)
+            item = frontier.pop()
+        return frontier.images()
+
+    def new_pipeline(self) -> Pipeline:
+        """ Pipeline for one crawl with the configured stage sizes.
+        """
+        return Pipeline(self._logger, self, fetch_workers=self.fetch_workers, parse_workers=self.parse_workers,
+                        download_workers=self.download_workers, queue_size=self.pipeline_queue_size,
+                        retry_queue=RetryQueue(max_attempts=self.http_retries, base_delay=self.retry_backoff))
 
     def crawl(self, urls: List[str]) -> (int, List[Exception]):
-        """ Search the HTML for img tags.
-        """
-        files_downloaded = 0
-        exceptions = []
-        for url in urls:
-            self._logger.info("url: %s", url)
-            for img_url in self._crawl(url):
-                try:
-                    dest = self.download_file(img_url)
-                    if dest:
-                        files_downloaded += 1
-                except Exception as ex:
-                    exceptions.append(ex)
-                    raise ex
+        """ Search the HTML for img tags, downloading images while pages are still being crawled.
+
+        Failed pages and images are retried later while the crawl goes on; the ones
+        that still fail are returned with the other exceptions.
+        """
+        frontier = self.new_frontier()
+        if getattr(frontier, 'resumed', False):
+            self._logger.info("resuming crawl from frontier: %s", self.frontier_path)
+        pipeline = self.new_pipeline()
+        try:
+            for url in urls:
+                self._logger.info("url: %s", url)
+            (files_downloaded, exceptions) = pipeline.run(urls, frontier)
+            if not pipeline.download_errors:
+                frontier.clear()  # crawl completed; the next run starts from the targets again
+        finally:
+            frontier.close()
+            self.flush_index()
+            self.shutdown_selenium()
+        self._logger.info("pipeline: %s", dict(pipeline.stats))
+        self._logger.info("canonicalization: %s", self.canonicalizer.stats)
+        self._logger.info("blob store: %s", self.store.stats)
+        self._logger.info("digests: %s", self.digester.stats)
+        if self.digester.near_duplicates:
+            self._logger.info("near duplicates: %s", dict(self.digester.near_duplicates.stats))
+        self._logger.info("revalidation: %s", dict(self.revalidation))
+        self._logger.info("caches: %s", self.cache_stats())
+        self._logger.info("transport: %s", self.transport.stats())
+        self._logger.info("host health: %s", self.health.stats())
         return(files_downloaded, exceptions)
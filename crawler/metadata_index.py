@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+""" Single SQLite index of asset metadata.
+
+Replaces the ``<sha1>-metadata.json`` sidecar written next to every asset.
+Existing sidecars can be imported with::
+
+    python3 -m crawler.metadata_index output [--index output/index.sqlite] [--remove]
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Set, Tuple
+
+
+class MetadataIndex:
+    """ SQLite (WAL mode) index of asset metadata keyed by URL.
+
+    Writes are buffered and committed in batches of ``batch_size``; lookups see
+    buffered writes, so "do we already have this URL/hash?" never touches the
+    asset files themselves. Incremental crawls also keep a record per page
+    (fingerprint, extracted links, revisit schedule) in the same database.
+    With ``background=True`` full batches are committed by a writer thread
+    over its own connection, so ``put`` never waits on the disk.
+    """
+
+    def __init__(self, path: str, batch_size=100, background=False):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: Dict[str, dict] = {}
+        self._pending_pages: Dict[str, dict] = {}
+        self._writing: Dict[str, dict] = {}  # batch being committed; still visible to lookups
+        self._writing_pages: Dict[str, dict] = {}
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = self._connect()
+        self._write_db = self._connect()  # WAL lets lookups go on while a batch is committed
+        self._closed = False
+        self._wake = threading.Event()
+        self._writer: threading.Thread = None
+        if background:
+            self._writer = threading.Thread(target=self._write_batches, name='index-writer', daemon=True)
+            self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS assets (
+                url TEXT PRIMARY KEY,
+                blob TEXT,
+                blob_digest TEXT,
+                size INTEGER,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS assets_blob_digest ON assets (blob_digest);
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                record TEXT NOT NULL
+            );
+        """)
+        db.commit()
+        return db
+
+    def get(self, url: str) -> dict:
+        """ Metadata stored for url or None.
+        """
+        with self._lock:
+            for buffered in (self._pending, self._writing):
+                if url in buffered:
+                    return buffered[url]
+            row = self._db.execute('SELECT metadata FROM assets WHERE url = ?', (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def has_url(self, url: str) -> bool:
+        """ Do we already have an asset for url?
+        """
+        with self._lock:
+            if url in self._pending or url in self._writing:
+                return True
+            return self._db.execute('SELECT 1 FROM assets WHERE url = ?', (url,)).fetchone() is not None
+
+    def has_digest(self, blob_digest: str) -> bool:
+        """ Do we already have an asset with this content digest?
+        """
+        with self._lock:
+            if any(metadata.get('blob_digest') == blob_digest
+                   for buffered in (self._pending, self._writing) for metadata in buffered.values()):
+                return True
+            return self._db.execute('SELECT 1 FROM assets WHERE blob_digest = ? LIMIT 1',
+                                    (blob_digest,)).fetchone() is not None
+
+    def blob_digests(self) -> Set[str]:
+        """ Content digests of every blob an asset points at.
+        """
+        self.flush()
+        with self._lock:
+            return {row[0] for row in self._db.execute('SELECT DISTINCT blob_digest FROM assets')}
+
+    def image_hashes(self) -> Iterator[Tuple[str, str]]:
+        """ (url, image_hash) of the indexed images that are not near-duplicates of another image.
+        """
+        self.flush()
+        with self._lock:
+            rows = self._db.execute("SELECT url, json_extract(metadata, '$.image_hash') FROM assets "
+                                    "WHERE json_extract(metadata, '$.image_hash') IS NOT NULL "
+                                    "AND json_extract(metadata, '$.near_duplicate_of') IS NULL").fetchall()
+        yield from rows
+
+    def put(self, url: str, metadata: dict):
+        """ Buffer the metadata of url; flushed once a batch is full.
+        """
+        with self._lock:
+            self._pending[url] = metadata
+            full = len(self._pending) >= self.batch_size
+        if full:  # outside the lock: flush takes the write lock first
+            self._batch_full()
+
+    def put_many(self, records: List[dict]):
+        """ Buffer many metadata records keyed by their url.
+        """
+        for metadata in records:
+            self.put(metadata['url'], metadata)
+
+    def get_page(self, url: str) -> dict:
+        """ Incremental crawl record of a page or None.
+        """
+        with self._lock:
+            for buffered in (self._pending_pages, self._writing_pages):
+                if url in buffered:
+                    return dict(buffered[url])
+            row = self._db.execute('SELECT record FROM pages WHERE url = ?', (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_page(self, url: str, record: dict):
+        """ Buffer the incremental crawl record of a page.
+        """
+        with self._lock:
+            self._pending_pages[url] = record
+            full = len(self._pending) + len(self._pending_pages) >= self.batch_size
+        if full:
+            self._batch_full()
+
+    def _batch_full(self):
+        if self._writer is not None:
+            self._wake.set()
+        else:
+            self.flush()
+
+    def _write_batches(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """ Commit all buffered writes in one transaction.
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._pending and not self._pending_pages:
+                    return
+                (self._writing, self._writing_pages) = (self._pending, self._pending_pages)
+                (self._pending, self._pending_pages) = ({}, {})
+            rows = [(url, metadata.get('blob'), metadata.get('blob_digest'), metadata.get('size'), json.dumps(metadata))
+                    for (url, metadata) in self._writing.items()]
+            with self._write_db:
+                self._write_db.executemany('INSERT OR REPLACE INTO assets (url, blob, blob_digest, size, metadata) '
+                                           'VALUES (?, ?, ?, ?, ?)', rows)
+                self._write_db.executemany('INSERT OR REPLACE INTO pages (url, record) VALUES (?, ?)',
+                                           [(url, json.dumps(record)) for (url, record) in self._writing_pages.items()])
+            with self._lock:
+                (self._writing, self._writing_pages) = ({}, {})
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM assets').fetchone()[0]
+
+    def close(self):
+        """ Flush and release the database.
+        """
+        self._closed = True
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join()
+        self.flush()
+        with self._lock:
+            self._db.close()
+            self._write_db.close()
+
+    def import_sidecars(self, directory: str, remove=False) -> int:
+        """ Import ``*-metadata.json`` sidecars from directory; returns the number imported.
+
+        Sidecars are keyed by the final response URL they recorded. Sidecars that
+        predate the blob store point at the ``<sha1>.<ext>`` asset next to them.
+        """
+        imported = 0
+        for metadata_file in glob.iglob(os.path.join(directory, '*-metadata.json')):
+            try:
+                with open(metadata_file) as file:
+                    metadata = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if not metadata.get('blob'):
+                prefix = metadata_file[:-len('-metadata.json')]
+                assets = [name for name in glob.glob(prefix + '*') if name != metadata_file]
+                if assets:
+                    metadata['blob'] = assets[0]
+                    metadata['size'] = os.path.getsize(assets[0])
+            self.put(metadata['url'], metadata)
+            imported += 1
+            if remove:
+                os.remove(metadata_file)
+        self.flush()
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import metadata sidecar files into a metadata index.')
+    parser.add_argument('directory', help='directory holding the *-metadata.json files')
+    parser.add_argument('--index', help='index database; defaults to <directory>/index.sqlite')
+    parser.add_argument('--remove', action='store_true', help='delete sidecars once imported')
+    args = parser.parse_args()
+    index = MetadataIndex(args.index or os.path.join(args.directory, 'index.sqlite'))
+    imported = index.import_sidecars(args.directory, remove=args.remove)
+    index.close()
+    print(f'imported {imported} sidecar files into {index.path}')
+
+
+if __name__ == '__main__':
+    main()
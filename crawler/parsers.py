@@ -0,0 +1,160 @@
+""" Link extraction from HTML pages.
+
+Extractors make a single pass over the markup and only keep ``img`` and ``a``
+attributes; no document tree is built. ``lxml`` is optional and used when
+installed. Lazy-loaded images (``data-src``/``data-srcset``) report their real
+source, and the ``<source>`` candidates of a ``<picture>`` are added to the
+srcset of its ``img``.
+"""
+from collections import namedtuple
+from html.parser import HTMLParser
+from typing import Dict, List
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is optional
+    etree = None
+
+ImageTag = namedtuple('ImageTag', ['src', 'srcset'])
+PageLinks = namedtuple('PageLinks', ['images', 'hrefs'])
+
+
+def decode(content) -> str:
+    """ Page content as text; UTF-8 first, then the declared or detected encoding.
+    """
+    if isinstance(content, bytes):
+        try:
+            return content.decode('utf-8')
+        except UnicodeDecodeError:
+            from bs4 import UnicodeDammit  # pylint: disable=C0415; bs4 is slow to import and rarely needed
+            return UnicodeDammit(content, is_html=True).unicode_markup or ''
+    return content
+
+
+TAGS = ('img', 'a', 'picture', 'source')
+
+
+class _LinkCollector:
+    """ Collects img and a attributes from start tag events.
+    """
+
+    def __init__(self):
+        self.images: List[ImageTag] = []
+        self.hrefs: List[str] = []
+        self._sources: List[str] = None  # srcsets of the open picture element
+
+    def start(self, tag: str, attrs: Dict[str, str]):
+        if tag == 'img':
+            src = attrs.get('data-src') or attrs.get('src')
+            srcsets = (self._sources or []) + [attrs.get('data-srcset') or attrs.get('srcset')]
+            srcset = ', '.join(srcset for srcset in srcsets if srcset) or None
+            if src or srcset:
+                self.images.append(ImageTag(src, srcset))
+        elif tag == 'a':
+            href = attrs.get('href')
+            if href:
+                self.hrefs.append(href)
+        elif tag == 'picture':
+            self._sources = []
+        elif tag == 'source' and self._sources is not None:
+            self._sources.append(attrs.get('data-srcset') or attrs.get('srcset'))
+
+    def end(self, tag: str):
+        if tag == 'picture':
+            self._sources = None
+
+    def links(self) -> PageLinks:
+        return PageLinks(self.images, self.hrefs)
+
+
+class _StdlibLinkParser(HTMLParser):  # pylint: disable=W0223
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.collector = _LinkCollector()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in TAGS:
+            self.collector.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+
+class _LxmlTarget(_LinkCollector):
+    """ lxml parser target; events are delivered without building a tree.
+    """
+
+    def data(self, data):
+        pass
+
+    def close(self) -> PageLinks:
+        return self.links()
+
+
+class HtmlParserExtractor:  # pylint: disable=R0903
+    """ Streaming extractor on top of the standard library ``HTMLParser``.
+    """
+    name = 'html.parser'
+
+    def parse(self, content) -> PageLinks:  # pylint: disable=R0201
+        """ img and a links of the page, in document order.
+        """
+        parser = _StdlibLinkParser()
+        parser.feed(decode(content))
+        parser.close()
+        return parser.collector.links()
+
+
+class LxmlExtractor:  # pylint: disable=R0903
+    """ Streaming extractor on top of lxml's C HTML parser.
+    """
+    name = 'lxml'
+
+    def parse(self, content) -> PageLinks:  # pylint: disable=R0201
+        """ img and a links of the page, in document order.
+        """
+        if not content:
+            return PageLinks([], [])
+        parser = etree.HTMLParser(target=_LxmlTarget())
+        parser.feed(decode(content))
+        return parser.close()
+
+
+class SoupExtractor:  # pylint: disable=R0903
+    """ BeautifulSoup extractor, limited to img and a tags with a SoupStrainer.
+    """
+    name = 'bs4'
+
+    def parse(self, content) -> PageLinks:  # pylint: disable=R0201
+        """ img and a links of the page, in document order.
+        """
+        from bs4 import BeautifulSoup, SoupStrainer  # pylint: disable=C0415
+        collector = _LinkCollector()
+        soup = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer(list(TAGS)))
+        for tag in soup.find_all(['img', 'a']):
+            picture = tag.parent if tag.name == 'img' and tag.parent and tag.parent.name == 'picture' else None
+            if picture:
+                collector.start('picture', picture.attrs)
+                for source in picture.find_all('source'):
+                    collector.start('source', source.attrs)
+            collector.start(tag.name, tag.attrs)
+            if picture:
+                collector.end('picture')
+        return collector.links()
+
+
+PARSERS = {extractor.name: extractor for extractor in (HtmlParserExtractor, LxmlExtractor, SoupExtractor)}
+DEFAULT_PARSER = 'lxml' if etree is not None else 'html.parser'
+
+
+def get_parser(name: str = DEFAULT_PARSER):
+    """ Link extractor registered under name.
+    """
+    if name not in PARSERS:
+        raise ValueError(f"unknown parser: {name}; expected one of {sorted(PARSERS)}")
+    if name == 'lxml' and etree is None:
+        raise ValueError("the lxml parser requires the lxml package")
+    return PARSERS[name]()
@@ -0,0 +1,253 @@
+""" Perceptual image hashes and near-duplicate detection.
+
+The same portrait is often re-encoded, resized or cropped from one listing to
+the next, so its bytes (and blob) differ while the picture does not. A 64-bit
+perceptual hash (aHash, dHash or pHash, computed with NumPy) changes little
+under such edits; two images whose hashes differ in at most a few bits are
+near-duplicates. ``HammingIndex`` finds them with multi-index hashing: the
+hash is split into chunks, and by the pigeonhole principle a near-duplicate
+matches at least one chunk within a small radius, so a lookup only probes a
+few hundred buckets instead of every stored hash.
+
+NumPy is needed for hashing and lookups, and Pillow for decoding images; both
+are imported on first use::
+
+    pip install numpy Pillow
+"""
+import functools
+import threading
+from collections import Counter
+from itertools import combinations
+from typing import Dict, Iterator, List, Tuple
+
+from .metadata_index import MetadataIndex
+
+np = None  # numpy; optional and slow to import, see _require_numpy
+HASH_SIZE = 8  # 8x8 = 64 bit hashes
+ACTIONS = ('flag', 'skip')
+
+
+def _require_numpy():
+    global np  # pylint: disable=W0603,C0103
+    if np is None:
+        try:
+            import numpy  # pylint: disable=C0415
+        except ImportError as ex:
+            raise ValueError("perceptual hashes require numpy: pip install numpy Pillow") from ex
+        np = numpy
+
+
+def load_pixels(path: str) -> 'np.ndarray':
+    """ Grayscale pixels of an image file as a float array.
+    """
+    _require_numpy()
+    try:
+        from PIL import Image  # pylint: disable=C0415; only needed to decode images
+    except ImportError as ex:
+        raise ValueError("perceptual hashes require Pillow to decode images: pip install Pillow") from ex
+    with Image.open(path) as image:
+        return np.asarray(image.convert('L'), dtype=np.float64)
+
+
+def _shrink(pixels: 'np.ndarray', size: int, axis: int) -> 'np.ndarray':
+    length = pixels.shape[axis]
+    if length < size:  # too small; repeat pixels
+        return np.take(pixels, np.arange(size) * length // size, axis=axis)
+    starts = np.arange(size) * length // size
+    counts = np.diff(np.append(starts, length))
+    shape = [1, 1]
+    shape[axis] = size
+    return np.add.reduceat(pixels, starts, axis=axis) / counts.reshape(shape)
+
+
+def resize(pixels: 'np.ndarray', height: int, width: int) -> 'np.ndarray':
+    """ Area-averaged resize of a grayscale image.
+    """
+    _require_numpy()
+    return _shrink(_shrink(pixels, height, 0), width, 1)
+
+
+def _to_int(bits: 'np.ndarray') -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def average_hash(pixels: 'np.ndarray', size: int = HASH_SIZE) -> int:
+    """ aHash: which pixels of the shrunken image are brighter than its mean.
+    """
+    small = resize(pixels, size, size)
+    return _to_int(small > small.mean())
+
+
+def difference_hash(pixels: 'np.ndarray', size: int = HASH_SIZE) -> int:
+    """ dHash: which pixels of the shrunken image are brighter than their right neighbour.
+    """
+    small = resize(pixels, size, size + 1)
+    return _to_int(small[:, :-1] > small[:, 1:])
+
+
+@functools.lru_cache(maxsize=8)
+def _dct_matrix(size: int) -> 'np.ndarray':
+    (k, i) = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * size))
+
+
+def perceptual_hash(pixels: 'np.ndarray', size: int = HASH_SIZE, highfreq_factor: int = 4) -> int:
+    """ pHash: which low frequency DCT coefficients of the shrunken image are above their median.
+    """
+    _require_numpy()
+    side = size * highfreq_factor
+    dct = _dct_matrix(side)
+    coefficients = (dct @ resize(pixels, side, side) @ dct.T)[:size, :size]
+    return _to_int(coefficients > np.median(coefficients))
+
+
+HASHES = {'ahash': average_hash, 'dhash': difference_hash, 'phash': perceptual_hash}
+
+
+def hamming(first: int, second: int) -> int:
+    """ Number of bits in which two hashes differ.
+    """
+    return bin(first ^ second).count('1')
+
+
+def _popcount(values: 'np.ndarray') -> 'np.ndarray':
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(len(values), -1).sum(axis=1)
+
+
+class HammingIndex:
+    """ 64-bit hashes searchable by Hamming distance up to max_distance (multi-index hashing).
+
+    Each hash is split into ``chunks`` chunks with a table per chunk. Any hash
+    within max_distance of a query differs in at most max_distance // chunks
+    bits in one of its chunks; those buckets are probed and their hashes
+    compared with the query in one vectorized pass. Three ~21 bit chunks keep
+    both the probes and the candidates per lookup in the hundreds for a
+    million 64-bit hashes and max_distance up to 8. Not thread-safe.
+    """
+
+    def __init__(self, max_distance: int = 8, bits: int = 64, chunks: int = 3):
+        _require_numpy()
+        self.max_distance = max_distance
+        self.bits = bits
+        self.chunks = chunks
+        self.radius = max_distance // chunks  # bits that may differ in the matching chunk
+        bounds = [bits * chunk // chunks for chunk in range(chunks + 1)]
+        self._chunks = [(start, (1 << (end - start)) - 1) for (start, end) in zip(bounds, bounds[1:])]
+        self._flips = [[sum(1 << bit for bit in flipped) for distance in range(self.radius + 1)
+                        for flipped in combinations(range(end - start), distance)]
+                       for (start, end) in zip(bounds, bounds[1:])]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self.keys: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _split(self, value: int) -> Iterator[Tuple[int, int]]:
+        for (chunk, (shift, mask)) in enumerate(self._chunks):
+            yield (chunk, (value >> shift) & mask)
+
+    def add(self, key: str, value: int):
+        """ Store the hash of key.
+        """
+        position = len(self.keys)
+        if position == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros(len(self._hashes), dtype=np.uint64)])
+        self._hashes[position] = value
+        self.keys.append(key)
+        for (chunk, part) in self._split(value):
+            self._tables[chunk].setdefault(part, []).append(position)
+
+    def query(self, value: int, max_distance: int = None) -> List[Tuple[str, int]]:
+        """ (key, distance) of the stored hashes within max_distance of value, nearest first.
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"the index only finds hashes within {self.max_distance} bits")
+        candidates = set()
+        for (chunk, part) in self._split(value):
+            table = self._tables[chunk]
+            for flip in self._flips[chunk]:
+                candidates.update(table.get(part ^ flip, ()))
+        if not candidates:
+            return []
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = _popcount(self._hashes[positions] ^ np.uint64(value))
+        near = np.flatnonzero(distances <= max_distance)
+        return sorted(((self.keys[positions[found]], int(distances[found])) for found in near),
+                      key=lambda hit: (hit[1], hit[0]))
+
+
+class NearDuplicates:
+    """ Flags, or skips, downloaded images whose perceptual hash is near one seen before.
+
+    Flagged records get ``near_duplicate_of`` (the URL of the first image) and
+    ``near_duplicate_distance``. With ``action='skip'`` the record also points
+    at the blob of the first image and gets its ``blob_size``; the new blob is
+    left on disk, since another download may be committing the same content,
+    for ``BlobStore.collect`` to remove once nothing refers to it. Images seen
+    by earlier crawls are loaded from the metadata index on first use.
+    """
+
+    def __init__(self, max_distance: int = 8, action: str = 'flag', algorithm: str = 'phash'):
+        if action not in ACTIONS:
+            raise ValueError(f"unknown near-duplicate action: {action}; expected one of {list(ACTIONS)}")
+        if algorithm not in HASHES:
+            raise ValueError(f"unknown perceptual hash: {algorithm}; expected one of {sorted(HASHES)}")
+        self.max_distance = max_distance
+        self.action = action
+        self.algorithm = algorithm
+        self.index = HammingIndex(max_distance)
+        self.stats = Counter()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def settings(self) -> dict:
+        """ Keyword arguments creating an empty detector with the same settings.
+        """
+        return {'max_distance': self.max_distance, 'action': self.action, 'algorithm': self.algorithm}
+
+    def image_hash(self, path: str) -> str:
+        """ Perceptual hash of an image file, tagged with its algorithm.
+        """
+        return f'{self.algorithm}:{HASHES[self.algorithm](load_pixels(path)):016x}'
+
+    def _value(self, image_hash: str) -> int:
+        (algorithm, _, value) = image_hash.partition(':')
+        return int(value, 16) if algorithm == self.algorithm and value else None
+
+    def load(self, index: MetadataIndex):
+        """ Add the images of earlier crawls that are not near-duplicates themselves.
+        """
+        for (url, image_hash) in index.image_hashes():
+            value = self._value(image_hash)
+            if value is not None:
+                self.index.add(url, value)
+
+    def check(self, index: MetadataIndex, url: str, record: dict) -> dict:
+        """ The record of a downloaded image, flagged if it is a near-duplicate.
+        """
+        value = self._value(record.get('image_hash') or '')
+        if value is None:
+            return record
+        with self._lock:
+            if not self._loaded:
+                self.load(index)
+                self._loaded = True
+            self.stats['images'] += 1
+            matches = [(key, distance) for (key, distance) in self.index.query(value) if key != url]
+            if not matches:
+                self.index.add(url, value)
+                return record
+            (original, distance) = matches[0]
+            self.stats['near_duplicates'] += 1
+        record = {**record, 'near_duplicate_of': original, 'near_duplicate_distance': distance}
+        kept = index.get(original)
+        if self.action == 'skip' and kept and kept.get('blob') and kept['blob'] != record['blob']:
+            self.stats['bytes_saved'] += record.get('size', 0)  # once the blob is collected
+            # size stays the served size, which cache checks compare with Content-Length
+            record.update(blob=kept['blob'], blob_digest=kept['blob_digest'],
+                          blob_size=kept.get('blob_size', kept.get('size')))
+        return record
@@ -0,0 +1,235 @@
+""" Staged crawl pipeline.
+
+Pages flow through fetch -> parse -> filter; images found by the filter stage
+flow through download -> record as soon as they are discovered. Stages run
+their own worker threads and are joined by bounded queues, so a slow stage
+blocks the stages feeding it instead of letting fetched pages pile up in
+memory. The frontier is the only unbounded buffer and it only holds URLs.
+Pages and images that fail transiently go to a retry queue and re-enter the
+pipeline once their delay is up, so other work keeps flowing meanwhile.
+"""
+import queue
+import threading
+from collections import Counter, deque
+from logging import Logger
+from typing import List, Tuple
+
+from .frontier import Frontier
+from .health import CircuitOpen, RetryQueue, is_retryable
+
+_STOP = object()
+
+
+class _PipelineFrontier:
+    """ Thread-safe view of a frontier that feeds newly found images to the download stage.
+    """
+
+    def __init__(self, pipeline: 'Pipeline', frontier: Frontier):
+        self._pipeline = pipeline
+        self._frontier = frontier
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        with self._pipeline.condition:
+            added = self._frontier.add(url, depth)
+            if added:
+                self._pipeline.outstanding += 1
+                self._pipeline.condition.notify_all()  # the retry thread waits here too
+        return added
+
+    def add_image(self, url: str) -> bool:
+        with self._pipeline.condition:
+            added = self._frontier.add_image(url)
+            if added:
+                self._pipeline.outstanding += 1
+        if added:
+            self._pipeline.downloads.put(url)  # blocks while downloads are behind
+        return added
+
+
+class Pipeline:
+    """ Crawl with separately sized worker pools per stage.
+
+    ``fetch_workers`` download pages, ``parse_workers`` extract their links and
+    one filter worker canonicalizes, deduplicates and queues them.
+    ``download_workers`` fetch images and one recorder marks them done.
+    ``queue_size`` bounds every queue between stages.
+    """
+
+    def __init__(self, logger: Logger, crawler, fetch_workers=2, parse_workers=1, download_workers=4, queue_size=16,
+                 retry_queue: RetryQueue = None):
+        self._logger = logger
+        self.crawler = crawler
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.download_workers = download_workers
+        self.queue_size = queue_size
+        self.condition = threading.Condition()
+        self.outstanding = 0  # pages and images queued but not finished yet
+        self.stats = Counter()
+        self.exceptions: List[Exception] = []
+        self.download_errors: List[Exception] = []
+        self.parses = queue.Queue(queue_size)
+        self.filters = queue.Queue(queue_size)
+        self.downloads = queue.Queue(queue_size)
+        self.records = queue.Queue(queue_size)
+        self.retry_queue = retry_queue if retry_queue is not None else RetryQueue(max_attempts=0)
+        self._retry_pages = deque()  # deferred pages that are due again
+        self._stopping = False
+        self._frontier: Frontier = None
+        self._view: _PipelineFrontier = None
+
+    def _finish(self):
+        with self.condition:
+            self.outstanding -= 1
+            if not self.outstanding:
+                self.condition.notify_all()
+
+    def _fail(self, url: str, ex: Exception, download=False):
+        self._logger.warning("failed to %s %s: %s", 'download' if download else 'crawl', url, ex)
+        with self.condition:
+            self.exceptions.append(ex)
+            if download:
+                self.download_errors.append(ex)
+
+    def _defer(self, item: tuple, ex: Exception) -> bool:
+        """ Put a transiently failed page or image on the retry queue; False if it is not retried.
+        """
+        sent = not isinstance(ex, CircuitOpen)
+        if not is_retryable(ex) or not self.retry_queue.defer(item, getattr(ex, 'retry_in', 0.0), sent):
+            return False
+        self._logger.info("retrying %s later: %s", item[1], ex)
+        with self.condition:
+            self.stats['deferred'] += 1
+            self.condition.notify_all()
+        return True
+
+    def _retry(self):
+        """ Feed deferred pages and images back into the pipeline when they are due.
+        """
+        while True:
+            with self.condition:
+                if self._stopping:
+                    return
+                self.condition.wait(self.retry_queue.next_due_in())
+            for item in self.retry_queue.pop_due():
+                if item[0] == 'page':
+                    with self.condition:
+                        self._retry_pages.append(item[1:])
+                        self.condition.notify_all()
+                else:
+                    self.downloads.put(item[1])
+
+    def _next_page(self) -> Tuple[str, int]:
+        with self.condition:
+            while True:
+                if self._retry_pages:
+                    return self._retry_pages.popleft()
+                item = self._frontier.pop()
+                if item or not self.outstanding:
+                    return item
+                self.condition.wait()
+
+    def _fetch(self):
+        item = self._next_page()
+        while item:
+            (page, depth) = item
+            try:
+                links = self.crawler.revisit(page)
+                content = None if links is not None else self.crawler.get_content(page)
+            except Exception as ex:  # pylint: disable=W0703
+                (links, content) = (None, None)
+                if self._defer(('page', page, depth), ex):
+                    item = self._next_page()
+                    continue
+                self._fail(page, ex)
+            if links is not None:
+                self.filters.put((page, depth, links, True))
+            elif content:
+                self.parses.put((page, depth, content))
+            else:
+                self._page_done(page)
+            item = self._next_page()
+
+    def _parse(self, item):
+        (page, depth, content) = item
+        self.filters.put((page, depth, self.crawler.page_links(page, content), False))
+
+    def _filter(self, item):
+        (page, depth, links, revisited) = item
+        self.crawler.queue_links(self._view, page, depth, links, revisited=revisited)
+        self._page_done(page)
+
+    def _page_done(self, page: str):
+        with self.condition:
+            self._frontier.done(page)
+            self.stats['pages'] += 1
+        self._finish()
+
+    def _download(self, url: str):
+        try:
+            self.records.put((url, self.crawler.download_file(url), None))
+        except Exception as ex:  # pylint: disable=W0703
+            self.records.put((url, None, ex))
+
+    def _record(self, item):
+        (url, blob, error) = item
+        if error and self._defer(('image', url), error):
+            return  # still outstanding
+        if error:
+            self._fail(url, error, download=True)
+        else:
+            with self.condition:
+                self._frontier.image_done(url)
+                self.stats['images'] += 1
+                self.stats['files_downloaded'] += 1 if blob else 0
+        self._finish()
+
+    def _worker(self, inbox: queue.Queue, handler, fail_item):
+        for item in iter(inbox.get, _STOP):
+            try:
+                handler(item)
+            except Exception as ex:  # pylint: disable=W0703
+                fail_item(item, ex)
+
+    def _fail_page(self, item, ex: Exception):
+        self._fail(item[0], ex)
+        self._page_done(item[0])
+
+    def _fail_record(self, item, ex: Exception):
+        self._fail(item[0], ex, download=True)
+        self._finish()
+
+    def run(self, urls: List[str], frontier: Frontier) -> (int, List[Exception]):
+        """ Crawl the targets into frontier and download their images; returns (files, exceptions).
+        """
+        self._frontier = frontier
+        self._view = _PipelineFrontier(self, frontier)
+        leftover_images = frontier.images()  # pages and images left over by an interrupted run
+        with self.condition:
+            self.outstanding = len(frontier) + len(leftover_images)
+        for url in urls:
+            self.crawler.enqueue(self._view, url)
+        stages = [(self.parses, self._parse, self._fail_page, self.parse_workers),
+                  (self.filters, self._filter, self._fail_page, 1),
+                  (self.downloads, self._download, self._fail_record, self.download_workers),
+                  (self.records, self._record, self._fail_record, 1)]
+        threads = [threading.Thread(target=self._fetch, name=f'fetch-{num}', daemon=True)
+                   for num in range(self.fetch_workers)]
+        threads.append(threading.Thread(target=self._retry, name='retry', daemon=True))
+        threads += [threading.Thread(target=self._worker, args=(inbox, handler, fail), daemon=True)
+                    for (inbox, handler, fail, workers) in stages for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for url in leftover_images:
+            self.downloads.put(url)
+        with self.condition:
+            while self.outstanding:
+                self.condition.wait()
+            self._stopping = True
+            self.condition.notify_all()
+        for (inbox, _, _, workers) in stages:
+            for _ in range(workers):
+                inbox.put(_STOP)
+        for thread in threads:
+            thread.join()
+        return (self.stats['files_downloaded'], self.exceptions)
@@ -0,0 +1,249 @@
+""" Multi-process crawl execution.
+
+A coordinator process owns the frontier and shards every page and image by a
+hash of its host across worker processes. Each worker runs its own crawler
+(session, parser, politeness scheduler) so parsing scales across CPU cores,
+and every host is only ever contacted by a single worker.
+"""
+import hashlib
+import logging
+import multiprocessing
+import queue
+import time
+from collections import Counter
+from logging import Logger
+from typing import Dict, List
+
+from .budget import ByteBudget
+from .canonical import DEFAULT_STRIP_PARAMS, Canonicalizer
+from .crawler import Crawler
+from .frontier import Frontier, SqliteFrontier
+from .health import HealthTracker
+from .html_crawler import HtmlCrawler
+from .phash import NearDuplicates
+from .scheduler import HostScheduler, host_key
+from .telemetry import Telemetry
+
+
+class WorkerError(Exception):
+    """ A page or image failed in a worker process.
+    """
+
+    def __init__(self, url: str, message: str):
+        super().__init__(url, message)  # both args so the error pickles back to the coordinator
+        self.url = url
+        self.message = message
+
+    def __str__(self) -> str:
+        return f"{self.url}: {self.message}"
+
+
+def shard(url: str, shards: int) -> int:
+    """ Worker owning the host of url; stable across processes and runs.
+    """
+    digest = hashlib.sha1(host_key(url).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % shards
+
+
+def _discovered(frontier: Frontier) -> (list, list):
+    """ Pages and images collected by a per-page frontier.
+    """
+    pages = []
+    item = frontier.pop()
+    while item:
+        pages.append(item)
+        item = frontier.pop()
+    return (pages, sorted(frontier.images()))
+
+
+def _worker(worker_id: int, crawler_class, crawler_kwargs: dict, logger_name: str, inbox, results):
+    """ Worker process: crawl pages and download images until told to stop.
+    """
+    crawler: HtmlCrawler = crawler_class(logging.getLogger(logger_name), **crawler_kwargs)
+    stats = Counter()
+    try:
+        for message in iter(inbox.get, None):
+            (kind, url, depth) = message
+            try:
+                if kind == 'page':
+                    started_at = time.perf_counter()
+                    page_frontier = Frontier()
+                    links = crawler.revisit(url)
+                    if links is not None:
+                        crawler.queue_links(page_frontier, url, depth, links, revisited=True)
+                    content = None if links is not None else crawler.get_content(url)
+                    parsed_at = time.perf_counter()
+                    if content:
+                        crawler.enqueue_links(page_frontier, url, depth, content)
+                    stats['fetch_seconds'] += parsed_at - started_at
+                    stats['parse_seconds'] += time.perf_counter() - parsed_at
+                    stats['pages'] += 1
+                    results.put(('page', worker_id, url) + _discovered(page_frontier) + (None,))
+                else:
+                    blob = crawler.download_file(url)
+                    stats['images'] += 1
+                    stats['files_downloaded'] += 1 if blob else 0
+                    results.put(('image', worker_id, url, blob, None))
+            except Exception as ex:  # pylint: disable=W0703
+                stats['errors'] += 1
+                error = WorkerError(url, repr(ex))
+                results.put(('page', worker_id, url, [], [], error) if kind == 'page'
+                            else ('image', worker_id, url, None, error))
+    finally:
+        crawler.flush_index()
+        crawler.shutdown_selenium()
+        stats.update(crawler.revalidation)
+        results.put(('stats', worker_id, dict(stats), crawler.telemetry.export()))
+
+
+class ProcessRunner(Crawler):
+    """ Crawl with a pool of worker processes sharded by host.
+
+    The coordinator keeps the only frontier, so pages are deduplicated across
+    workers; workers send discovered pages, images and their stats back. Images
+    are downloaded as soon as they are discovered. Shared schedulers, health
+    trackers, near-duplicate detectors and byte budgets can not cross process
+    boundaries: every worker gets its own copy with the same settings, and an
+    equal share of the byte budget. Worker telemetry is merged into the
+    runner's telemetry when the workers stop.
+    """
+
+    def __init__(self, logger: Logger, workers: int = None, crawler_class=HtmlCrawler, start_method: str = None,
+                 frontier_path: str = None, scheduler: HostScheduler = None, byte_budget: ByteBudget = None,
+                 telemetry: Telemetry = None, **crawler_kwargs):
+        super().__init__(logger)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.crawler_class = crawler_class
+        self.start_method = start_method
+        self.frontier_path = frontier_path
+        self.scheduler = scheduler
+        self.byte_budget = byte_budget
+        self.telemetry = telemetry or Telemetry()
+        self.crawler_kwargs = crawler_kwargs
+        self.canonicalizer = Canonicalizer(crawler_kwargs.get('strip_params', DEFAULT_STRIP_PARAMS),
+                                           crawler_kwargs.get('strip_trailing_slash', False))
+        self.stats: Dict[str, float] = {}
+        self.worker_stats: Dict[int, dict] = {}
+
+    def worker_kwargs(self) -> dict:
+        """ Picklable keyword arguments of the per-worker crawlers.
+        """
+        kwargs = dict(self.crawler_kwargs)
+        if self.scheduler:
+            kwargs['scheduler'] = HostScheduler(self.scheduler.delay, self.scheduler.jitter, self.scheduler.max_delay)
+        if kwargs.get('health'):
+            kwargs['health'] = HealthTracker(**kwargs['health'].settings())
+        if kwargs.get('near_duplicates'):
+            kwargs['near_duplicates'] = NearDuplicates(**kwargs['near_duplicates'].settings())
+        if self.byte_budget:
+            kwargs['byte_budget'] = ByteBudget(max(1, self.byte_budget.max_bytes // self.workers))
+        return kwargs
+
+    def new_frontier(self) -> Frontier:
+        """ Coordinator frontier; disk backed and resumable when frontier_path is set.
+        """
+        if self.frontier_path:
+            return SqliteFrontier(self.frontier_path)
+        return Frontier()
+
+    def crawl(self, urls: List[str]) -> (int, List[Exception]):
+        """ Crawl the targets and download their images with all workers.
+        """
+        context = multiprocessing.get_context(self.start_method)
+        results = context.Queue()
+        inboxes = [context.Queue() for _ in range(self.workers)]
+        processes = [context.Process(target=_worker, name=f'crawler-{worker_id}', daemon=True,
+                                     args=(worker_id, self.crawler_class, self.worker_kwargs(), self._logger.name,
+                                           inboxes[worker_id], results))
+                     for worker_id in range(self.workers)]
+        for process in processes:
+            process.start()
+        frontier = self.new_frontier()
+        if getattr(frontier, 'resumed', False):
+            self._logger.info("resuming crawl from frontier: %s", self.frontier_path)
+        started_at = time.monotonic()
+        try:
+            (files_downloaded, exceptions) = self._coordinate(urls, frontier, inboxes, results, processes)
+            if not exceptions:
+                frontier.clear()  # crawl completed; the next run starts from the targets again
+        finally:
+            for inbox in inboxes:
+                inbox.put(None)
+            self._collect_stats(results, processes)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            frontier.close()
+        self.stats['elapsed_seconds'] = time.monotonic() - started_at
+        self._logger.info("process runner: %s", self.stats)
+        return (files_downloaded, exceptions)
+
+    def _coordinate(self, urls: List[str], frontier: Frontier, inboxes: list, results, processes: list):
+        files_downloaded = 0
+        exceptions = []
+        outstanding = 0
+
+        def dispatch(kind: str, url: str, depth: int = 0):
+            nonlocal outstanding
+            inboxes[shard(url, len(inboxes))].put((kind, url, depth))
+            outstanding += 1
+
+        for url in urls:
+            frontier.add(self.canonicalizer.canonicalize(url))
+        for url in frontier.images():  # left over by an interrupted run
+            dispatch('image', url)
+        while True:
+            for (page, depth) in frontier.pop_many(len(frontier)):
+                dispatch('page', page, depth)
+            if not outstanding:
+                break
+            message = self._receive(results, processes)
+            outstanding -= 1
+            if message[0] == 'page':
+                (_, _, page, pages, images, error) = message
+                frontier.done(page)
+                for (link, depth) in pages:
+                    frontier.add(link, depth)
+                for image in images:
+                    if frontier.add_image(image):
+                        dispatch('image', image)
+            else:
+                (_, _, image, blob, error) = message
+                if blob:
+                    files_downloaded += 1
+                if not error:
+                    frontier.image_done(image)
+            if error:
+                self._logger.warning("%s", error)
+                exceptions.append(error)
+        return (files_downloaded, exceptions)
+
+    @staticmethod
+    def _receive(results, processes: list, poll: float = 1.0):
+        """ Next worker message; fails instead of hanging when a worker died.
+        """
+        while True:
+            try:
+                return results.get(timeout=poll)
+            except queue.Empty:
+                dead = [process.name for process in processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f"crawler worker exited: {', '.join(dead)}")
+
+    def _collect_stats(self, results, processes: list):
+        totals = Counter()
+        self.worker_stats = {}
+        deadline = time.monotonic() + 30
+        while len(self.worker_stats) < len(processes) and time.monotonic() < deadline:
+            try:
+                message = results.get(timeout=0.5)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break
+                continue
+            if message[0] == 'stats':
+                self.worker_stats[message[1]] = message[2]
+                totals.update(message[2])
+                self.telemetry.merge(message[3])
+        self.stats = dict(totals, workers=len(processes))
@@ -0,0 +1,69 @@
+import time
+from logging import Logger
+from typing import List
+
+from .crawler import Crawler
+from .html_crawler import HtmlCrawler
+from .work_queue import PAGE, Task, WorkQueue
+
+
+class QueueWorker(Crawler):
+    """ Work through a shared work queue with a crawler until the crawl is done.
+
+    Every worker seeds the targets; the queue drops the duplicates, so any
+    number of workers started with the same workload split one crawl. A worker
+    stops once nothing is pending and no other worker holds a lease, and then
+    clears the queue for the next run. Failed tasks are retried after the
+    crawler's ``retry_backoff``.
+    """
+
+    def __init__(self, logger: Logger, work_queue: WorkQueue, crawler: HtmlCrawler, poll: float = 1.0):
+        super().__init__(logger)
+        self.work_queue = work_queue
+        self.crawler = crawler
+        self.poll = poll  # seconds to wait for other workers when nothing is pending
+        self.pages = 0
+        self.images = 0
+
+    def run(self, task: Task) -> int:
+        """ Crawl a page or download an image; returns the number of files downloaded.
+        """
+        if task.kind == PAGE:
+            self.crawler.visit(self.work_queue, task.url, task.depth)
+            self.pages += 1
+            return 0
+        self.images += 1
+        return 1 if self.crawler.download_file(task.url) else 0
+
+    def crawl(self, urls: List[str]) -> (int, List[Exception]):
+        """ Seed the targets and run tasks until the shared crawl is finished.
+        """
+        files_downloaded = 0
+        exceptions = []
+        for url in urls:
+            self.crawler.enqueue(self.work_queue, url)
+        try:
+            while True:
+                task = self.work_queue.claim()
+                if task is None:
+                    if self.work_queue.finished():
+                        break
+                    time.sleep(self.poll)
+                    continue
+                try:
+                    files_downloaded += self.run(task)
+                except Exception as ex:  # pylint: disable=W0703
+                    action = 'crawl' if task.kind == PAGE else 'download'
+                    if self.work_queue.release(task, self.crawler.retry_backoff):
+                        self._logger.info("will retry to %s %s: %s", action, task.url, ex)
+                    else:
+                        self._logger.warning("failed to %s %s: %s", action, task.url, ex)
+                        exceptions.append(ex)
+                else:
+                    self.work_queue.complete(task)
+            self.work_queue.clear()  # crawl finished; the next run starts from the targets again
+        finally:
+            self.crawler.flush_index()
+            self.crawler.shutdown_selenium()
+        self._logger.info("queue worker: %s pages, %s images", self.pages, self.images)
+        return (files_downloaded, exceptions)
@@ -0,0 +1,65 @@
+""" Incremental recrawls.
+
+Every crawled page is stored with a fingerprint of its content, the links and
+images extracted from it and a revisit interval. A page is not fetched again
+until its interval is up. A fetched page whose fingerprint did not change
+(a 304 revalidation serves the stored body, so it has the same fingerprint)
+reuses its stored links instead of being parsed again. Intervals adapt to how
+often a page actually changes: they grow while a page stays the same and
+shrink when it changes.
+"""
+import hashlib
+import time
+
+from .parsers import ImageTag, PageLinks
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+def fingerprint(content) -> str:
+    """ Content fingerprint of a page; rendered pages are text.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def stored_links(record: dict) -> PageLinks:
+    return PageLinks([ImageTag(*image) for image in record['images']], list(record['hrefs']))
+
+
+class RevisitPolicy:
+    """ Adaptive revisit schedule of the pages of an incremental crawl.
+
+    New and changed pages are revisited after ``min_interval`` seconds at the
+    latest; every visit that finds a page unchanged multiplies its interval by
+    ``backoff``, up to ``max_interval``. A change divides it by ``backoff``.
+    """
+
+    def __init__(self, min_interval: float = 6 * HOUR, max_interval: float = 30 * DAY, backoff: float = 2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+    def due(self, record: dict, now: float = None) -> bool:
+        """ Must the page be fetched again?
+        """
+        now = time.time() if now is None else now
+        return not record or now >= record['checked_at'] + record['interval']
+
+    def update(self, record: dict, digest: str, links: PageLinks, now: float = None) -> dict:
+        """ Record a visit of a page with content fingerprint digest and its links.
+        """
+        now = time.time() if now is None else now
+        if record and record['fingerprint'] == digest:
+            interval = min(record['interval'] * self.backoff, self.max_interval)
+            return {**record, 'checked_at': now, 'interval': interval, 'checks': record['checks'] + 1}
+        if record:
+            interval = max(record['interval'] / self.backoff, self.min_interval)
+            (checks, changes) = (record['checks'] + 1, record['changes'] + 1)
+        else:
+            (interval, checks, changes) = (self.min_interval, 1, 0)
+        return {'fingerprint': digest, 'checked_at': now, 'changed_at': now, 'interval': interval,
+                'checks': checks, 'changes': changes,
+                'images': [list(image) for image in links.images], 'hrefs': list(links.hrefs)}
@@ -0,0 +1,115 @@
+import queue
+import threading
+from contextlib import contextmanager
+from logging import Logger
+from typing import Callable
+
+
+def chrome_driver():
+    """ Headless Chrome webdriver; the default RenderPool driver factory.
+    """
+    # selenium is only imported once a page is rendered; it is slow to import and most crawls never render
+    from selenium import webdriver  # pylint: disable=C0415
+    from selenium.webdriver.chrome.options import Options  # pylint: disable=C0415
+    driver_options = Options()
+    driver_options.headless = True
+    return webdriver.Chrome(options=driver_options)
+
+
+class _PooledDriver:  # pylint: disable=R0903
+    __slots__ = ('driver', 'pages')
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class RenderPool:
+    """ Pool of long-lived headless browsers with a lease/return API.
+
+    Up to ``size`` drivers are started on demand and reused across pages. A
+    driver is recycled (quit and replaced) after ``max_pages`` pages to cap its
+    memory growth, and immediately after any error while it was leased.
+    """
+
+    def __init__(self, logger: Logger, size=1, driver_factory: Callable = chrome_driver, page_load_timeout=30,
+                 max_pages=50):
+        self._logger = logger
+        self.size = size
+        self.driver_factory = driver_factory
+        self.page_load_timeout = page_load_timeout
+        self.max_pages = max_pages
+        self.started = 0  # drivers started over the lifetime of the pool
+        self.recycled = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._live = set()
+        self._closed = False
+
+    def _start(self) -> _PooledDriver:
+        driver = self.driver_factory()
+        if self.page_load_timeout:
+            driver.set_page_load_timeout(self.page_load_timeout)
+        pooled = _PooledDriver(driver)
+        with self._lock:
+            self.started += 1
+            self._live.add(pooled)
+        return pooled
+
+    def _quit(self, pooled: _PooledDriver):
+        with self._lock:
+            self._live.discard(pooled)
+        try:
+            pooled.driver.quit()
+        except Exception as ex:  # pylint: disable=W0703
+            self._logger.warning("failed to quit webdriver: %s", ex)
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """ Borrow a driver for the duration of the block.
+        """
+        if self._closed:
+            raise RuntimeError("render pool is shut down")
+        if not self._slots.acquire(timeout=timeout):  # pylint: disable=R1732
+            raise TimeoutError("no webdriver available")
+        pooled = None
+        try:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = self._start()
+            yield pooled.driver
+            pooled.pages += 1
+            if self._closed:
+                self._quit(pooled)
+            elif pooled.pages >= self.max_pages:
+                self.recycled += 1
+                self._quit(pooled)
+            else:
+                self._idle.put(pooled)
+        except BaseException:
+            if pooled:
+                self.recycled += 1
+                self._quit(pooled)
+            raise
+        finally:
+            self._slots.release()
+
+    def render(self, url: str) -> str:
+        """ Render url in a pooled browser and return the page source.
+        """
+        with self.lease() as driver:
+            driver.get(url)
+            return driver.page_source
+
+    def shutdown(self):
+        """ Quit every browser; the pool can not be leased from afterwards.
+        """
+        self._closed = True
+        with self._lock:
+            live = list(self._live)
+        for pooled in live:
+            self._quit(pooled)
+        while not self._idle.empty():
+            self._idle.get_nowait()
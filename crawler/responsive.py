@@ -0,0 +1,97 @@
+""" Selection among the variants of a responsive image.
+
+An ``img`` may offer the same picture in several resolutions and formats
+through ``srcset`` and ``<picture><source>``. An ``ImagePolicy`` picks the
+variants that are downloaded: the largest, the smallest, the one closest to
+a target width, or all of them.
+"""
+from collections import namedtuple
+from typing import List
+
+from .parsers import ImageTag
+
+Candidate = namedtuple('Candidate', ['url', 'width', 'density'])
+POLICIES = ('largest', 'smallest', 'closest', 'all')
+
+
+def parse_srcset(srcset: str) -> List[Candidate]:
+    """ Candidates of a srcset attribute; a URL runs to the next whitespace, its descriptor to the next comma.
+    """
+    candidates = []
+    (pos, length) = (0, len(srcset or ''))
+    while pos < length:
+        while pos < length and (srcset[pos].isspace() or srcset[pos] == ','):
+            pos += 1
+        start = pos
+        while pos < length and not srcset[pos].isspace():
+            pos += 1
+        url = srcset[start:pos]
+        descriptor = ''
+        if url.endswith(','):
+            url = url.rstrip(',')
+        else:
+            end = srcset.find(',', pos)
+            end = length if end < 0 else end
+            descriptor = srcset[pos:end].strip()
+            pos = end
+        if not url:
+            continue
+        (width, density) = (None, 1.0)
+        for token in descriptor.split():
+            try:
+                if token.endswith('w'):
+                    width = int(token[:-1])
+                elif token.endswith('x'):
+                    density = float(token[:-1])
+            except ValueError:
+                pass  # unknown descriptors are ignored like browsers do
+        candidates.append(Candidate(url, width, density))
+    return candidates
+
+
+def candidates(image: ImageTag) -> List[Candidate]:
+    """ Distinct variants of an image: its srcset candidates and, as browsers do, its src as 1x
+    unless the srcset has width descriptors or a 1x candidate of its own.
+    """
+    found = parse_srcset(image.srcset) if image.srcset else []
+    if image.src and not any(variant.width is not None or variant.density == 1.0 for variant in found):
+        found.append(Candidate(image.src, None, 1.0))
+    seen = set()
+    return [candidate for candidate in found if not (candidate.url in seen or seen.add(candidate.url))]
+
+
+class ImagePolicy:
+    """ Which variants of a responsive image to download.
+
+    Variants with a width descriptor are compared by width; density (``2x``)
+    variants count as ``density * nominal_width`` pixels wide.
+    ``probe`` asks the server for the size of every skipped variant (one HEAD
+    request each) so the bytes saved can be reported.
+    """
+
+    def __init__(self, policy: str = 'largest', target_width: int = None, nominal_width: int = 1000, probe=False):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown image policy: {policy}; expected one of {list(POLICIES)}")
+        if policy == 'closest' and not target_width:
+            raise ValueError("the closest image policy needs a target_width")
+        self.policy = policy
+        self.target_width = target_width
+        self.nominal_width = nominal_width
+        self.probe = probe
+
+    def width(self, candidate: Candidate) -> float:
+        return candidate.width if candidate.width is not None else candidate.density * self.nominal_width
+
+    def select(self, variants: List[Candidate]) -> (List[str], List[str]):
+        """ URLs to download and URLs skipped among the variants of one image.
+        """
+        if self.policy == 'all' or len(variants) < 2:
+            return ([variant.url for variant in variants], [])
+        if self.policy == 'largest':
+            chosen = max(variants, key=self.width)
+        elif self.policy == 'smallest':
+            chosen = min(variants, key=self.width)
+        else:  # closest; ties go to the larger variant
+            chosen = min(variants, key=lambda variant: (abs(self.width(variant) - self.target_width),
+                                                        -self.width(variant)))
+        return ([chosen.url], [variant.url for variant in variants if variant is not chosen])
@@ -0,0 +1,78 @@
+""" Compiled URL rules for the ignore and follow lists of a crawl unit.
+
+A rule is a substring by default; a ``prefix:``, ``suffix:``, ``glob:`` or
+``re:`` prefix selects another kind (``re:`` rules are searched, so anchor
+them with ``^``/``$`` as needed). All rules of a list are compiled once into
+a single regular expression. Substrings, prefixes and suffixes are merged
+into character tries first, so a URL is matched in one pass over its
+characters no matter how many rules the list has.
+"""
+import fnmatch
+import re
+from typing import Dict, Iterable, List
+
+KINDS = ('prefix', 'suffix', 'glob', 're')
+
+
+def _trie(words: Iterable[str]) -> dict:
+    root: Dict[str, dict] = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}  # a word ends here
+    return root
+
+
+def _trie_regex(node: dict, at_end=False) -> str:
+    """ Regular expression matching any word of a trie; at the end of the text only if at_end.
+    """
+    if '' in node and not at_end:
+        return ''  # a shorter word already matched; longer ones cannot add matches
+    branches = [re.escape(char) + _trie_regex(child, at_end) for (char, child) in sorted(node.items()) if char]
+    if '' in node:
+        branches.append(r'\Z')
+    return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+
+def words_regex(words: List[str], at_end=False) -> str:
+    """ Regular expression matching any of the words, merged into a trie.
+    """
+    return _trie_regex(_trie(words), at_end)
+
+
+class RuleSet:
+    """ Matches a URL against a list of rules in a single regular expression search.
+    """
+
+    def __init__(self, rules: Iterable[str] = ()):
+        self.rules = list(rules)
+        by_kind: Dict[str, List[str]] = {kind: [] for kind in ('substring',) + KINDS}
+        for rule in self.rules:
+            (kind, sep, body) = rule.partition(':')
+            if sep and kind in KINDS:
+                by_kind[kind].append(body)
+            else:
+                by_kind['substring'].append(rule)
+        alternatives = []
+        if by_kind['substring']:
+            alternatives.append(words_regex(by_kind['substring']))
+        if by_kind['prefix']:
+            alternatives.append(r'\A' + words_regex(by_kind['prefix']))
+        if by_kind['suffix']:
+            alternatives.append(words_regex(by_kind['suffix'], at_end=True))
+        alternatives.extend(r'\A' + fnmatch.translate(body) for body in by_kind['glob'])
+        alternatives.extend(by_kind['re'])
+        self.pattern = re.compile('|'.join(f'(?:{alternative})' for alternative in alternatives)) \
+            if alternatives else None
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def matches(self, url: str) -> bool:
+        """ Does any rule match the URL?
+        """
+        return self.pattern is not None and self.pattern.search(url) is not None
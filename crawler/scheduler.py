@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict
+from urllib.parse import urlsplit
+
+
+def host_key(url: str) -> str:
+    """ Scheduling key for a URL; one politeness queue per network location.
+    """
+    return urlsplit(url).netloc.lower()
+
+
+def parse_retry_after(value: str) -> float:
+    """ Parse a Retry-After header (delta-seconds or HTTP-date) into seconds.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class _HostState:  # pylint: disable=R0903
+    __slots__ = ('delay', 'next_slot')
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.next_slot = 0.0
+
+
+class HostScheduler:
+    """ Minimum-delay politeness scheduler with one queue per host.
+
+    Every request reserves the next free slot of its host; callers only wait for
+    their own host, so requests to other hosts go ahead while one host cools down.
+    A 429 response feeds back into the host by widening its delay (``backoff``),
+    which decays back to the base delay on success (``recover``).
+    """
+
+    def __init__(self, delay: float = 0.0, jitter: float = 0.0, max_delay: float = 300.0):
+        if not 0 <= jitter <= 1:  # beyond 1 the spacing could be negative: slots would go back in time
+            raise ValueError(f"jitter must be between 0 and 1, not {jitter}")
+        self.delay = delay  # base seconds between requests to the same host
+        self.jitter = jitter  # +/- fraction of the delay randomly applied per request
+        self.max_delay = max_delay
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, url: str) -> _HostState:
+        key = host_key(url)
+        state = self._hosts.get(key)
+        if state is None:
+            state = self._hosts[key] = _HostState(self.delay)
+        return state
+
+    def host_delay(self, url: str) -> float:
+        """ Current delay between requests to the host of url.
+        """
+        with self._lock:
+            return self._state(url).delay
+
+    def reserve(self, url: str) -> float:
+        """ Reserve the next slot for the host of url; returns seconds to wait before sending.
+        """
+        with self._lock:
+            state = self._state(url)
+            now = time.monotonic()
+            slot = max(now, state.next_slot)
+            spacing = state.delay
+            if self.jitter:
+                spacing *= 1 + random.uniform(-self.jitter, self.jitter)
+            state.next_slot = slot + spacing
+            return slot - now
+
+    def wait(self, url: str):
+        """ Block the calling thread until the host of url may be contacted.
+        """
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, url: str):
+        """ Suspend the calling task until the host of url may be contacted.
+        """
+        import asyncio  # pylint: disable=C0415; only async crawls need it
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def backoff(self, url: str, retry_after: float = None):
+        """ Slow down the host of url after a rate limit response.
+        """
+        with self._lock:
+            state = self._state(url)
+            state.delay = min(self.max_delay, max(state.delay * 2, self.delay, 1.0, retry_after or 0.0))
+            pause = retry_after if retry_after is not None else state.delay
+            state.next_slot = max(state.next_slot, time.monotonic() + pause)
+
+    def recover(self, url: str):
+        """ Let the host of url speed back up towards the base delay after a success.
+        """
+        with self._lock:
+            state = self._state(url)
+            if state.delay > self.delay:
+                state.delay = max(self.delay, state.delay / 2)
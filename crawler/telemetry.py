@@ -0,0 +1,238 @@
+""" Crawl telemetry: labelled counters and latency histograms.
+
+One ``Telemetry`` instance is shared by the crawlers of a run. At the end of
+the run it renders a structured report, and it can also be exported in the
+Prometheus text format, either to a file or over HTTP.
+"""
+import bisect
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = 'crawler_'
+
+
+class Histogram:
+    """ Cumulative-bucket histogram of observed values, in the Prometheus style.
+    """
+
+    def __init__(self, buckets: Tuple[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """ Upper bound of the bucket holding the q-quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for (num, count) in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(self.buckets[num], self.max) if num < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'sum': round(self.sum, 6),
+                'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99),
+                'max': round(self.max, 6)}
+
+    def merge(self, state: dict):
+        """ Add the exported state of another histogram with the same buckets.
+        """
+        self.counts = [mine + theirs for (mine, theirs) in zip(self.counts, state['counts'])]
+        self.count += state['count']
+        self.sum += state['sum']
+        self.max = max(self.max, state['max'])
+
+
+def _labels(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for (key, value) in labels.items()))
+
+
+def _format_labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for (_, value) in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for ((key, _), value) in zip(pairs, escaped)) + '}'
+
+
+class Telemetry:
+    """ Thread-safe registry of counters and histograms keyed by name and labels.
+
+    Counter names end in ``_total`` and histogram names in the unit they
+    measure (``_seconds``, ``_bytes``), following Prometheus conventions.
+    """
+
+    def __init__(self, buckets: Tuple[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.monotonic()
+        self._counters: Dict[str, Dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1, **labels):
+        """ Add value to a counter.
+        """
+        with self._lock:
+            self._counters[name][_labels(labels)] += value
+
+    def observe(self, name: str, value: float, **labels):
+        """ Record one observation in a histogram.
+        """
+        key = _labels(labels)
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """ Observe the seconds spent in the block.
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started_at, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """ Value of a counter; without labels the sum over all of them.
+        """
+        with self._lock:
+            series = self._counters.get(name, {})
+            if labels:
+                return series.get(_labels(labels), 0)
+            return sum(series.values())
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        """ Histogram of name and labels; without labels all of them merged.
+        """
+        merged = Histogram(self.buckets)
+        with self._lock:
+            for (key, histogram) in self._histograms.get(name, {}).items():
+                if not labels or key == _labels(labels):
+                    merged.merge(histogram.__dict__)
+        return merged
+
+    def export(self) -> dict:
+        """ Plain, picklable state; merged into another instance with merge.
+        """
+        with self._lock:
+            return {'counters': {name: dict(series) for (name, series) in self._counters.items()},
+                    'histograms': {name: {key: {**histogram.__dict__, 'counts': list(histogram.counts)}
+                                          for (key, histogram) in series.items()}
+                                   for (name, series) in self._histograms.items()}}
+
+    def merge(self, state: dict):
+        """ Add the exported state of another instance, e.g. of a worker process.
+        """
+        with self._lock:
+            for (name, series) in state['counters'].items():
+                for (key, value) in series.items():
+                    self._counters[name][key] += value
+            for (name, series) in state['histograms'].items():
+                for (key, histogram_state) in series.items():
+                    histogram = self._histograms[name].get(key)
+                    if histogram is None:
+                        histogram = self._histograms[name][key] = Histogram(histogram_state['buckets'])
+                    histogram.merge(histogram_state)
+
+    def _by_label(self, name: str, label: str) -> Dict[str, float]:
+        totals = defaultdict(float)
+        for (key, value) in self._counters.get(name, {}).items():
+            totals[dict(key).get(label, '')] += value
+        return totals
+
+    def report(self) -> dict:
+        """ Structured end-of-run report.
+        """
+        elapsed = time.monotonic() - self.started_at
+        with self._lock:
+            counters = {name: {_format_labels(key) or 'total': value for (key, value) in series.items()}
+                        for (name, series) in sorted(self._counters.items())}
+            histograms = {name: {_format_labels(key) or 'total': histogram.summary()
+                                 for (key, histogram) in series.items()}
+                          for (name, series) in sorted(self._histograms.items())}
+            pages = self._by_label('pages_total', 'host')
+            images = self._by_label('images_total', 'host')
+            cache = self._by_label('cache_total', 'result')
+        lookups = cache['hit'] + cache['miss']
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'hosts': {host: {'pages': pages.get(host, 0), 'images': images.get(host, 0),
+                             'pages_per_s': round(pages.get(host, 0) / elapsed, 3) if elapsed else 0.0,
+                             'images_per_s': round(images.get(host, 0) / elapsed, 3) if elapsed else 0.0}
+                      for host in sorted(set(pages) | set(images))},
+            'cache_hit_ratio': round(cache['hit'] / lookups, 3) if lookups else None,
+            'counters': counters,
+            'histograms': histograms,
+        }
+
+    def prometheus(self) -> str:
+        """ All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for (name, series) in sorted(self._counters.items()):
+                lines.append(f'# TYPE {PREFIX}{name} counter')
+                lines.extend(f'{PREFIX}{name}{_format_labels(key)} {value:g}' for (key, value) in sorted(series.items()))
+            for (name, series) in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {PREFIX}{name} histogram')
+                for (key, histogram) in sorted(series.items()):
+                    cumulative = 0
+                    for (bound, count) in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{PREFIX}{name}_bucket{_format_labels(key, le=bound)} {cumulative}')
+                    lines.append(f'{PREFIX}{name}_sum{_format_labels(key)} {histogram.sum:g}')
+                    lines.append(f'{PREFIX}{name}_count{_format_labels(key)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """ Atomically write the metrics for the node exporter textfile collector.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        (handle, temp_path) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as file:
+            file.write(self.prometheus())
+        os.replace(temp_path, path)
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """ Serve the metrics at ``/metrics`` from a daemon thread; returns the server.
+        """
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=C0103
+                body = telemetry.prometheus().encode('utf-8')
+                self.send_response(200 if self.path.split('?')[0] in ('/', '/metrics') else 404)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=W0221
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
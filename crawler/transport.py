@@ -0,0 +1,158 @@
+""" HTTP transport shared by the crawlers of a process.
+
+A ``Transport`` owns one ``requests`` session. Keep-alive connections are
+pooled per host and reused by every crawler that uses the same transport;
+``Transport.shared`` hands out one instance per set of options and process.
+Busy hosts can get larger pools than the default (``host_pool_sizes``).
+With ``http2=True``, HTTPS requests are multiplexed over HTTP/2 connections by
+``httpx``, which is optional and only imported then.
+"""
+import inspect
+import os
+import threading
+from typing import Dict, Iterator
+
+from requests import Response, Session
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from requests.structures import CaseInsensitiveDict
+
+
+class _HttpxBody:
+    """ File-like body of an httpx response, as requests expects in ``Response.raw``.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks: Iterator[bytes] = None
+
+    def stream(self, chunk_size: int = None, decode_content=True) -> Iterator[bytes]:  # pylint: disable=W0613
+        yield from self._response.iter_bytes(chunk_size)
+
+    def read(self, amt: int = None) -> bytes:
+        if amt is None:
+            return self._response.read()
+        if self._chunks is None:
+            self._chunks = self._response.iter_bytes(amt)
+        return next(self._chunks, b'')
+
+    def close(self):
+        self._response.close()
+
+
+class Http2Adapter(BaseAdapter):
+    """ requests adapter sending requests through an HTTP/2 capable httpx client.
+    """
+
+    def __init__(self, max_connections: int = 10, retries: int = 0):
+        super().__init__()
+        try:
+            import httpx  # pylint: disable=C0415
+        except ImportError as ex:
+            raise ValueError("HTTP/2 requires the httpx package: pip install 'httpx[http2]'") from ex
+        self._client = httpx.Client(http2=True, limits=httpx.Limits(max_connections=max_connections),
+                                    transport=httpx.HTTPTransport(http2=True, retries=retries))
+        self.requests = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):  # pylint: disable=R0913
+        self.requests += 1
+        httpx_request = self._client.build_request(request.method, request.url, headers=dict(request.headers),
+                                                   content=request.body, timeout=timeout)
+        res = self._client.send(httpx_request, stream=True)
+        response = Response()
+        response.status_code = res.status_code
+        response.headers = CaseInsensitiveDict(res.headers)
+        response.reason = res.reason_phrase
+        response.url = str(res.url)
+        response.request = request
+        response.connection = self
+        response.raw = _HttpxBody(res)
+        if not stream:
+            response.content  # pylint: disable=W0104; reads the body like requests does
+        return response
+
+    def close(self):
+        self._client.close()
+
+
+class Transport:
+    """ Session with pooled keep-alive connections and optional HTTP/2.
+    """
+    _shared: Dict[tuple, 'Transport'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, http_retries=5, retry_backoff=5, pool_connections=10, pool_maxsize=10,
+                 host_pool_sizes: Dict[str, int] = None, pool_block=False, http2=False):
+        self.options = {'http_retries': http_retries, 'retry_backoff': retry_backoff,
+                        'pool_connections': pool_connections, 'pool_maxsize': pool_maxsize,
+                        'host_pool_sizes': host_pool_sizes, 'pool_block': pool_block, 'http2': http2}
+        self.pool_maxsize = pool_maxsize
+        self.session = Session()
+        self.adapters: Dict[str, BaseAdapter] = {}
+        retry_strategy = Retry(  # 429 is handled by the scheduler; see HtmlCrawler._request
+            total=http_retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=[500, 502, 503, 504],
+            method_whitelist=["HEAD", "GET", "OPTIONS"],
+            raise_on_status=False  # hand the last 5xx to the crawler, which defers it; see health.RetryQueue
+        )
+        adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.mount('http://', adapter)
+        self.mount('https://', Http2Adapter(pool_maxsize, http_retries) if http2 else adapter)
+        for (host, size) in (host_pool_sizes or {}).items():
+            host_adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=1, pool_maxsize=size,
+                                       pool_block=pool_block)
+            self.mount(f'http://{host}/', host_adapter)
+            if not http2:
+                self.mount(f'https://{host}/', host_adapter)
+
+    @classmethod
+    def shared(cls, **options) -> 'Transport':
+        """ Transport of this process for the options; created on first use.
+        """
+        options = inspect.signature(cls).bind(**options)
+        options.apply_defaults()
+        key = (os.getpid(), tuple(sorted((name, repr(value)) for (name, value) in options.arguments.items())))
+        with cls._shared_lock:
+            transport = cls._shared.get(key)
+            if transport is None:
+                transport = cls._shared[key] = cls(**options.arguments)
+            return transport
+
+    def __reduce__(self):
+        # worker processes share the transport of their own process instead of a copied session
+        return (_shared_transport, (self.options,))
+
+    def mount(self, prefix: str, adapter: BaseAdapter):
+        self.session.mount(prefix, adapter)
+        self.adapters[prefix] = adapter
+
+    def stats(self) -> dict:
+        """ HTTP/1.1 requests and new connections (TCP/TLS handshakes) per host; reused = requests - connections.
+        """
+        hosts: Dict[str, Dict[str, int]] = {}
+        http2_requests = 0
+        for adapter in {id(adapter): adapter for adapter in self.adapters.values()}.values():
+            if isinstance(adapter, Http2Adapter):
+                http2_requests += adapter.requests  # httpx does not expose its connection count
+                continue
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                host = f'{pool.scheme}://{pool.host}:{pool.port}' if pool.port else f'{pool.scheme}://{pool.host}'
+                counts = hosts.setdefault(host, {'requests': 0, 'connections': 0})
+                counts['requests'] += pool.num_requests
+                counts['connections'] += pool.num_connections
+        requests = sum(counts['requests'] for counts in hosts.values())
+        connections = sum(counts['connections'] for counts in hosts.values())
+        return {'requests': requests, 'connections': connections, 'reused': max(requests - connections, 0),
+                'reuse_ratio': round(1 - connections / requests, 3) if requests else None, 'hosts': hosts,
+                'http2_requests': http2_requests}
+
+    def close(self):
+        self.session.close()
+
+
+def _shared_transport(options: dict) -> Transport:
+    return Transport.shared(**options)
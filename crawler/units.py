@@ -0,0 +1,253 @@
+""" Crawl units loaded from a JSON, TOML or YAML file.
+
+A units file lists the units to crawl, each with its targets and the options
+of its crawler, so throughput can be tuned per target without a new image::
+
+    [defaults]
+    think_time = 5
+
+    [[units]]
+    name = "fbi"
+    targets = ["https://www.fbi.gov/wanted/topten"]
+    max_depth = 1
+    download_workers = 8
+    request_timeout = 20
+    http_retries = 3
+    max_inflight_bytes = 67108864
+    rate_limit = {delay = 2.5, jitter = 1.0}
+
+Plain options are keyword arguments of the crawler class and are checked
+against its signature. ``rate_limit`` (a ``HostScheduler``),
+``circuit_breaker`` (a ``HealthTracker``), ``max_inflight_bytes`` (a
+``ByteBudget``), ``image_policy`` and ``revisit_policy`` give a unit its own
+instance instead of the one shared by all units; so does ``think_time``
+without a ``rate_limit``. ``defaults`` apply to every unit. Every problem of
+a file is reported at once, before anything is crawled.
+"""
+import difflib
+import inspect
+import json
+import os
+import re
+from typing import Dict, List
+
+from .budget import ByteBudget
+from .health import HealthTracker
+from .html_crawler import HtmlCrawler
+from .recrawl import RevisitPolicy
+from .responsive import ImagePolicy
+from .scheduler import HostScheduler
+
+FORMATS = ('.json', '.toml', '.yaml', '.yml')
+# option groups built into objects: file key -> (class, crawler keyword)
+GROUPS = {
+    'max_inflight_bytes': (ByteBudget, 'byte_budget'),
+    'rate_limit': (HostScheduler, 'scheduler'),
+    'circuit_breaker': (HealthTracker, 'health'),
+    'image_policy': (ImagePolicy, 'image_policy'),
+    'revisit_policy': (RevisitPolicy, 'revisit_policy'),
+}
+# options that need at least one worker, browser or queue slot
+POSITIVE = {'fetch_workers', 'parse_workers', 'download_workers', 'digest_workers', 'pipeline_queue_size',
+            'render_pool_size', 'render_max_pages', 'concurrency', 'workers', 'chunk_size', 'max_bytes'}
+# whole numbers; any other number may have a fraction
+INTEGERS = POSITIVE | {'max_depth', 'http_retries', 'max_asset_bytes', 'page_cache_bytes', 'window', 'min_requests',
+                       'max_reopens', 'target_width', 'nominal_width'}
+# fractions between 0 and 1; a jitter above 1 would let requests to a host go out in bursts
+FRACTIONS = {'jitter', 'failure_ratio'}
+PLAIN_TYPES = (bool, int, float, str, list, tuple)
+NAME = re.compile(r'[A-Za-z0-9_.-]+')  # unit names end up in file names
+
+
+class ConfigError(ValueError):
+    """ A units file that cannot be loaded; lists every problem found.
+    """
+
+    def __init__(self, path: str, problems: List[str]):
+        super().__init__(f"{path}: " + '; '.join(problems))
+        self.path = path
+        self.problems = problems
+
+
+def read_file(path: str) -> dict:
+    """ Contents of a JSON, TOML or YAML file by its extension.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ConfigError(path, [f"unsupported format {ext or '(none)'}; expected one of {list(FORMATS)}"])
+    try:
+        file = open(path, 'rb')  # pylint: disable=R1732; closed below
+    except OSError as ex:
+        raise ConfigError(path, [f"cannot read: {ex.strerror}"]) from ex
+    with file:
+        try:
+            if ext == '.json':
+                return json.load(file)
+            if ext == '.toml':
+                try:
+                    import tomllib  # pylint: disable=C0415; python 3.11+
+                except ImportError:  # pragma: no cover
+                    try:
+                        import tomli as tomllib  # pylint: disable=C0415; see requirements.txt
+                    except ImportError as ex:
+                        raise ConfigError(path, ["TOML units files require tomli before Python 3.11: "
+                                                 "pip install tomli"]) from ex
+                return tomllib.load(file)
+            try:
+                import yaml  # pylint: disable=C0415; only needed for YAML units files
+            except ImportError as ex:
+                raise ConfigError(path, ["YAML units files require PyYAML: pip install pyyaml"]) from ex
+            return yaml.safe_load(file)
+        except ConfigError:
+            raise
+        except Exception as ex:  # pylint: disable=W0703; the parsers raise their own error types
+            raise ConfigError(path, [f"cannot parse: {ex}"]) from ex
+
+
+def parameters(cls) -> Dict[str, inspect.Parameter]:
+    """ Keyword parameters of a class, including those it passes on to HtmlCrawler with ``**kwargs``.
+    """
+    params = dict(inspect.signature(cls).parameters)
+    if any(param.kind == param.VAR_KEYWORD for param in params.values()) and cls is not HtmlCrawler:
+        params = {**parameters(HtmlCrawler), **params}
+    return {name: param for (name, param) in params.items()
+            if name not in ('logger', 'clock') and param.kind not in (param.VAR_KEYWORD, param.VAR_POSITIONAL)}
+
+
+def _expected_type(name: str, param: inspect.Parameter) -> type:
+    """ Type of the values of an option: bool, int, float (any number), str, list or object (anything);
+    None if the option takes an object that a file cannot describe.
+    """
+    annotation = getattr(param.annotation, '__origin__', param.annotation)
+    if annotation is param.empty:
+        if param.default is None:
+            return object
+        annotation = type(param.default)
+    if annotation not in PLAIN_TYPES:
+        return None
+    if annotation is tuple:
+        return list
+    if annotation in (int, float):
+        return int if name in INTEGERS else float
+    return annotation
+
+
+def _check(name: str, value, expected: type) -> str:
+    """ Problem with an option value, or None.
+    """
+    if value is None or expected is object:
+        return None
+    if isinstance(value, bool) and expected is not bool:
+        return f"{name} must be {_TYPE_NAMES[expected]}, not a boolean"
+    if not isinstance(value, (int, float) if expected is float else expected):
+        return f"{name} must be {_TYPE_NAMES[expected]}, not {type(value).__name__}"
+    if expected is list and not all(isinstance(item, str) for item in value):
+        return f"{name} must be a list of strings"
+    if expected in (int, float):
+        if name in POSITIVE and value < 1:
+            return f"{name} must be at least 1"
+        if value < 0:
+            return f"{name} must not be negative"
+        if name in FRACTIONS and value > 1:
+            return f"{name} must be between 0 and 1"
+    return None
+
+
+_TYPE_NAMES = {bool: 'a boolean', int: 'an integer', float: 'a number', str: 'a string', list: 'a list'}
+
+
+def _unknown(name: str, known) -> str:
+    close = difflib.get_close_matches(name, list(known), n=1)
+    return f"unknown option {name}" + (f"; did you mean {close[0]}?" if close else '')
+
+
+def _build(key: str, value, prefix: str, problems: List[str]):
+    """ Object of an option group, or None after adding its problems.
+    """
+    (cls, _) = GROUPS[key]
+    if cls is ImagePolicy and isinstance(value, str):
+        value = {'policy': value}  # image_policy = "largest"
+    if cls is ByteBudget and not isinstance(value, dict):
+        value = {'max_bytes': value}  # max_inflight_bytes = 67108864
+    if not isinstance(value, dict):
+        problems.append(prefix + f"{key} must be a table of {cls.__name__} settings")
+        return None
+    known = parameters(cls)
+    found = len(problems)
+    for (name, setting) in value.items():
+        problem = _check(name, setting, _expected_type(name, known[name])) if name in known else _unknown(name, known)
+        if problem:
+            problems.append(prefix + f"{key}: {problem}")
+    if len(problems) > found:
+        return None
+    try:
+        return cls(**value)
+    except ValueError as ex:
+        problems.append(prefix + f"{key}: {ex}")
+        return None
+
+
+def unit_spec(unit: dict, defaults: dict, crawler_class, problems: List[str]) -> dict:
+    """ Declarative unit (name, targets, crawler options) of one units file entry.
+    """
+    if not isinstance(unit, dict):
+        problems.append(f"units must be tables, not {type(unit).__name__}")
+        return None
+    name = unit.get('name')
+    prefix = f"unit {name}: " if isinstance(name, str) and name else 'unit: '
+    found = len(problems)
+    if not isinstance(name, str) or not NAME.fullmatch(name):
+        problems.append(prefix + "name must be a non-empty string of letters, digits, '_', '.' and '-'")
+    targets = unit.get('targets')
+    if not isinstance(targets, list) or not targets or not all(isinstance(url, str) for url in targets):
+        problems.append(prefix + "targets must be a non-empty list of URLs")
+    known = parameters(crawler_class)
+    groups = {keyword: key for (key, (_, keyword)) in GROUPS.items()}
+    options = {}
+    for (key, value) in {**defaults, **unit}.items():
+        if key in ('name', 'targets'):
+            continue
+        if key in GROUPS:
+            if value is not None:  # None keeps the instance shared by all units
+                options[GROUPS[key][1]] = _build(key, value, prefix, problems)
+            continue
+        if key not in known:
+            problems.append(prefix + _unknown(key, list(known) + list(GROUPS)))
+            continue
+        expected = _expected_type(key, known[key])
+        if expected is None:
+            hint = f"; use {groups[key]}" if key in groups else ''
+            problems.append(prefix + f"{key} cannot be set in a units file{hint}")
+            continue
+        problem = _check(key, value, expected)
+        if problem:
+            problems.append(prefix + problem)
+        else:
+            options[key] = value
+    if 'think_time' in options and 'scheduler' not in options:  # spaced like an HtmlCrawler without a scheduler
+        options['scheduler'] = HostScheduler(delay=options['think_time'] / 2, jitter=1.0)
+    return None if len(problems) > found else {'name': name, 'targets': targets, 'options': options}
+
+
+def load_units(path: str, crawler_class=HtmlCrawler) -> List[dict]:
+    """ Validated units of a units file; raises ConfigError listing every problem.
+    """
+    data = read_file(path)
+    problems: List[str] = []
+    if not isinstance(data, dict) or not isinstance(data.get('units'), list) or not data['units']:
+        raise ConfigError(path, ["expected a non-empty list of units"])
+    unknown = set(data) - {'units', 'defaults'}
+    if unknown:
+        problems.append(f"unknown sections: {sorted(unknown)}")
+    defaults = data.get('defaults') or {}
+    if not isinstance(defaults, dict):
+        problems.append("defaults must be a table of options")
+        defaults = {}
+    units = [unit_spec(unit, defaults, crawler_class, problems) for unit in data['units']]
+    names = [unit.get('name') for unit in data['units'] if isinstance(unit, dict)]
+    duplicates = sorted({name for name in names if isinstance(name, str) and names.count(name) > 1})
+    if duplicates:
+        problems.append(f"duplicate unit names: {duplicates}")
+    if problems:
+        raise ConfigError(path, list(dict.fromkeys(problems)))  # a bad default is reported once per unit name
+    return units
@@ -0,0 +1,280 @@
+""" Shared work queues for distributed crawls.
+
+A work queue holds the frontier, the seen-set and the image downloads of one
+crawl so any number of workers on any number of nodes can split it. Adding is
+idempotent (a URL is queued at most once per crawl) and claimed tasks are
+leased: a task whose worker died is handed out again once its lease expires.
+A failed task is released and handed out again after a delay, up to
+``max_attempts`` times. Once a crawl is finished the queue is cleared, so the
+next run starts from the targets again.
+"""
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import parse_qs, urlsplit
+
+from .frontier import fingerprint
+
+Task = namedtuple('Task', ['kind', 'url', 'depth'])
+PAGE = 'page'
+IMAGE = 'image'
+
+
+class WorkQueue(metaclass=abc.ABCMeta):
+    """ Crawl frontier shared by many workers.
+
+    ``add`` and ``add_image`` mirror ``Frontier`` so a crawler can queue the
+    links of a page straight into a work queue.
+    """
+
+    @abc.abstractmethod
+    def add(self, url: str, depth: int = 0) -> bool:
+        """ Queue a page unless it was seen before; returns True if it was queued.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_image(self, url: str) -> bool:
+        """ Queue an image download unless it was seen before; returns True if it was queued.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim(self) -> Task:
+        """ Lease the next task or return None if nothing is pending.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, task: Task):
+        """ Mark a claimed task as done.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release(self, task: Task, delay: float = 0.0) -> bool:
+        """ Hand a failed task out again after delay seconds, doubling per attempt;
+        False, and the task is done, once it ran out of attempts.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self):
+        """ Forget all state once a crawl has finished.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def finished(self) -> bool:
+        """ Is nothing pending and nothing leased?
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ Release any resources held by the queue.
+        """
+
+
+class SqliteWorkQueue(WorkQueue):
+    """ Work queue in a SQLite database shared by the workers of one node or a shared volume.
+    """
+    PENDING, ACTIVE, DONE = 0, 1, 2
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                kind TEXT NOT NULL,
+                key BLOB NOT NULL,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                state INTEGER NOT NULL,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, key)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state);
+        """)
+        if 'attempts' not in {row[1] for row in self._db.execute('PRAGMA table_info(tasks)')}:
+            self._db.execute('ALTER TABLE tasks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+
+    def _add(self, kind: str, url: str, depth: int) -> bool:
+        with self._lock:
+            cursor = self._db.execute('INSERT OR IGNORE INTO tasks (kind, key, url, depth, state) VALUES (?, ?, ?, ?, ?)',
+                                      (kind, fingerprint(url), url, depth, self.PENDING))
+            return cursor.rowcount == 1
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        return self._add(PAGE, url, depth)
+
+    def add_image(self, url: str) -> bool:
+        return self._add(IMAGE, url, 0)
+
+    def claim(self) -> Task:
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')  # one claimer at a time across processes
+            try:
+                self._db.execute('UPDATE tasks SET state = ? WHERE state = ? AND lease_until < ?',
+                                 (self.PENDING, self.ACTIVE, now))
+                row = self._db.execute('SELECT rowid, kind, url, depth FROM tasks WHERE state = ? ORDER BY rowid LIMIT 1',
+                                       (self.PENDING,)).fetchone()
+                if row:
+                    self._db.execute('UPDATE tasks SET state = ?, lease_until = ? WHERE rowid = ?',
+                                     (self.ACTIVE, now + self.lease_seconds, row[0]))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return Task(*row[1:]) if row else None
+
+    def complete(self, task: Task):
+        with self._lock:
+            self._db.execute('UPDATE tasks SET state = ?, lease_until = NULL WHERE kind = ? AND key = ?',
+                             (self.DONE, task.kind, fingerprint(task.url)))
+
+    def release(self, task: Task, delay: float = 0.0) -> bool:
+        key = fingerprint(task.url)
+        with self._lock:
+            (attempts,) = self._db.execute('SELECT attempts FROM tasks WHERE kind = ? AND key = ?',
+                                           (task.kind, key)).fetchone()
+            if attempts >= self.max_attempts:
+                self._db.execute('UPDATE tasks SET state = ?, lease_until = NULL WHERE kind = ? AND key = ?',
+                                 (self.DONE, task.kind, key))
+                return False
+            # leased until the retry is due; claim() hands expired leases out again
+            self._db.execute('UPDATE tasks SET state = ?, lease_until = ?, attempts = ? WHERE kind = ? AND key = ?',
+                             (self.ACTIVE, time.time() + delay * 2 ** attempts, attempts + 1, task.kind, key))
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM tasks')
+
+    def finished(self) -> bool:
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM tasks WHERE state != ? LIMIT 1', (self.DONE,)).fetchone() is None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Each script runs atomically in Redis, so a worker dying between two commands cannot lose a task and
+# no other worker sees a task that is neither pending nor leased.
+ADD_SCRIPT = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[2])
+return 1
+"""
+CLAIM_SCRIPT = """
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('RPUSH', KEYS[1], member)
+end
+local member = redis.call('LPOP', KEYS[1])
+if member then
+    redis.call('ZADD', KEYS[2], ARGV[2], member)
+end
+return member
+"""
+RELEASE_SCRIPT = """
+local attempts = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+if attempts >= tonumber(ARGV[3]) then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], attempts + 1)
+redis.call('ZADD', KEYS[1], tonumber(ARGV[2]) + tonumber(ARGV[4]) * 2 ^ attempts, ARGV[1])
+return 1
+"""
+UNFINISHED_SCRIPT = """
+return redis.call('LLEN', KEYS[1]) + redis.call('ZCARD', KEYS[2])
+"""
+
+
+class RedisWorkQueue(WorkQueue):
+    """ Work queue in Redis, shared by workers on any number of nodes.
+
+    Takes a redis-py compatible client. Keys are prefixed with ``name``: a set
+    per kind for the seen-set, a list of pending tasks and a sorted set of
+    leased tasks scored by lease expiry (or retry time) and a hash of failed
+    attempts. Operations touching several keys are Lua scripts.
+    """
+
+    def __init__(self, client, name: str = 'crawl', lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.client = client
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._add_script = client.register_script(ADD_SCRIPT)
+        self._claim_script = client.register_script(CLAIM_SCRIPT)
+        self._release_script = client.register_script(RELEASE_SCRIPT)
+        self._unfinished_script = client.register_script(UNFINISHED_SCRIPT)
+
+    def _key(self, suffix: str) -> str:
+        return f'{self.name}:{suffix}'
+
+    def _add(self, kind: str, url: str, depth: int) -> bool:
+        return bool(self._add_script(keys=[self._key(f'seen:{kind}'), self._key('pending')],
+                                     args=[fingerprint(url), json.dumps([kind, url, depth])]))
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        return self._add(PAGE, url, depth)
+
+    def add_image(self, url: str) -> bool:
+        return self._add(IMAGE, url, 0)
+
+    def claim(self) -> Task:
+        now = time.time()
+        member = self._claim_script(keys=[self._key('pending'), self._key('active')],
+                                    args=[now, now + self.lease_seconds])
+        return Task(*json.loads(member)) if member else None
+
+    def complete(self, task: Task):
+        self.client.zrem(self._key('active'), json.dumps(list(task)))
+
+    def release(self, task: Task, delay: float = 0.0) -> bool:
+        return bool(self._release_script(keys=[self._key('active'), self._key('attempts')],
+                                         args=[json.dumps(list(task)), time.time(), self.max_attempts, delay]))
+
+    def clear(self):
+        self.client.delete(*(self._key(suffix) for suffix in
+                             (f'seen:{PAGE}', f'seen:{IMAGE}', 'pending', 'active', 'attempts')))
+
+    def finished(self) -> bool:
+        return not self._unfinished_script(keys=[self._key('pending'), self._key('active')])
+
+
+def queue_from_url(url: str, name: str = 'crawl') -> WorkQueue:
+    """ Work queue for ``sqlite:///path/to/queue.sqlite`` or ``redis://host:port/db`` URLs.
+
+    A ``lease`` query parameter sets the lease in seconds and ``attempts`` the
+    retries of a failed task. SQLite queues get one database per name next to
+    the given path.
+    """
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    options = {'lease_seconds': float(query.get('lease', ['300'])[0]),
+               'max_attempts': int(query.get('attempts', ['3'])[0])}
+    if parts.scheme == 'sqlite':
+        (root, ext) = os.path.splitext(parts.path[1:] if parts.path.startswith('//') else parts.path.lstrip('/'))
+        return SqliteWorkQueue(f'{root}-{name}{ext or ".sqlite"}', **options)
+    if parts.scheme in ('redis', 'rediss'):
+        import redis  # pylint: disable=C0415; only needed for distributed crawls
+        return RedisWorkQueue(redis.Redis.from_url(url.split('?')[0]), name=name, **options)
+    raise ValueError(f"unsupported work queue url: {url}")
@@ -1,17 +1,45 @@
 #!/usr/bin/env python3
 
+import json
+import os
 import time
 
 from crawler.config import CrawlerConfig
 from crawler.crawler import Crawler
+from crawler.phash import NearDuplicates
+from crawler.process_runner import ProcessRunner
+from crawler.queue_worker import QueueWorker
+from crawler.recrawl import RevisitPolicy
+from crawler.work_queue import queue_from_url
 from logger.logger import get_logger
 
 LOGGER = get_logger()
-CONFIG = CrawlerConfig(LOGGER, max_depth=1)
+# CRAWLER_WORKERS > 0 spreads each unit over that many processes, sharded by host
+WORKERS = int(os.environ.get('CRAWLER_WORKERS', '0'))
+PROCESS_OPTIONS = {'crawler_class': ProcessRunner, 'workers': WORKERS} if WORKERS else {}
+# INCREMENTAL=1 only refetches pages that are due for a revisit and only parses pages that changed
+INCREMENTAL_OPTIONS = {'revisit_policy': RevisitPolicy()} if os.environ.get('INCREMENTAL') == '1' else {}
+# DIGESTS=md5,sha256 lists the content digests stored with every asset
+DIGEST_OPTIONS = {'digests': os.environ['DIGESTS'].split(',')} if os.environ.get('DIGESTS') else {}
+# NEAR_DUPLICATES=flag (or skip) compares a perceptual hash of every image; needs numpy and Pillow
+if os.environ.get('NEAR_DUPLICATES'):
+    DIGEST_OPTIONS['near_duplicates'] = NearDuplicates(int(os.environ.get('NEAR_DUPLICATE_DISTANCE', '8')),
+                                                       action=os.environ['NEAR_DUPLICATES'])
+# a killed run resumes from the frontier files in FRONTIER_DIR instead of starting over;
+# CRAWL_UNITS names a JSON/TOML/YAML units file replacing the built-in units (see units.example.toml)
+CONFIG = CrawlerConfig(LOGGER, max_depth=1, frontier_dir=os.environ.get('FRONTIER_DIR', 'output'), **PROCESS_OPTIONS,
+                       units_path=os.environ.get('CRAWL_UNITS'), **INCREMENTAL_OPTIONS, **DIGEST_OPTIONS)
+# WORK_QUEUE (sqlite:///path or redis://host:port/db) lets every container running this script split one crawl
+WORK_QUEUE = os.environ.get('WORK_QUEUE')
+# METRICS_FILE is written in the Prometheus text format at the end; METRICS_PORT serves it while crawling
+METRICS_FILE = os.environ.get('METRICS_FILE')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
 
 
 def worker(unit: dict):
-    crawler: Crawler = unit['crawler']
+    crawler: Crawler = CONFIG.crawler(unit)
+    if WORK_QUEUE:
+        crawler = QueueWorker(LOGGER, queue_from_url(WORK_QUEUE, name=unit['name']), crawler)
     try:
         (files_downloaded, exceptions) = crawler.crawl(unit['targets'])
         LOGGER.info("Downloaded %s files", files_downloaded)
@@ -24,12 +52,17 @@ def worker(unit: dict):
 
 
 def main():
+    if METRICS_PORT:
+        CONFIG.telemetry.serve(METRICS_PORT, host=os.environ.get('METRICS_HOST', '127.0.0.1'))
     started_at = time.monotonic()
     for unit in CONFIG.workload:
         worker(unit)
     elasped_time = time.monotonic() - started_at
 
     LOGGER.info("Elapsed time: %.2f", elasped_time)
+    LOGGER.info("Telemetry: %s", json.dumps(CONFIG.telemetry.report(), indent=2))
+    if METRICS_FILE:
+        CONFIG.telemetry.write_prometheus(METRICS_FILE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+from aiohttp import web
+
+from crawler.async_html_crawler import AsyncHtmlCrawler
+from crawler.crawler import Crawler
+from logger.logger import get_logger
+
+PAGES = 10
+IMAGES_PER_PAGE = 4
+LATENCY = 0.02  # seconds per response
+
+
+def make_app(unavailable=(), inflight: Counter = None) -> web.Application:
+    """ Synthetic site: an index page linking to PAGES pages with IMAGES_PER_PAGE images each.
+    Paths in unavailable are answered with a 503 the first time they are requested; inflight
+    counts the requests being served ('now') and the most served at once ('peak').
+    """
+    failing = set(unavailable)
+    inflight = inflight if inflight is not None else Counter()
+
+    @web.middleware
+    async def flaky(request, handler):
+        inflight['now'] += 1
+        inflight['peak'] = max(inflight['peak'], inflight['now'])
+        try:
+            if request.path in failing:
+                failing.discard(request.path)
+                return web.Response(status=503)
+            return await handler(request)
+        finally:
+            inflight['now'] -= 1
+
+    async def index(request):  # pylint: disable=W0613
+        await asyncio.sleep(LATENCY)
+        links = ''.join(f'<a href="/page/{i}">page {i}</a>' for i in range(PAGES))
+        return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+
+    async def page(request):
+        await asyncio.sleep(LATENCY)
+        num = request.match_info['num']
+        imgs = ''.join(f'<img src="/img/{num}-{i}.png">' for i in range(IMAGES_PER_PAGE))
+        return web.Response(text=f'<html><body>{imgs}</body></html>', content_type='text/html')
+
+    async def image(request):  # pylint: disable=W0613
+        await asyncio.sleep(LATENCY)
+        return web.Response(body=b'\x89PNG\r\n\x1a\n' + bytes(64), content_type='image/png')
+
+    app = web.Application(middlewares=[flaky])
+    app.router.add_route('*', '/', index)
+    app.router.add_route('*', '/page/{num}', page)
+    app.router.add_route('*', '/img/{name}', image)
+    return app
+
+
+async def run_crawl(crawler: AsyncHtmlCrawler, **site) -> (int, list, float):
+    runner = web.AppRunner(make_app(**site))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        started_at = time.monotonic()
+        (files_downloaded, exceptions) = await crawler.crawl([f'http://127.0.0.1:{port}/'])
+        return (files_downloaded, exceptions, time.monotonic() - started_at)
+    finally:
+        await runner.cleanup()
+
+
+@pytest.fixture
+def logger():
+    return get_logger()
+
+
+def test_init(logger):
+    crawler = AsyncHtmlCrawler(logger, concurrency=10)
+    assert isinstance(crawler, Crawler), "crawler should be a subclass of Crawler"
+    assert crawler.concurrency == 10, "concurrency should be same as assigned"
+    assert asyncio.iscoroutinefunction(crawler.crawl), "crawl should be awaitable"
+
+
+def test_crawl(logger, tmp_path):
+    crawler = AsyncHtmlCrawler(logger, concurrency=50, think_time=0, max_depth=1, output=str(tmp_path))
+    (files_downloaded, exceptions, _) = asyncio.run(run_crawl(crawler))
+    assert not exceptions, "no exceptions expected"
+    assert files_downloaded == PAGES * IMAGES_PER_PAGE, "every image should be downloaded"
+    assert len(crawler.index) == PAGES * IMAGES_PER_PAGE + PAGES + 1, "every page and image should be indexed"
+    assert len(list(tmp_path.glob('blobs/*/*.png'))) == 1, "identical images should be stored once"
+
+
+def test_server_errors_are_retried(logger, tmp_path):
+    crawler = AsyncHtmlCrawler(logger, think_time=0, max_depth=1, output=str(tmp_path), http_retries=2,
+                               retry_backoff=0.01)
+    (files_downloaded, exceptions, _) = asyncio.run(run_crawl(crawler, unavailable={'/page/3', '/img/4-0.png'}))
+    assert not exceptions, "pages and images answered with a 503 should be retried"
+    assert files_downloaded == PAGES * IMAGES_PER_PAGE, "every image should be downloaded"
+
+
+def test_requests_run_concurrently(logger, tmp_path):
+    (serial_requests, parallel_requests) = (Counter(), Counter())
+    serial = AsyncHtmlCrawler(logger, concurrency=1, think_time=0, max_depth=1, output=str(tmp_path / 'serial'))
+    parallel = AsyncHtmlCrawler(logger, concurrency=10, think_time=0, max_depth=1, output=str(tmp_path / 'parallel'))
+    (tmp_path / 'serial').mkdir()
+    (tmp_path / 'parallel').mkdir()
+    (serial_files, _, _) = asyncio.run(run_crawl(serial, inflight=serial_requests))
+    (parallel_files, _, _) = asyncio.run(run_crawl(parallel, inflight=parallel_requests))
+    assert serial_files == parallel_files, "both crawls should download the same files"
+    assert serial_requests['peak'] == 1, "concurrency=1 should send one request at a time"
+    assert parallel_requests['peak'] == 10, "requests should run concurrently up to the concurrency limit"
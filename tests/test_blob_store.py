@@ -0,0 +1,57 @@
+import hashlib
+import os
+
+from crawler.blob_store import BlobStore, main
+from crawler.metadata_index import MetadataIndex
+
+
+def test_put(tmp_path):
+    store = BlobStore(str(tmp_path))
+    body = b'portrait'
+    digest = hashlib.sha256(body).hexdigest()
+    (path, blob_digest, size) = store.put([b'port', b'rait'], '.jpg')
+    assert path == os.path.join(str(tmp_path), 'blobs', digest[:2], digest + '.jpg'), "blob is named by content"
+    assert blob_digest == digest, "digest should be computed over the streamed chunks"
+    assert size == len(body), "size should be the body length"
+    with open(path, 'rb') as file:
+        assert file.read() == body, "blob must match source content"
+
+
+def test_put_dedup(tmp_path):
+    store = BlobStore(str(tmp_path))
+    (first, _, _) = store.put([b'portrait'], '.jpg')
+    (second, _, _) = store.put([b'portrait'], '.jpg')
+    assert first == second, "identical bodies should share one blob"
+    assert store.stats == {'blobs_written': 1, 'bytes_written': 8,
+                           'duplicates': 1, 'bytes_deduped': 8}, "duplicates should not be written"
+
+
+def test_put_spills_large_bodies(tmp_path):
+    store = BlobStore(str(tmp_path), spool_size=16)
+    chunks = [bytes([num]) * 10 for num in range(10)]
+    (path, _, size) = store.put(chunks)
+    assert size == 100, "size should be the body length"
+    with open(path, 'rb') as file:
+        assert file.read() == b''.join(chunks), "spilled blob must match source content"
+    store.put(chunks)
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith('.blob-')], "temp files are removed"
+
+
+def test_collect(tmp_path, monkeypatch, capsys):
+    store = BlobStore(str(tmp_path))
+    (kept, kept_digest, _) = store.put([b'kept'], '.jpg')
+    (orphan, _, _) = store.put([b'orphan'], '.jpg')
+    (young, _, _) = store.put([b'young'], '.jpg')
+    for blob in (kept, orphan):
+        os.utime(blob, (0, 0))
+    assert store.collect({kept_digest}) == (1, 6), "only the old unreferenced blob should be removed"
+    assert os.path.exists(kept) and os.path.exists(young) and not os.path.exists(orphan), \
+        "referenced and young blobs should be kept"
+
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    index.put('https://x/a.jpg', {'blob': kept, 'blob_digest': kept_digest})
+    index.close()
+    monkeypatch.setattr('sys.argv', ['blob_store', str(tmp_path), '--min-age', '0'])
+    main()
+    assert 'removed 1 unreferenced blobs (5 bytes)' in capsys.readouterr().out, "the command should report the removal"
+    assert os.path.exists(kept) and not os.path.exists(young), "blobs of indexed assets should be kept"
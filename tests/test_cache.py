@@ -0,0 +1,68 @@
+import gc
+import weakref
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.cache import Cache
+from crawler.html_crawler import HtmlCrawler
+from logger.logger import get_logger
+
+PAGE = 'https://example.com/'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_lru_eviction():
+    cache = Cache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1, "cached values should be returned"
+    cache.put('c', 3)
+    assert cache.get('b') is None, "the least recently used entry should be evicted"
+    assert cache.get('a') == 1 and cache.get('c') == 3, "recently used entries should stay"
+    assert cache.stats['evictions'] == 1, "evictions should be counted"
+
+
+def test_byte_limit():
+    cache = Cache(max_bytes=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'123456')
+    assert len(cache) == 1 and cache.bytes == 6, "entries should be evicted to stay within the byte limit"
+    cache.put('c', b'x' * 11)
+    assert len(cache) == 1 and cache.get('b') == b'123456', "values larger than the whole cache should not be cached"
+
+
+def test_ttl(clock):
+    cache = Cache(ttl=10, clock=clock)
+    cache.put('a', None)
+    assert cache.get_or_compute('a', lambda: 'computed') is None, "cached None should be a hit"
+    clock.now = 10
+    assert cache.get_or_compute('a', lambda: 'computed') == 'computed', "expired entries should be recomputed"
+    assert cache.stats == {'entries': 1, 'bytes': 8, 'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 1,
+                           'hit_ratio': 0.5}, "stats should be reported"
+
+
+def test_caches_are_per_crawler(requests_mock: Mocker, tmp_path):
+    requests_mock.get(PAGE, text='<html></html>', headers={'Content-Type': 'text/html'})
+    first = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    second = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    assert first.get_content(PAGE) == first.get_content(PAGE), "pages should be fetched"
+    assert requests_mock.call_count == 1, "the second lookup should be served from the cache"
+    assert first.cache_stats()['get_content']['hits'] == 1, "hits should be counted"
+    assert not second.caches['get_content'].stats['misses'], "crawlers should not share caches"
+    ref = weakref.ref(first)
+    del first
+    gc.collect()
+    assert ref() is None, "cached methods should not keep the crawler alive"
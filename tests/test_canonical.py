@@ -0,0 +1,84 @@
+import re
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.canonical import Canonicalizer
+from crawler.frontier import Frontier
+from crawler.html_crawler import HtmlCrawler
+from logger.logger import get_logger
+
+
+@pytest.fixture
+def canonicalizer():
+    return Canonicalizer()
+
+
+def test_canonicalize(canonicalizer):
+    canonical = 'https://www.fbi.gov/wanted/topten'
+    assert canonicalizer.canonicalize(canonical) == canonical, "canonical urls should be unchanged"
+    assert canonicalizer.canonicalize('HTTPS://WWW.FBI.gov/wanted/topten') == canonical, "host should be lowercased"
+    assert canonicalizer.canonicalize('https://www.fbi.gov:443/wanted/topten') == canonical, "default port is dropped"
+    assert canonicalizer.canonicalize('https://www.fbi.gov/wanted/topten#main') == canonical, "fragment is dropped"
+    assert canonicalizer.canonicalize('https://www.fbi.gov/wanted/topten/') == canonical + '/', \
+        "trailing slash is kept; relative links resolve against it"
+    assert Canonicalizer(strip_trailing_slash=True).canonicalize(canonical + '/') == canonical, \
+        "trailing slash is dropped on request"
+    assert canonicalizer.canonicalize('https://www.fbi.gov/wanted/topten?utm_source=x&fbclid=y') == canonical, \
+        "tracking params are dropped"
+    assert canonicalizer.canonicalize('https://www.fbi.gov') == 'https://www.fbi.gov/', "empty path is /"
+    assert canonicalizer.canonicalize('https://www.fbi.gov/?b=2&a=1&utm_medium=z') == 'https://www.fbi.gov/?a=1&b=2', \
+        "remaining query params are sorted"
+    assert canonicalizer.canonicalize('http://127.0.0.1:8080/a') == 'http://127.0.0.1:8080/a', "other ports are kept"
+    assert canonicalizer.canonicalize('https://x/?q=a%2Fb') == 'https://x/?q=a%2Fb', "params keep their encoding"
+    assert canonicalizer.canonicalize('mailto:foo@bar.com') == 'mailto:foo@bar.com', "non http urls are unchanged"
+
+
+def test_strip_params_per_unit():
+    canonicalizer = Canonicalizer(strip_params=['session*'])
+    assert canonicalizer.canonicalize('https://x/a/?sessionid=1&utm_source=2') == 'https://x/a/?utm_source=2', \
+        "only the configured params are dropped"
+
+
+def test_count(canonicalizer):
+    frontier = Frontier()
+    for url in ['https://x/a', 'https://x/a#top', 'https://x/a#top', 'https://x/a?utm_source=y', 'https://X/b#top']:
+        canonical = canonicalizer.canonicalize(url)
+        canonicalizer.count(url, canonical, frontier.add(canonical))
+    assert canonicalizer.stats == {'rewritten': 3, 'saved': 2}, "collapsed variants should be counted once"
+
+
+def test_crawl_dedupes_variants(requests_mock: Mocker, tmp_path):
+    site = 'https://example.com/'
+    content = ('<html><a href="/a">a</a><a href="/a#x">a</a><a href="/a?utm_source=y">a</a>'
+               '<img src="/1.png"><img src="/1.png#x"><img src="//EXAMPLE.com:443/1.png"></html>')
+    headers = {'Content-Type': 'text/html'}
+    requests_mock.head(re.compile(site), headers=headers)
+    requests_mock.get(re.compile(site), text=content, headers=headers)
+    crawler = HtmlCrawler(get_logger(), think_time=0, max_depth=1, output=str(tmp_path))
+    assert crawler._crawl(site) == {'https://example.com/1.png'}, "image variants should collapse"
+    fetched = [req.url for req in requests_mock.request_history if req.method == 'GET']
+    assert fetched == [site, site + 'a'], "page variants should be fetched once"
+    assert crawler.canonicalizer.saved == 4, "saved fetches should be reported"
+
+
+def test_relative_links_keep_their_directory(requests_mock: Mocker, tmp_path):
+    page = 'https://example.com/wanted/topten/'
+    headers = {'Content-Type': 'text/html'}
+    requests_mock.get(page, text='<html><img src="img/a.jpg"></html>', headers=headers)
+    crawler = HtmlCrawler(get_logger(), think_time=0, max_depth=0, output=str(tmp_path))
+    assert crawler._crawl(page) == {page + 'img/a.jpg'}, "relative images should resolve against the page directory"
+
+
+def test_strip_trailing_slash(requests_mock: Mocker, tmp_path):
+    site = 'https://example.com/'
+    headers = {'Content-Type': 'text/html'}
+    requests_mock.get(site, text='<html><a href="/wanted/topten/">a</a><a href="/wanted/topten">a</a></html>',
+                      headers=headers)
+    # the server redirects to the directory; its relative images resolve against where the page was served from
+    requests_mock.get(site + 'wanted/topten', status_code=301, headers={'Location': site + 'wanted/topten/'})
+    requests_mock.get(site + 'wanted/topten/', text='<html><img src="img/a.jpg"></html>', headers=headers)
+    crawler = HtmlCrawler(get_logger(), think_time=0, max_depth=1, output=str(tmp_path), strip_trailing_slash=True)
+    assert crawler._crawl(site) == {site + 'wanted/topten/img/a.jpg'}, \
+        "relative images should resolve against the URL the page was served from"
+    assert requests_mock.call_count == 3, "links differing only in a trailing slash should be fetched once"
@@ -24,10 +24,22 @@ def test_workload():
     workload: List[dict] = CC.workload
     assert workload, "workload should not be None"
     assert len(workload) > 0, "workload should have at least one item"
-    crawler = workload[0]['crawler']
+    crawler = CC.crawler(workload[0])
     assert crawler, "workload.crawler should not be None"
     assert isinstance(crawler, Crawler), "crawler should be a subclass of Crawler"
+    assert CC.crawler(workload[0]) is crawler, "the crawler of a unit should be built once"
     targets = workload[0]['targets']
     assert targets, "workload.targets should not be None"
     assert isinstance(targets, List), "workload.targets should be a List"
     assert isinstance(targets[0], str), "workload.targets should have at least one String"
+
+
+def test_crawlers_are_built_lazily():
+    config = CrawlerConfig(LOGGER, think_time=0, max_depth=2, render=False)
+    assert not config._crawlers, "no crawler should be built before a unit is crawled"
+    options = config.crawler_options(config.workload[0])
+    assert options['max_depth'] == 2 and options['scheduler'] is config.scheduler, "shared settings should apply"
+    assert options['follow_href_patterns'], "unit options should apply"
+    crawler = config.crawler(config.workload[0])
+    assert crawler.max_depth == 2 and crawler.render is False, "the crawler should be built from the options"
+    assert crawler.frontier_path is None, "frontiers should stay in memory without a frontier_dir"
@@ -0,0 +1,70 @@
+import hashlib
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.digests import Digester, file_digests
+from crawler.html_crawler import HtmlCrawler
+from crawler.metadata_index import MetadataIndex
+from logger.logger import get_logger
+
+BODY = b'\x89PNG' + bytes(range(256)) * 64
+
+
+def blob(tmp_path, body=BODY) -> dict:
+    path = tmp_path / 'blob.png'
+    path.write_bytes(body)
+    return {'url': 'https://a/1.png', 'headers': {'content-type': 'image/png'}, 'blob': str(path),
+            'blob_digest': hashlib.sha256(body).hexdigest(), 'size': len(body)}
+
+
+def test_file_digests(tmp_path):
+    path = blob(tmp_path)['blob']
+    assert file_digests(path, ['md5', 'sha1'], chunk_size=100) == {
+        'md5': hashlib.md5(BODY).hexdigest(), 'sha1': hashlib.sha1(BODY).hexdigest()}, "digests should cover the bytes"
+    assert file_digests(path, []) == {}, "no digests should be computed when none are asked for"
+
+
+def test_unknown_digest():
+    with pytest.raises(ValueError):
+        Digester(['sha256', 'crc64'])
+
+
+def test_digester(tmp_path):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    digester = Digester(['sha256', 'md5'], image_hash=lambda path: 'hash:' + path[-8:], workers=1)
+    metadata = blob(tmp_path)
+    digester.submit(index, 'https://a/1.png', metadata)
+    digester.submit(index, 'https://b/1.png', {**metadata, 'url': 'https://b/1.png'})
+    digester.join()
+    record = index.get('https://a/1.png')
+    assert record['digests'] == {'sha256': metadata['blob_digest'], 'md5': hashlib.md5(BODY).hexdigest()}, \
+        "configured digests should be added to the metadata"
+    assert record['image_hash'] == 'hash:blob.png', "images should get a perceptual hash"
+    assert index.get('https://b/1.png')['digests'] == record['digests'], "duplicate blobs should share digests"
+    assert digester.stats == {'assets': 2, 'blobs_digested': 1, 'bytes_digested': len(BODY), 'errors': 0}, \
+        "a blob should only be read once"
+    index.close()
+
+
+def test_store_digest_is_reused(tmp_path):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    digester = Digester()
+    metadata = blob(tmp_path)
+    digester.submit(index, metadata['url'], {**metadata, 'blob': str(tmp_path / 'missing.png')})
+    digester.join()
+    assert index.get(metadata['url'])['digests'] == {'sha256': metadata['blob_digest']}, \
+        "the blob store digest should not be computed again"
+    assert digester.stats['bytes_digested'] == 0, "no blob should be read"
+    index.close()
+
+
+def test_download_file(requests_mock: Mocker, tmp_path):
+    url = 'https://example.com/image.png'
+    requests_mock.get(url, content=BODY, headers={'Content-Type': 'image/png'})
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), digests=['sha1', 'sha512'])
+    assert crawler.download_file(url), "the image should be downloaded"
+    crawler.flush_index()
+    assert crawler.index.get(url)['digests'] == {'sha1': hashlib.sha1(BODY).hexdigest(),
+                                                 'sha512': hashlib.sha512(BODY).hexdigest()}, \
+        "digests of the image bytes should be indexed"
@@ -0,0 +1,97 @@
+import re
+import sys
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.frontier import Frontier, SqliteFrontier
+from crawler.html_crawler import HtmlCrawler
+from logger.logger import get_logger
+
+SITE = 'https://example.com/'
+
+
+@pytest.fixture
+def chain_site(requests_mock: Mocker):
+    """ Mock site where page N links to page N + 1 and shows one image.
+    """
+    def page(request, context):  # pylint: disable=W0613
+        num = int(request.url.rsplit('/', 1)[1] or 0)
+        return f'<html><img src="/img/{num}.png"><a href="/{num + 1}">next</a><a href="/">home</a></html>'
+
+    headers = {'Content-Type': 'text/html'}
+    requests_mock.head(re.compile(SITE), headers=headers)
+    requests_mock.get(re.compile(SITE), text=page, headers=headers)
+    return requests_mock
+
+
+def test_frontier_breadth_first():
+    frontier = Frontier()
+    assert frontier.add('https://a/'), "new url should be queued"
+    assert not frontier.add('https://a/'), "seen url should not be queued twice"
+    frontier.add('https://b/', depth=1)
+    assert len(frontier) == 2, "two pages should be pending"
+    assert frontier.pop() == ('https://a/', 0), "pages should be handed out in FIFO order"
+    assert frontier.pop_many(10) == [('https://b/', 1)], "pop_many should drain remaining pages"
+    assert frontier.pop() is None, "exhausted frontier should return None"
+    assert frontier.seen('https://b/'), "popped pages should stay seen"
+
+    assert frontier.add_image('https://a/1.png'), "new image should be recorded"
+    assert not frontier.add_image('https://a/1.png'), "seen image should not be recorded twice"
+    frontier.add_image('https://a/2.png')
+    frontier.image_done('https://a/1.png')
+    assert frontier.images() == {'https://a/2.png'}, "downloaded images should not be returned"
+
+
+def test_sqlite_frontier_resume(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite')
+    frontier = SqliteFrontier(path)
+    assert not frontier.resumed, "new frontier should not be resumed"
+    frontier.add('https://a/')
+    frontier.add('https://b/', depth=1)
+    frontier.add('https://c/', depth=1)
+    assert frontier.pop() == ('https://a/', 0), "pages should be handed out in FIFO order"
+    frontier.done('https://a/')
+    assert frontier.pop() == ('https://b/', 1), "pages should be handed out in FIFO order"
+    frontier.add_image('https://a/1.png')
+    frontier.close()  # killed while https://b/ was in flight
+
+    frontier = SqliteFrontier(path)
+    assert frontier.resumed, "reopened frontier should be resumed"
+    assert not frontier.add('https://a/'), "crawled pages should stay seen across runs"
+    assert frontier.pop_many(10) == [('https://b/', 1), ('https://c/', 1)], "in flight pages should be retried"
+    assert frontier.images() == {'https://a/1.png'}, "discovered images should survive a restart"
+    frontier.clear()
+    assert not frontier.resumed, "cleared frontier should start over"
+    frontier.close()
+
+
+def test_crawl_is_iterative(chain_site, tmp_path):
+    depth = sys.getrecursionlimit() + 100
+    crawler = HtmlCrawler(get_logger(), think_time=0, max_depth=depth, output=str(tmp_path))
+    img_links = crawler._crawl(SITE)
+    assert len(img_links) == depth + 1, "deep sites should not hit the recursion limit"
+    assert chain_site.call_count == depth + 1, "every page should be fetched exactly once"
+
+
+def test_crawl_does_not_leak_between_calls(chain_site, tmp_path):
+    crawler = HtmlCrawler(get_logger(), think_time=0, max_depth=2, output=str(tmp_path))
+    first = crawler._crawl(SITE)
+    assert len(first) == 3, "pages up to max_depth should be crawled"
+    assert crawler._crawl(SITE) == first, "repeated crawls should see the same pages"
+
+
+def test_crawl_resumes_from_disk(chain_site, tmp_path):
+    path = str(tmp_path / 'frontier.sqlite')
+    crawler = HtmlCrawler(get_logger(), think_time=0, max_depth=5, frontier_path=path, output=str(tmp_path))
+    frontier = crawler.new_frontier()
+    frontier.add(SITE)
+    frontier.pop()
+    frontier.done(SITE)
+    frontier.add(SITE + '1', depth=1)
+    frontier.close()  # killed after crawling the home page
+
+    crawler._crawl(SITE, crawler.new_frontier())
+    fetched = [req.url for req in chain_site.request_history if req.method == 'GET']
+    assert SITE not in fetched, "resumed crawl should not re-crawl the target"
+    assert fetched == [SITE + str(num) for num in range(1, 6)], "resumed crawl should continue where it stopped"
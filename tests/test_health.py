@@ -0,0 +1,165 @@
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.health import CLOSED, HALF_OPEN, OPEN, CircuitOpen, HealthTracker, HostDown, RetryableError, RetryQueue
+from crawler.html_crawler import HtmlCrawler
+from logger.logger import get_logger
+
+SITE = 'https://example.com/'
+PAGES = 20
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_circuit_breaker(clock):
+    health = HealthTracker(window=4, min_requests=4, failure_ratio=0.5, cooldown=10, clock=clock)
+    url = SITE + 'a.png'
+    for failed in (False, True, False, True):
+        health.check(url)
+        health.record(url, failed=failed, latency=0.1)
+    assert health.state(url) == OPEN, "half of the recent requests failing should open the circuit"
+    with pytest.raises(CircuitOpen) as raised:
+        health.check(url)
+    assert raised.value.retry_in == 10, "requests should fail fast until the cooldown is over"
+    clock.now = 10
+    health.check(url)
+    assert health.state(url) == HALF_OPEN, "one probe should be let through after the cooldown"
+    with pytest.raises(CircuitOpen):
+        health.check(url)
+    health.record(url, failed=True)
+    assert health.state(url) == OPEN, "a failed probe should reopen the circuit"
+    clock.now = 30
+    health.check(url)
+    health.record(url, failed=False)
+    assert health.state(url) == CLOSED, "a successful probe should close the circuit"
+    health.check('https://other.com/')
+    assert health.stats()['example.com']['error_rate'] == 0.5, "error rates should be tracked per host"
+
+
+def test_retry_queue(clock):
+    retries = RetryQueue(max_attempts=2, base_delay=1, clock=clock)
+    assert retries.defer(('image', 'a')) and retries.defer(('image', 'b'), min_delay=5), "items should be deferred"
+    assert not retries.pop_due() and retries.next_due_in() == 1, "items should wait for their delay"
+    clock.now = 1
+    assert retries.pop_due() == [('image', 'a')], "due items should be returned"
+    assert retries.defer(('image', 'a'), sent=False), "requests that were never sent should not use up attempts"
+    assert retries.next_due_in() == 2, "delays should double per attempt"
+    clock.now = 3
+    assert retries.pop_due() == [('image', 'a')] and retries.defer(('image', 'a')), "items should be deferred again"
+    assert not retries.defer(('image', 'a')), "items should run out of attempts"
+
+
+def test_dead_host_is_given_up(clock):
+    health = HealthTracker(clock=clock)  # default cooldowns: 30s, doubling up to 10 minutes
+    retries = RetryQueue(clock=clock)
+    urls = [f'{SITE}{num}.png' for num in range(PAGES)]
+    for url in urls:
+        retries.defer(('image', url), sent=False)
+    given_up = []
+    while len(retries) and clock.now < 24 * 3600:
+        clock.now += retries.next_due_in()
+        for item in retries.pop_due():
+            try:
+                health.check(item[1])
+            except HostDown:
+                given_up.append(item[1])
+                continue
+            except CircuitOpen as ex:
+                assert retries.defer(item, ex.retry_in, sent=False), "open circuits should not use up attempts"
+                continue
+            health.record(item[1], failed=True)
+            if not retries.defer(item):
+                given_up.append(item[1])
+    assert sorted(given_up) == sorted(urls), "every URL of a dead host should be given up"
+    assert clock.now < 3600, "a dead host should be given up within the hour"
+    assert health.stats()['example.com']['circuit_opened'] == 1 + health.max_reopens, \
+        "the circuit should reopen max_reopens times before the host is given up"
+
+
+def flaky(failures: Counter):
+    """ Every URL fails with a 503 on its first request and succeeds on the second.
+    """
+    def respond(request, context):
+        failures[request.url] += 1
+        if failures[request.url] == 1:
+            context.status_code = 503
+            return b''
+        is_home = request.url == SITE
+        context.headers = {'Content-Type': 'text/html' if request.path.startswith('/page') or is_home else 'image/png'}
+        if is_home:
+            return ''.join(f'<a href="/page{num}">p</a>' for num in range(PAGES)).encode('utf-8')
+        return f'<img src="{request.path}.png">'.encode('utf-8') if request.path.startswith('/page') else b'png'
+    return respond
+
+
+def test_crawl_with_half_of_the_requests_failing(requests_mock: Mocker, tmp_path):
+    requests_mock.get(re.compile(SITE + '.*'), content=flaky(Counter()))
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), http_retries=3, retry_backoff=0.01,
+                          health=HealthTracker(cooldown=0.05, max_cooldown=0.2, max_reopens=100))  # new URLs fail probes
+    started_at = time.monotonic()
+    (files_downloaded, exceptions) = crawler.crawl([SITE])
+    assert time.monotonic() - started_at < 10, "crawl time should stay bounded"
+    assert (files_downloaded, exceptions) == (PAGES, []), "every page and image should be retried until it succeeds"
+    assert crawler.health.stats()['example.com']['circuit_opened'] > 0, "the failing host should shed load"
+
+
+def test_crawl_of_a_dead_host(requests_mock: Mocker, tmp_path):
+    requests_mock.get(SITE, text='<a href="/a">a</a><img src="/a.png"><img src="/b.png">',
+                      headers={'Content-Type': 'text/html'})
+    requests_mock.get(re.compile(SITE + '.+'), status_code=503)
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), http_retries=2, retry_backoff=0.01,
+                          health=HealthTracker(min_requests=2, cooldown=0.01))
+    (files_downloaded, exceptions) = crawler.crawl([SITE])
+    assert files_downloaded == 0 and len(exceptions) == 3, "every failed URL should be reported once"
+    assert all(isinstance(ex, (RetryableError, CircuitOpen, HostDown)) for ex in exceptions), "failures should be typed"
+    assert requests_mock.call_count <= 1 + 3 * 3, "no URL should be requested more than its attempts"
+
+
+class Unavailable(BaseHTTPRequestHandler):
+    """ Answers the first request with a 503, then serves a page with one image.
+    """
+    requests = Counter()
+
+    def do_GET(self):  # pylint: disable=C0103
+        Unavailable.requests[self.path] += 1
+        if sum(Unavailable.requests.values()) == 1:
+            self.send_error(503)
+            return
+        (body, content_type) = (b'png', 'image/png') if self.path.endswith('.png') else (b'<img src="/a.png">', 'text/html')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+def test_crawl_retries_a_real_503(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Unavailable)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), http_retries=2, retry_backoff=0.01)
+        result = crawler.crawl([f'http://127.0.0.1:{server.server_address[1]}/'])
+    finally:
+        server.shutdown()
+    assert result == (1, []), "a 503 passing through the HTTP adapter should be deferred and retried"
+    assert Unavailable.requests['/'] == 2, "the page should be requested again after the 503"
@@ -1,10 +1,10 @@
+import hashlib
 import os
 import re
 from typing import List
 from urllib.parse import quote
 
 import pytest
-from bs4 import BeautifulSoup
 from requests_mock.mocker import Mocker
 
 from crawler.config import CrawlerConfig
@@ -214,10 +214,10 @@ def test_get_content(crawler, expectations):
 
 def test_find_img_tags(configuration, crawler, empty_ignore_crawler, expectations):
     for url in expectations.keys():
-        soup: BeautifulSoup = BeautifulSoup(crawler.get_content(url), 'html.parser')
-        img_links: List[str] = crawler.find_img_tags(soup, url)
+        links = crawler.parse(crawler.get_content(url))
+        img_links: List[str] = crawler.find_img_tags(links, url)
         assert list(img_links) == expectations[url]['img_links'], 'img_links must match expectations'
-        img_links = list(empty_ignore_crawler.find_img_tags(soup, url))
+        img_links = list(empty_ignore_crawler.find_img_tags(links, url))
         assert len(img_links) > 0, 'find_img_tags must support empty ignore'
         assert img_links[0].endswith('.png'), 'find_img_tags should have a match'
 
@@ -228,7 +228,8 @@ def test_download_file(crawler, mock_images):
     for url in mock_images.keys():
         file_path = crawler.download_file(url)
         assert file_path, "file_path must be returned"
-        assert file_path == 'output/1ce559cc3fa5dfd70d914a3f083b357c474fdf63.jpg', "follows file path specification"
+        digest = hashlib.sha256(mock_images[url]['content']).hexdigest()
+        assert file_path == f'output/blobs/{digest[:2]}/{digest}.jpg', "follows file path specification"
         with open(file_path, 'rb') as file:
             jpeg = file.read()
             assert len(jpeg) > 0, "file must have data"
@@ -252,8 +253,8 @@ def test_follow_href(crawler, empty_follow_crawler):
 
 def test_find_a_tags(crawler: HtmlCrawler, expectations: dict):
     for url in expectations.keys():
-        soup: BeautifulSoup = BeautifulSoup(crawler.get_content(url), 'html.parser')
-        a_tags = crawler.find_a_tags(soup, url)
+        links = crawler.parse(crawler.get_content(url))
+        a_tags = crawler.find_a_tags(links, url)
         assert expectations[url]['a_tags'] == list(a_tags), 'a_tags must match expectations'
 
 
@@ -262,17 +263,43 @@ def test_crawl(crawler: HtmlCrawler, expectations: dict):
         crawler._crawl(url)
 
 
-def test_cached(crawler: HtmlCrawler):
+def test_download_file_dedup(logger, mock_images, requests_mock: Mocker, tmp_path):
+    crawler = HtmlCrawler(logger, think_time=0, output=str(tmp_path))
+    url = 'https://www.fbi.gov/wanted/topten/yaser-abdel-said/@@images/image/preview'
+    mirror = 'https://cdn.example.com/yaser-abdel-said.jpg'
+    requests_mock.head(mirror, headers={'Content-Type': 'image/jpeg', 'Content-Length': '23930'})
+    requests_mock.get(mirror, content=mock_images[url]['content'],
+                      headers={'Content-Type': 'image/jpeg', 'Content-Length': '23930'})
+    assert crawler.download_file(url) == crawler.download_file(mirror), "identical bodies should share one blob"
+    assert len(crawler.index) == 2, "each url should have an index entry"
+    assert crawler.store.stats == {'blobs_written': 1, 'bytes_written': 23930,
+                                   'duplicates': 1, 'bytes_deduped': 23930}, "duplicate write should be skipped"
+
+
+def test_cached(crawler: HtmlCrawler, mock_images):
+    url = 'https://www.fbi.gov/wanted/topten/yaser-abdel-said/@@images/image/preview'
+    crawler.download_file(url)
     headers = {'Content-Type': 'image/jpeg', 'Content-Length': '23930'}
-    metadata_file = 'output/1ce559cc3fa5dfd70d914a3f083b357c474fdf63-metadata.json'
-    destination = 'output/1ce559cc3fa5dfd70d914a3f083b357c474fdf63.jpg'
-    assert crawler.cached(headers, metadata_file, destination), "Expect cache hit"
+    metadata = crawler.index.get(url)
+    assert crawler.cached(headers, metadata), "Expect cache hit"
+
+    missing = {**metadata, 'blob': f"{metadata['blob']}.foo"}
+    assert not crawler.cached(headers, missing), "Expect cache miss; destination not found"
 
-    assert not crawler.cached(headers, metadata_file, f"{destination}.foo"), "Expect cache miss; destination not found"
     headers = {'Content-Type': 'image/unknown', 'Content-Length': '23930'}
-    assert not crawler.cached(headers, metadata_file, destination), "Expect cache miss; Content-Type mismatch"
+    assert not crawler.cached(headers, metadata), "Expect cache miss; Content-Type mismatch"
     headers = {'Content-Type': 'image/jpeg', 'Content-Length': '1337'}
-    assert not crawler.cached(headers, metadata_file, destination), "Expect cache miss; Content-Length mismatch"
+    assert not crawler.cached(headers, metadata), "Expect cache miss; Content-Length mismatch"
+    headers = {'Content-Type': 'image/jpeg'}
+    assert not crawler.cached(headers, metadata), "Expect cache miss; Content-Length missing"
     headers = {'Content-Type': 'image/unknown', 'Content-Length': '23930'}
-    assert not crawler.cached(headers, f"{metadata_file}.foo",
-                              destination), "Expect cache miss; metadata_file not found"
+    assert not crawler.cached(headers, None), "Expect cache miss; metadata not found"
+
+
+def test_deleted_blob_is_downloaded_again(logger, mock_images, tmp_path):
+    crawler = HtmlCrawler(logger, think_time=0, output=str(tmp_path))
+    url = 'https://www.fbi.gov/wanted/topten/yaser-abdel-said/@@images/image/preview'
+    blob = crawler.download_file(url)
+    os.remove(blob)
+    assert crawler.download_file(url) == blob, "the blob should be written again"
+    assert os.path.exists(blob), "a deleted blob should not be reported as cached"
@@ -0,0 +1,75 @@
+import json
+import sys
+
+from crawler.metadata_index import MetadataIndex, main
+
+URL = 'https://www.fbi.gov/wanted/topten/yaser-abdel-said/@@images/image/preview'
+
+
+def metadata(url: str, digest='abc', blob='output/blobs/ab/abc.jpg') -> dict:
+    return {'url': url, 'headers': {'Content-Type': 'image/jpeg'}, 'blob': blob, 'blob_digest': digest, 'size': 3}
+
+
+def test_put_get(tmp_path):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'), batch_size=10)
+    assert index.get(URL) is None, "unknown url should return None"
+    assert not index.has_url(URL), "unknown url should not be found"
+    index.put(URL, metadata(URL))
+    assert index.get(URL) == metadata(URL), "buffered writes should be visible"
+    assert index.has_url(URL), "buffered url should be found"
+    assert index.has_digest('abc'), "buffered digest should be found"
+    assert not index.has_digest('def'), "unknown digest should not be found"
+    index.close()
+
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    assert index.get(URL) == metadata(URL), "metadata should survive a restart"
+    assert index.has_digest('abc'), "digest should survive a restart"
+    index.close()
+
+
+def test_batched_writes(tmp_path):
+    path = str(tmp_path / 'index.sqlite')
+    index = MetadataIndex(path, batch_size=3)
+    reader = MetadataIndex(path)
+    index.put('https://a/1', metadata('https://a/1'))
+    index.put('https://a/2', metadata('https://a/2'))
+    assert not reader.has_url('https://a/1'), "writes should be buffered until the batch is full"
+    index.put('https://a/3', metadata('https://a/3'))
+    assert reader.has_url('https://a/1'), "full batch should be committed"
+    assert len(reader) == 3, "all records of the batch should be committed"
+    index.close()
+    reader.close()
+
+
+def test_import_sidecars(tmp_path, monkeypatch, capsys):
+    blob_sidecar = tmp_path / '1111-metadata.json'
+    blob_sidecar.write_text(json.dumps(metadata('https://a/1', blob=str(tmp_path / 'blobs/ab/abc.jpg'))))
+    legacy_sidecar = tmp_path / '2222-metadata.json'
+    legacy_sidecar.write_text(json.dumps({'url': 'https://a/2', 'headers': {'Content-Type': 'image/png'}}))
+    (tmp_path / '2222.png').write_bytes(b'png!')
+    (tmp_path / '3333-metadata.json').write_text('{corrupt')
+
+    monkeypatch.setattr(sys, 'argv', ['metadata_index', str(tmp_path), '--remove'])
+    main()
+    assert 'imported 2 sidecar files' in capsys.readouterr().out, "valid sidecars should be imported"
+    assert not blob_sidecar.exists() and not legacy_sidecar.exists(), "imported sidecars should be removed"
+
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    assert index.get('https://a/1')['blob_digest'] == 'abc', "sidecar metadata should be imported"
+    legacy = index.get('https://a/2')
+    assert legacy['blob'] == str(tmp_path / '2222.png'), "legacy sidecars should point at their asset"
+    assert legacy['size'] == 4, "legacy asset size should be recorded"
+    index.close()
+
+
+def test_background_writes(tmp_path):
+    path = str(tmp_path / 'index.sqlite')
+    index = MetadataIndex(path, batch_size=2, background=True)
+    reader = MetadataIndex(path)
+    for num in range(5):
+        index.put(f'https://a/{num}', metadata(f'https://a/{num}'))
+        assert index.has_url(f'https://a/{num}'), "records should be visible while they are written"
+    index.flush()
+    assert len(reader) == 5, "flush should commit every record"
+    index.close()
+    reader.close()
@@ -0,0 +1,60 @@
+import glob
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from crawler import parsers
+from crawler.parsers import PARSERS, ImageTag, PageLinks, get_parser
+
+FIXTURES = [path for path in glob.glob(os.path.join(os.path.dirname(__file__), 'fixtures', 'https*'))
+            if open(path, 'rb').read(512).lstrip().lower().startswith((b'<!doctype', b'<html'))]
+# lxml is optional; see crawler/parsers.py
+NAMES = [pytest.param(name, marks=pytest.mark.skipif(name == 'lxml' and parsers.etree is None, reason="lxml not installed"))
+         for name in sorted(PARSERS)]
+
+
+def soup_links(content: bytes) -> PageLinks:
+    """ Links found by walking a full BeautifulSoup tree; the reference result.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    images = [ImageTag(img.get('src'), img.get('srcset')) for img in soup.find_all('img')
+              if img.get('src') or img.get('srcset')]
+    return PageLinks(images, [a.get('href') for a in soup.find_all('a') if a.get('href')])
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_fixtures_match_full_tree(name):
+    assert FIXTURES, "html fixtures should be found"
+    parser = get_parser(name)
+    for path in FIXTURES:
+        with open(path, 'rb') as file:
+            content = file.read()
+        assert parser.parse(content) == soup_links(content), f"{name} should find the same links in {path}"
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_parse(name):
+    content = ('<html><body><img src="/a.png" srcset="/a-2x.png 2x"/><IMG SRC="/b.png">'
+               '<img alt="no source"><a href="/x?a=1&amp;b=2">x</a><a>no href</a>'
+               '<a href="/café">café</a></body></html>').encode('utf-8')
+    links = get_parser(name).parse(content)
+    assert links.images == [ImageTag('/a.png', '/a-2x.png 2x'), ImageTag('/b.png', None)], \
+        f"{name} should find img src and srcset"
+    assert links.hrefs == ['/x?a=1&b=2', '/café'], f"{name} should find decoded hrefs"
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_responsive_images(name):
+    content = (b'<html><picture><source srcset="/a.webp 800w" type="image/webp"><source data-srcset="/a.jpg 1200w">'
+               b'<img src="/a-small.jpg"></picture><img src="data:image/gif;base64,R0lG" data-src="/lazy.jpg">'
+               b'<source srcset="/stray.jpg"><img src="/c.jpg"></html>')
+    assert get_parser(name).parse(content).images == [ImageTag('/a-small.jpg', '/a.webp 800w, /a.jpg 1200w'),
+                                                      ImageTag('/lazy.jpg', None), ImageTag('/c.jpg', None)], \
+        f"{name} should find picture sources and lazy-loaded images"
+    assert get_parser(name).parse(b'') == PageLinks([], []), f"{name} should accept empty pages"
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        get_parser('regex')
@@ -0,0 +1,103 @@
+import io
+import random
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.metadata_index import MetadataIndex
+from crawler.phash import HASHES, HammingIndex, NearDuplicates, hamming, load_pixels, resize
+from logger.logger import get_logger
+
+np = pytest.importorskip('numpy')
+PORTRAIT = 'tests/fixtures/1ce559cc3fa5dfd70d914a3f083b357c474fdf63.jpg'
+
+
+def test_resize():
+    pixels = np.arange(16, dtype=np.float64).reshape(4, 4)
+    assert resize(pixels, 2, 2).tolist() == [[2.5, 4.5], [10.5, 12.5]], "blocks should be averaged"
+    assert resize(pixels, 8, 8).shape == (8, 8), "small images should be scaled up"
+
+
+@pytest.mark.parametrize('algorithm', sorted(HASHES))
+def test_hashes_survive_resizing(algorithm):
+    rng = np.random.default_rng(7)
+    image = resize(rng.random((16, 16)) * 255, 240, 180)  # smooth picture
+    other = resize(rng.random((16, 16)) * 255, 240, 180)
+    image_hash = HASHES[algorithm]
+    assert image_hash(image) < 2 ** 64, "hashes should have 64 bits"
+    assert hamming(image_hash(image), image_hash(resize(image, 120, 90))) <= 8, "a resized copy should be near"
+    assert hamming(image_hash(image), image_hash(other)) > 8, "a different picture should be far"
+
+
+def test_hamming_index():
+    rng = random.Random(3)
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    index = HammingIndex(max_distance=8)
+    for (num, value) in enumerate(values):
+        index.add(str(num), value)
+    for _ in range(50):
+        query = values[rng.randrange(len(values))] ^ sum(1 << bit for bit in rng.sample(range(64), rng.randrange(12)))
+        expected = sorted(((str(num), hamming(value, query)) for (num, value) in enumerate(values)
+                           if hamming(value, query) <= 8), key=lambda hit: (hit[1], hit[0]))
+        assert index.query(query) == expected, "lookups should find every hash within the distance"
+    assert index.query(values[0], max_distance=0) == [('0', 0)], "smaller distances should be honoured"
+    with pytest.raises(ValueError):
+        index.query(values[0], max_distance=9)
+
+
+def record(tmp_path, url: str, value: int, digest: str, body=b'jpeg') -> dict:
+    blob = tmp_path / f'{digest}.jpg'
+    blob.write_bytes(body)
+    return {'url': url, 'headers': {'Content-Type': 'image/jpeg', 'Content-Length': str(len(body))}, 'blob': str(blob),
+            'blob_digest': digest, 'size': len(body), 'image_hash': f'phash:{value:016x}'}
+
+
+def test_near_duplicates(tmp_path):
+    index = MetadataIndex(str(tmp_path / 'index.sqlite'))
+    first = record(tmp_path, 'https://a/1', 0xff00ff00ff00ff00, 'aa')
+    index.put(first['url'], first)
+    index.flush()
+    near = NearDuplicates(max_distance=4, action='skip')
+    second = record(tmp_path, 'https://b/1', 0xff00ff00ff00ff07, 'bb', body=b'resized jpeg')
+    checked = near.check(index, second['url'], second)
+    assert (checked['near_duplicate_of'], checked['near_duplicate_distance']) == ('https://a/1', 3), \
+        "images of earlier crawls should be matched"
+    assert checked['blob'] == first['blob'], "skipped near-duplicates should share the blob of the first image"
+    assert (tmp_path / 'bb.jpg').exists(), "the skipped blob should be left for the collector"
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    assert crawler.cached(second['headers'], checked) == first['blob'], \
+        "a skipped near-duplicate should stay a cache hit on the next crawl"
+    third = record(tmp_path, 'https://c/1', 0x00ff00ff00ff00ff, 'cc')
+    assert near.check(index, third['url'], third) == third, "different images should be kept as they are"
+    assert dict(near.stats) == {'images': 2, 'near_duplicates': 1, 'bytes_saved': 12}, "matches should be counted"
+    index.close()
+
+
+def test_settings():
+    with pytest.raises(ValueError):
+        NearDuplicates(action='delete')
+    with pytest.raises(ValueError):
+        NearDuplicates(algorithm='md5')
+    settings = NearDuplicates(4, 'skip', 'dhash').settings()
+    assert NearDuplicates(**settings).settings() == settings, "settings should round trip"
+
+
+def test_crawl_flags_resized_copies(requests_mock: Mocker, tmp_path):
+    image = pytest.importorskip('PIL.Image')
+    with image.open(PORTRAIT) as portrait:
+        smaller = io.BytesIO()
+        portrait.resize((portrait.width // 2, portrait.height // 2)).save(smaller, 'JPEG', quality=70)
+    with open(PORTRAIT, 'rb') as file:
+        original = file.read()
+    requests_mock.get('https://example.com/a.jpg', content=original, headers={'Content-Type': 'image/jpeg'})
+    requests_mock.get('https://example.org/a.jpg', content=smaller.getvalue(), headers={'Content-Type': 'image/jpeg'})
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), digest_workers=1,
+                          near_duplicates=NearDuplicates())
+    crawler.download_file('https://example.com/a.jpg')
+    crawler.download_file('https://example.org/a.jpg')
+    crawler.flush_index()
+    assert load_pixels(PORTRAIT).ndim == 2, "images should be decoded to grayscale"
+    assert crawler.index.get('https://example.org/a.jpg')['near_duplicate_of'] == 'https://example.com/a.jpg', \
+        "a re-encoded, resized copy should be flagged"
+    assert 'near_duplicate_of' not in crawler.index.get('https://example.com/a.jpg'), "the first image should not"
@@ -0,0 +1,119 @@
+import re
+import threading
+import time
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.frontier import Frontier
+from crawler.health import RetryableError, RetryQueue
+from crawler.html_crawler import HtmlCrawler
+from crawler.pipeline import Pipeline
+from logger.logger import get_logger
+
+SITE = 'https://example.com/'
+PAGES = 30
+
+
+class GatedCrawler(HtmlCrawler):
+    """ Crawler whose image downloads wait for a gate and can be made to fail.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = set()
+        self.flaky = set()  # fail once, then succeed
+        self.pages_fetched = 0
+        self.first_download_after_pages = None
+
+    def get_content(self, url: str) -> bytes:
+        self.pages_fetched += 1
+        return super().get_content(url)
+
+    def download_file(self, url: str, output: str = None) -> str:
+        if self.first_download_after_pages is None:
+            self.first_download_after_pages = self.pages_fetched
+        self.gate.wait()
+        if url in self.fail:
+            raise RuntimeError(f"cannot download {url}")
+        if url in self.flaky:
+            self.flaky.discard(url)
+            raise RetryableError(url, 503)
+        return super().download_file(url, output)
+
+
+@pytest.fixture
+def site(requests_mock: Mocker):
+    def page(request, context):
+        context.headers = {'Content-Type': 'text/html'}
+        links = ''.join(f'<a href="/page{num}">p</a>' for num in range(PAGES)) if request.path == '/' else ''
+        return f'<html><img src="{request.path.rstrip("/")}.png">{links}</html>'.encode('utf-8')
+    requests_mock.get(re.compile(r'.*\.png$'), content=b'png', headers={'Content-Type': 'image/png'})
+    requests_mock.get(re.compile(SITE + r'(page\d+)?$'), content=page)
+    return requests_mock
+
+
+@pytest.fixture
+def crawler(tmp_path):
+    return GatedCrawler(get_logger(), think_time=0, max_depth=1, output=str(tmp_path), fetch_workers=1,
+                        download_workers=2, pipeline_queue_size=2)
+
+
+def test_crawl(site, crawler):
+    (files_downloaded, exceptions) = crawler.crawl([SITE])
+    assert files_downloaded == PAGES + 1, "every image should be downloaded"
+    assert not exceptions, "no exceptions expected"
+    assert crawler.first_download_after_pages < PAGES, "images should download while pages are crawled"
+
+
+def test_backpressure(site, crawler):
+    crawler.gate.clear()
+    pipeline = Pipeline(get_logger(), crawler, fetch_workers=1, parse_workers=1, download_workers=2, queue_size=2)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pipeline.run([SITE], Frontier())))
+    thread.start()
+    time.sleep(0.5)
+    stalled_at = crawler.pages_fetched
+    assert stalled_at < PAGES, "blocked downloads should stop the page fetchers"
+    time.sleep(0.2)
+    assert crawler.pages_fetched == stalled_at, "fetching should stay stalled while downloads are blocked"
+    crawler.gate.set()
+    thread.join(timeout=10)
+    assert result == [(PAGES + 1, [])], "the crawl should complete once downloads resume"
+    assert pipeline.stats['pages'] == PAGES + 1, "every page should be crawled"
+
+
+def test_download_errors(site, crawler, tmp_path):
+    crawler.fail.add(SITE + 'page3.png')
+    (files_downloaded, exceptions) = crawler.crawl([SITE])
+    assert files_downloaded == PAGES and [type(ex) for ex in exceptions] == [RuntimeError], \
+        "download errors should be returned while the other images are downloaded"
+    assert len(list(tmp_path.glob('blobs/*/*.png'))) == 1, "other images should still be downloaded"
+    assert len(crawler.index) == 2 * (PAGES + 1) - 1, "every page and every other image should be indexed"
+
+
+def test_deferred_retries(site, crawler):
+    crawler.flaky.update({SITE + 'page3.png', SITE + 'page4.png'})
+    pipeline = Pipeline(get_logger(), crawler, retry_queue=RetryQueue(max_attempts=1, base_delay=0.01))
+    assert pipeline.run([SITE], Frontier()) == (PAGES + 1, []), "transient failures should be retried later"
+    assert pipeline.stats['deferred'] == 2, "deferred retries should be counted"
+
+
+@pytest.mark.parametrize('fetch_workers', [1, 2])
+def test_linear_site(requests_mock: Mocker, tmp_path, fetch_workers):
+    chain = {'/': '/a', '/a': '/b', '/b': None}
+
+    def page(request, context):
+        context.headers = {'Content-Type': 'text/html'}
+        link = f'<a href="{chain[request.path]}">next</a>' if chain[request.path] else ''
+        return f'<html><img src="{request.path.rstrip("/")}.png">{link}</html>'.encode('utf-8')
+    requests_mock.get(re.compile(r'.*\.png$'), content=b'png', headers={'Content-Type': 'image/png'})
+    requests_mock.get(re.compile(SITE + r'[ab]?$'), content=page)
+    crawler = HtmlCrawler(get_logger(), think_time=0, max_depth=2, output=str(tmp_path), fetch_workers=fetch_workers)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(crawler.crawl([SITE])), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert result == [(3, [])], "a site with one link per page should be crawled to the end"
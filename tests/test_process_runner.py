@@ -0,0 +1,86 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler.budget import ByteBudget
+from crawler.frontier import SqliteFrontier
+from crawler.process_runner import ProcessRunner, WorkerError, shard
+from crawler.scheduler import HostScheduler
+from logger.logger import get_logger
+
+PAGES = 4
+
+
+class Handler(BaseHTTPRequestHandler):
+    hosts = []
+
+    def do_GET(self):  # pylint: disable=C0103
+        if self.path.endswith('.png'):
+            if self.path == '/missing.png':
+                self.send_error(404)
+                return
+            self._send(self.path.encode('utf-8'), 'image/png')
+            return
+        links = ''.join(f'<a href="{host}/page{page}">p</a>' for host in self.hosts for page in range(PAGES))
+        html = f'<html><img src="/{self.path.strip("/") or "index"}.png"><img src="/missing.png">{links}</html>'
+        self._send(html.encode('utf-8'), 'text/html')
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+@pytest.fixture(scope='module')
+def hosts():
+    servers = [ThreadingHTTPServer(('127.0.0.1', 0), Handler) for _ in range(2)]
+    Handler.hosts = [f'http://127.0.0.1:{server.server_address[1]}' for server in servers]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield Handler.hosts
+    for server in servers:
+        server.shutdown()
+
+
+def test_shard():
+    assert shard('https://a.com/x', 4) == shard('https://A.com/y?z', 4), "a host should map to one worker"
+    assert {shard(f'https://host{num}.com/', 4) for num in range(64)} == {0, 1, 2, 3}, "hosts should spread"
+
+
+def test_crawl(hosts, tmp_path):
+    runner = ProcessRunner(get_logger(), workers=2, think_time=0, max_depth=1, http_retries=0, output=str(tmp_path),
+                           scheduler=HostScheduler(0.0), byte_budget=ByteBudget(1024 * 1024))
+    (files_downloaded, exceptions) = runner.crawl([hosts[0], 'http://127.0.0.1:1/'])
+    pages = 1 + 2 * PAGES
+    assert files_downloaded == pages, "every page image should be downloaded"
+    assert len(exceptions) == 1 and isinstance(exceptions[0], WorkerError), "the unreachable page should be reported"
+    assert exceptions[0].url == 'http://127.0.0.1:1/', "the error should name the failed url"
+    assert runner.stats['pages'] == pages, "every page should be crawled once"
+    assert runner.stats['images'] == pages + len(hosts), "every image should be fetched once"
+    assert runner.stats['errors'] == 1, "worker errors should be counted"
+    assert runner.stats['workers'] == 2, "worker count should be reported"
+    assert runner.telemetry.counter('pages_total') == pages, "worker telemetry should be merged"
+    assert len(list(tmp_path.glob('blobs/*/*.png'))) == PAGES + 1, "workers should share the deduplicating blob store"
+    owners = {worker_id for (worker_id, stats) in runner.worker_stats.items() if stats.get('pages')}
+    assert len(owners) == len({shard(host, 2) for host in hosts}), "pages should be crawled by their host's worker"
+
+
+def test_frontier_is_kept_after_errors(hosts, tmp_path):
+    frontier_path = str(tmp_path / 'frontier.sqlite')
+    runner = ProcessRunner(get_logger(), workers=1, think_time=0, max_depth=0, http_retries=0, output=str(tmp_path),
+                           scheduler=HostScheduler(0.0), frontier_path=frontier_path)
+    (_, exceptions) = runner.crawl(['http://127.0.0.1:1/'])
+    assert exceptions, "the unreachable page should be reported"
+    frontier = SqliteFrontier(frontier_path)
+    assert frontier.resumed, "a crawl with errors should keep its frontier to resume from"
+    frontier.close()
+    runner.crawl([hosts[0]])
+    frontier = SqliteFrontier(frontier_path)
+    assert not frontier.resumed, "a completed crawl should clear its frontier"
+    frontier.close()
@@ -0,0 +1,78 @@
+import re
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.parsers import ImageTag, PageLinks
+from crawler.recrawl import RevisitPolicy, fingerprint, stored_links
+from crawler.telemetry import Telemetry
+from logger.logger import get_logger
+
+SITE = 'https://example.com/'
+HOME = '<html><img src="/home.png"><a href="/page">page</a></html>'
+PAGE = '<html><img src="/page.png"></html>'
+
+
+@pytest.fixture
+def site(requests_mock: Mocker):
+    requests_mock.get(SITE, text=HOME, headers={'Content-Type': 'text/html'})
+    requests_mock.get(SITE + 'page', text=PAGE, headers={'Content-Type': 'text/html'})
+    requests_mock.get(re.compile(r'.*\.png$'), content=b'png', headers={'Content-Type': 'image/png'})
+    return requests_mock
+
+
+def crawl(tmp_path, policy: RevisitPolicy) -> HtmlCrawler:
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), revisit_policy=policy,
+                          telemetry=Telemetry())
+    crawler.crawl([SITE])
+    return crawler
+
+
+def requested(site: Mocker, suffix: str) -> int:
+    return sum(1 for request in site.request_history if request.url.endswith(suffix))
+
+
+def test_policy():
+    policy = RevisitPolicy(min_interval=10, max_interval=35, backoff=2)
+    links = PageLinks([ImageTag('/a.png', None)], ['/b'])
+    record = policy.update(None, 'x', links, now=100)
+    assert record['interval'] == 10 and record['changes'] == 0, "new pages start at the minimum interval"
+    assert not policy.due(record, now=105) and policy.due(record, now=110), "pages are due once the interval is up"
+    assert stored_links(record) == links, "stored links should round trip"
+    record = policy.update(record, 'x', None, now=110)
+    record = policy.update(record, 'x', None, now=130)
+    assert record['interval'] == 35 and record['checks'] == 3, "unchanged pages back off up to the maximum"
+    record = policy.update(record, 'y', PageLinks([], []), now=165)
+    assert (record['interval'], record['changes'], record['changed_at']) == (17.5, 1, 165), \
+        "changed pages are revisited sooner"
+    assert fingerprint('é') == fingerprint('é'.encode('utf-8')), "rendered text and bytes fingerprint alike"
+
+
+def test_unchanged_pages_are_not_parsed(site, tmp_path):
+    policy = RevisitPolicy(min_interval=0)
+    crawl(tmp_path, policy)
+    crawler = crawl(tmp_path, policy)
+    assert crawler.telemetry.counter('recrawl_total', result='unchanged') == 2, "both pages should be unchanged"
+    assert crawler.telemetry.histogram('parse_seconds').count == 0, "unchanged pages should not be parsed"
+    assert requested(site, '/page') == 2, "stored links should still be followed"
+
+
+def test_pages_not_due_are_skipped(site, tmp_path):
+    crawl(tmp_path, RevisitPolicy())
+    pages = requested(site, '/') + requested(site, '/page')
+    images = requested(site, '.png')
+    crawler = crawl(tmp_path, RevisitPolicy())
+    assert requested(site, '/') + requested(site, '/page') == pages, "pages not due should not be fetched"
+    assert requested(site, '.png') == images, "indexed images of skipped pages should not be revalidated"
+    assert crawler.telemetry.counter('recrawl_total', result='skipped') == 2, "skipped pages should be counted"
+
+
+def test_changed_pages_are_parsed(site, tmp_path):
+    policy = RevisitPolicy(min_interval=0)
+    crawl(tmp_path, policy)
+    site.get(SITE + 'page', text='<html><img src="/new.png"></html>', headers={'Content-Type': 'text/html'})
+    crawler = crawl(tmp_path, policy)
+    assert crawler.telemetry.counter('recrawl_total', result='changed') == 1, "the changed page should be counted"
+    assert requested(site, '/new.png') == 1, "images of the changed page should be downloaded"
+    assert crawler.index.get_page(SITE + 'page')['changes'] == 1, "the change should be recorded"
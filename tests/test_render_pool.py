@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from crawler.async_html_crawler import AsyncHtmlCrawler
+from crawler.html_crawler import HtmlCrawler
+from crawler.render_pool import RenderPool
+from logger.logger import get_logger
+
+RENDER_TIME = 0.05
+
+
+class FakeDriver:
+    """ Stand-in for a selenium webdriver.
+    """
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.page_source = None
+        self.timeout = None
+        self.quit_called = False
+        self.pages = 0
+
+    def set_page_load_timeout(self, timeout):
+        self.timeout = timeout
+
+    def get(self, url):
+        with FakeDriver.lock:
+            FakeDriver.active += 1
+            FakeDriver.peak = max(FakeDriver.peak, FakeDriver.active)
+        time.sleep(RENDER_TIME)
+        with FakeDriver.lock:
+            FakeDriver.active -= 1
+        if url == self.fail_on:
+            raise RuntimeError("page crashed")
+        self.pages += 1
+        self.page_source = f'<html><h1>{url}</h1><img src="/a.png"></html>'
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def drivers():
+    FakeDriver.active = FakeDriver.peak = 0
+    return []
+
+
+def factory(drivers, fail_on=None):
+    def create():
+        driver = FakeDriver(fail_on)
+        drivers.append(driver)
+        return driver
+    return create
+
+
+def test_bounded_concurrency(drivers):
+    pool = RenderPool(get_logger(), size=2, driver_factory=factory(drivers), page_load_timeout=7)
+    with ThreadPoolExecutor(8) as executor:
+        pages = list(executor.map(pool.render, [f'https://x/{page}' for page in range(8)]))
+    assert pages[3] == '<html><h1>https://x/3</h1><img src="/a.png"></html>', "rendered source should be returned"
+    assert FakeDriver.peak <= 2, "no more than size browsers should render at once"
+    assert len(drivers) <= 2, "browsers should be reused across pages"
+    assert all(driver.timeout == 7 for driver in drivers), "page load timeout should be set"
+
+
+def test_recycle_after_max_pages(drivers):
+    pool = RenderPool(get_logger(), size=1, driver_factory=factory(drivers), max_pages=3)
+    for page in range(7):
+        pool.render(f'https://x/{page}')
+    assert [driver.pages for driver in drivers] == [3, 3, 1], "browsers should be recycled every 3 pages"
+    assert [driver.quit_called for driver in drivers] == [True, True, False], "recycled browsers should quit"
+    assert pool.recycled == 2, "recycled browsers should be counted"
+
+
+def test_recycle_on_error(drivers):
+    pool = RenderPool(get_logger(), size=1, driver_factory=factory(drivers, fail_on='https://x/bad'))
+    with pytest.raises(RuntimeError):
+        pool.render('https://x/bad')
+    assert drivers[0].quit_called, "a failed browser should be quit"
+    pool.render('https://x/good')
+    assert len(drivers) == 2, "a fresh browser should replace the failed one"
+
+
+def test_shutdown(drivers):
+    pool = RenderPool(get_logger(), size=2, driver_factory=factory(drivers))
+    pool.render('https://x/1')
+    pool.shutdown()
+    assert all(driver.quit_called for driver in drivers), "shutdown should quit every browser"
+    with pytest.raises(RuntimeError):
+        pool.render('https://x/2')
+
+
+def test_crawler_renders_with_pool(drivers, tmp_path):
+    crawler = HtmlCrawler(get_logger(), render=True, think_time=0, output=str(tmp_path),
+                          driver_factory=factory(drivers))
+    assert crawler._crawl('https://x') == {'https://x/a.png'}, "rendered page should be parsed"
+    assert crawler.init_selenium().started == 1, "the pool should be created lazily"
+    crawler.shutdown_selenium()
+    assert drivers[0].quit_called, "shutdown should quit the browsers"
+
+
+def test_async_crawler_renders_in_parallel(drivers, tmp_path):
+    pages = [f'https://x/{page}' for page in range(8)]
+    crawler = AsyncHtmlCrawler(get_logger(), render=True, think_time=0, output=str(tmp_path), max_depth=0,
+                               render_pool_size=4, driver_factory=factory(drivers))
+
+    async def render_all():
+        crawler._render_executor = ThreadPoolExecutor(crawler.render_pool_size)
+        try:
+            return await asyncio.gather(*[crawler.fetch_content(None, page) for page in pages])
+        finally:
+            crawler._render_executor.shutdown()
+            crawler.shutdown_selenium()
+
+    start = time.monotonic()
+    contents = asyncio.run(render_all())
+    elapsed = time.monotonic() - start
+    assert len(contents) == len(pages), "every page should be rendered"
+    assert FakeDriver.peak == 4, "pages should render in parallel up to the pool size"
+    assert elapsed < len(pages) * RENDER_TIME * 0.75, "parallel rendering should beat serial rendering"
+    assert len(drivers) == 4 and all(driver.quit_called for driver in drivers), "browsers should be shut down"
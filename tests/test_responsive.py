@@ -0,0 +1,61 @@
+import re
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.parsers import ImageTag, PageLinks
+from crawler.responsive import Candidate, ImagePolicy, candidates, parse_srcset
+from logger.logger import get_logger
+
+SITE = 'https://example.com/'
+PORTRAIT = ImageTag('p.jpg', 'p-400.jpg 400w, p-800.jpg 800w, p-1600.jpg 1600w')
+
+
+def test_parse_srcset():
+    assert parse_srcset('a.jpg 400w,b.jpg 2x, c.jpg, data:image/gif;base64,R0,lG 1x') == [
+        Candidate('a.jpg', 400, 1.0), Candidate('b.jpg', None, 2.0), Candidate('c.jpg', None, 1.0),
+        Candidate('data:image/gif;base64,R0,lG', None, 1.0)], "candidates and descriptors should be parsed"
+    assert parse_srcset('a.jpg bogus') == [Candidate('a.jpg', None, 1.0)], "unknown descriptors are ignored"
+
+
+def test_candidates():
+    assert [variant.url for variant in candidates(ImageTag('a.jpg', 'a2.jpg 2x'))] == ['a2.jpg', 'a.jpg'], \
+        "the src should be the 1x variant"
+    assert [variant.url for variant in candidates(PORTRAIT)] == ['p-400.jpg', 'p-800.jpg', 'p-1600.jpg'], \
+        "the src should be a fallback next to width descriptors"
+
+
+@pytest.mark.parametrize('policy, chosen', [
+    (ImagePolicy('largest'), ['p-1600.jpg']),
+    (ImagePolicy('smallest'), ['p-400.jpg']),
+    (ImagePolicy('closest', target_width=700), ['p-800.jpg']),
+    (ImagePolicy('closest', target_width=1200), ['p-1600.jpg']),
+])
+def test_select(policy, chosen):
+    assert policy.select(candidates(PORTRAIT))[0] == chosen, f"{policy.policy} should pick {chosen}"
+
+
+def test_select_all():
+    (chosen, skipped) = ImagePolicy('all').select(candidates(PORTRAIT))
+    assert len(chosen) == 3 and not skipped, "every variant should be downloaded"
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        ImagePolicy('biggest')
+    with pytest.raises(ValueError):
+        ImagePolicy('closest')
+
+
+def test_crawler_selection(requests_mock: Mocker, tmp_path):
+    requests_mock.head(re.compile(r'.*\.jpg$'), headers={'Content-Length': '1000'})
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), ignore=['data:image'],
+                          image_policy=ImagePolicy('largest', probe=True))
+    links = PageLinks([PORTRAIT, ImageTag('data:image/gif;base64,R0lG', 'lazy.jpg'), PORTRAIT], [])
+    assert list(crawler.find_img_tags(links, SITE)) == [SITE + 'p-1600.jpg', SITE + 'lazy.jpg', SITE + 'p-1600.jpg'], \
+        "only the selected variants should be downloaded"
+    assert crawler.telemetry.counter('image_variants_skipped_total') == 2, "skipped variants should be counted once"
+    assert crawler.telemetry.counter('image_bytes_saved_total') == 2000, "the bytes saved should be probed"
+    assert list(HtmlCrawler(get_logger(), think_time=0).find_img_tags(links, SITE))[0] == SITE + 'p.jpg', \
+        "without a policy only the src is downloaded"
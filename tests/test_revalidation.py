@@ -0,0 +1,150 @@
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+from requests_mock.mocker import Mocker
+
+from crawler.async_html_crawler import AsyncHtmlCrawler
+from crawler.html_crawler import HtmlCrawler
+from logger.logger import get_logger
+
+IMAGE = 'https://www.fbi.gov/wanted/topten/alexis-flores/@@images/image/preview'
+PAGE = 'https://www.fbi.gov/wanted/topten'
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 20 Apr 2020 12:00:00 GMT'
+
+
+def conditional(body: bytes, content_type: str, validators: dict):
+    """ requests_mock callback answering 304 when a validator matches.
+    """
+    def callback(request, context):
+        context.headers = {'Content-Type': content_type, **validators}
+        sent = {'ETag': request.headers.get('If-None-Match'), 'Last-Modified': request.headers.get('If-Modified-Since')}
+        if any(sent[name] == value for (name, value) in validators.items()):
+            context.status_code = 304
+            return b''
+        return body
+    return callback
+
+
+@pytest.fixture
+def crawler(tmp_path):
+    return HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+
+
+def test_etag_revalidation(crawler: HtmlCrawler, requests_mock: Mocker):
+    requests_mock.get(IMAGE, content=conditional(b'jpeg', 'image/jpeg', {'ETag': ETAG}))
+    first = crawler.download_file(IMAGE)
+    assert 'If-None-Match' not in requests_mock.last_request.headers, "first download is unconditional"
+    assert crawler.download_file(IMAGE) == first, "304 should be a cache hit"
+    assert requests_mock.last_request.headers['If-None-Match'] == ETAG, "stored ETag should be sent"
+    assert requests_mock.call_count == 2, "each download should cost a single round trip"
+    assert crawler.revalidation == {'requests': 2, 'round_trips_saved': 2, 'conditional': 1,
+                                    'not_modified': 1, 'bytes_saved': 4}, "savings should be reported"
+
+
+def test_last_modified_revalidation(crawler: HtmlCrawler, requests_mock: Mocker):
+    requests_mock.get(IMAGE, content=conditional(b'jpeg', 'image/jpeg', {'Last-Modified': LAST_MODIFIED}))
+    first = crawler.download_file(IMAGE)
+    assert crawler.download_file(IMAGE) == first, "304 should be a cache hit"
+    assert requests_mock.last_request.headers['If-Modified-Since'] == LAST_MODIFIED, "Last-Modified should be sent"
+    assert crawler.revalidation['not_modified'] == 1, "304 should be counted"
+
+
+def test_missing_blob_is_refetched(crawler: HtmlCrawler, requests_mock: Mocker):
+    requests_mock.get(IMAGE, content=conditional(b'jpeg', 'image/jpeg', {'ETag': ETAG}))
+    first = crawler.download_file(IMAGE)
+    os.remove(first)
+    assert crawler.download_file(IMAGE) == first, "missing blob should be downloaded again"
+    assert 'If-None-Match' not in requests_mock.last_request.headers, "validators need the blob on disk"
+
+
+def test_page_revalidation(crawler: HtmlCrawler, requests_mock: Mocker):
+    html = b'<html><img src="/a.png"></html>'
+    requests_mock.get(PAGE, content=conditional(html, 'text/html; charset=utf-8', {'ETag': ETAG}))
+    assert crawler.get_content(PAGE) == html, "page should be fetched"
+    crawler.caches['get_content'].clear()
+    assert crawler.get_content(PAGE) == html, "304 page should be served from the store"
+    assert requests_mock.call_count == 2, "each page should cost a single round trip"
+    assert crawler.revalidation['not_modified'] == 1, "304 should be counted"
+
+
+def test_changed_page_of_same_length_is_read(crawler: HtmlCrawler, requests_mock: Mocker):
+    headers = {'Content-Type': 'text/html', 'Content-Length': '31'}
+    requests_mock.get(PAGE, [{'content': b'<html><img src="/a.png"></html>', 'headers': headers},
+                             {'content': b'<html><img src="/b.png"></html>', 'headers': headers}])
+    crawler.get_content(PAGE)
+    crawler.caches['get_content'].clear()
+    assert crawler.get_content(PAGE) == b'<html><img src="/b.png"></html>', \
+        "a page with the same type and length may have changed and should be read again"
+
+
+def test_new_etag_of_same_size_is_downloaded(crawler: HtmlCrawler, requests_mock: Mocker):
+    headers = {'Content-Type': 'image/jpeg', 'Content-Length': '4'}
+    requests_mock.get(IMAGE, [{'content': b'jpeg', 'headers': {**headers, 'ETag': ETAG}},
+                              {'content': b'JPEG', 'headers': {**headers, 'ETag': '"v2"'}}])
+    crawler.download_file(IMAGE)
+    with open(crawler.download_file(IMAGE), 'rb') as blob:
+        assert blob.read() == b'JPEG', "a 200 with a new ETag should be downloaded even if its size did not change"
+    assert requests_mock.last_request.headers['If-None-Match'] == ETAG, "the stored ETag should have been sent"
+
+
+def test_non_html_page_is_ignored(crawler: HtmlCrawler, requests_mock: Mocker):
+    requests_mock.get(PAGE, content=b'%PDF', headers={'Content-Type': 'application/pdf'})
+    assert crawler.get_content(PAGE) is None, "non html responses should be ignored"
+
+
+def test_async_revalidation(tmp_path):
+    async def image(request):
+        if request.headers.get('If-None-Match') == ETAG:
+            return web.Response(status=304)
+        return web.Response(body=b'png', content_type='image/png', headers={'ETag': ETAG})
+
+    async def run(crawler: AsyncHtmlCrawler):
+        app = web.Application()
+        app.router.add_get('/', lambda request: web.Response(text='<img src="/a.png">', content_type='text/html'))
+        app.router.add_get('/a.png', image)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        try:
+            url = f'http://127.0.0.1:{runner.addresses[0][1]}/'
+            return [await crawler.crawl([url]), await crawler.crawl([url])]
+        finally:
+            await runner.cleanup()
+
+    crawler = AsyncHtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    results = asyncio.run(run(crawler))
+    assert results == [(1, []), (1, [])], "both crawls should return the image"
+    assert crawler.revalidation['not_modified'] == 1, "second image fetch should be a 304"
+
+
+def test_async_new_etag_of_same_size_is_downloaded(tmp_path):
+    versions = [(b'png', ETAG), (b'PNG', '"v2"')]
+
+    async def image(request):
+        (body, etag) = versions.pop(0)
+        return web.Response(body=body, content_type='image/png', headers={'ETag': etag})
+
+    async def run(crawler: AsyncHtmlCrawler):
+        app = web.Application()
+        app.router.add_get('/', lambda request: web.Response(text='<img src="/a.png">', content_type='text/html'))
+        app.router.add_get('/a.png', image)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        try:
+            url = f'http://127.0.0.1:{runner.addresses[0][1]}/'
+            await crawler.crawl([url])
+            await crawler.crawl([url])
+            return crawler.index.get(url + 'a.png')
+        finally:
+            await runner.cleanup()
+
+    crawler = AsyncHtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    metadata = asyncio.run(run(crawler))
+    with open(metadata['blob'], 'rb') as blob:
+        assert blob.read() == b'PNG', "a 200 with a new ETag should be downloaded even if its size did not change"
@@ -0,0 +1,46 @@
+import pytest
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.rules import RuleSet, words_regex
+from logger.logger import get_logger
+
+
+@pytest.fixture
+def rules():
+    return RuleSet(['images/logo', 'data:image/svg+xml', 'prefix:https://cdn.', 'suffix:.pdf', 'glob:*/thumbs/*.jpg',
+                    're:[?&]page=\\d+$'])
+
+
+@pytest.mark.parametrize('url, matched', [
+    ('https://x/images/logo.png', True),
+    ('data:image/svg+xml;base64,AAA', True),
+    ('https://cdn.example.com/a.png', True),
+    ('https://example.com/?u=https://cdn.x', False),
+    ('https://x/report.pdf', True),
+    ('https://x/report.pdf?download=1', False),
+    ('https://x/thumbs/a.jpg', True),
+    ('https://x/thumbs/a.png', False),
+    ('https://x/list?page=2', True),
+    ('https://x/other.png', False),
+])
+def test_rule_kinds(rules, url, matched):
+    assert rules.matches(url) == matched, f"{url} should {'' if matched else 'not '}match"
+
+
+def test_words_regex():
+    assert words_regex(['abc', 'ab', 'abd']) == 'ab', "longer words are redundant for substring matches"
+    assert words_regex(['.png', '.p'], at_end=True) == '\\.p(?:ng\\Z|\\Z)', "suffixes must end the text"
+
+
+def test_empty_rules():
+    assert not RuleSet([]) and not RuleSet().matches('anything'), "empty rule sets should match nothing"
+
+
+def test_crawler_rules():
+    crawler = HtmlCrawler(get_logger(), think_time=0, ignore=['glob:*.svg'], follow_href_patterns=['prefix:/wanted'])
+    assert crawler.ignore_img('/icons/a.svg') and not crawler.ignore_img('/a.png'), "image rules should apply"
+    assert crawler.follow_href('/wanted/x') and not crawler.follow_href('/about'), "follow rules should apply"
+    assert not crawler.follow_href('mailto:/wanted'), "mailto links are never followed"
+    assert crawler.ignore_href('JavaScript:void(0)') and crawler.ignore_href('/a.pdf'), \
+        "default href rules should ignore scripts and documents"
+    assert not crawler.ignore_href('/a.pdf.html'), "suffix rules should be anchored"
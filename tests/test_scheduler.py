@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+import pytest
+from requests import Response
+from requests_mock.mocker import Mocker
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.scheduler import HostScheduler, host_key, parse_retry_after
+from logger.logger import get_logger
+
+FBI = 'https://www.fbi.gov/wanted/topten'
+INTERPOL = 'https://www.interpol.int/en/How-we-work/Notices/View-Red-Notices'
+
+
+@pytest.fixture
+def scheduler():
+    return HostScheduler(delay=0.1)
+
+
+def test_host_key():
+    assert host_key('https://WWW.FBI.gov/wanted') == 'www.fbi.gov', "host key should be case insensitive"
+    assert host_key('http://127.0.0.1:8080/a') == '127.0.0.1:8080', "host key should include the port"
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0, "delta-seconds should be parsed"
+    assert 55 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60, "HTTP-date should be parsed"
+    assert parse_retry_after(None) is None, "missing header should return None"
+    assert parse_retry_after('soon') is None, "garbage should return None"
+
+
+def test_reserve(scheduler):
+    assert scheduler.reserve(FBI) == 0, "first request to a host should not wait"
+    assert scheduler.reserve(FBI) == pytest.approx(0.1, abs=0.01), "second request should wait for the host delay"
+    assert scheduler.reserve(INTERPOL) == 0, "other hosts should not wait for a cooling host"
+
+
+def test_jitter_keeps_slots_in_order():
+    scheduler = HostScheduler(delay=1.0, jitter=1.0)
+    slots = []
+    for _ in range(50):
+        scheduler.reserve(FBI)
+        slots.append(scheduler._state(FBI).next_slot)
+    assert slots == sorted(slots), "jittered slots of a host should never go back in time"
+    with pytest.raises(ValueError):
+        HostScheduler(delay=5.0, jitter=2.0)
+    with pytest.raises(ValueError):
+        HostScheduler(jitter=-0.1)
+
+
+def test_backoff_and_recover(scheduler):
+    scheduler.backoff(FBI, retry_after=2)
+    assert scheduler.host_delay(FBI) == 2, "Retry-After should widen the host delay"
+    assert scheduler.reserve(FBI) == pytest.approx(2, abs=0.01), "next request should honor Retry-After"
+    assert scheduler.reserve(INTERPOL) == 0, "other hosts should be unaffected"
+    scheduler.recover(FBI)
+    assert scheduler.host_delay(FBI) == 1, "delay should decay after a success"
+    for _ in range(10):
+        scheduler.recover(FBI)
+    assert scheduler.host_delay(FBI) == 0.1, "delay should decay back to the base delay"
+
+
+def test_hosts_run_in_parallel_threads(scheduler):
+    def crawl(url):
+        for _ in range(5):
+            scheduler.wait(url)
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(2) as executor:
+        list(executor.map(crawl, [FBI, INTERPOL]))
+    elapsed = time.monotonic() - started_at
+    assert elapsed < 0.7, "wall time should approach the slowest host, not the sum of both hosts"
+
+
+def test_hosts_run_in_parallel_tasks(scheduler):
+    async def crawl(url):
+        for _ in range(5):
+            await scheduler.wait_async(url)
+
+    async def main():
+        await asyncio.gather(crawl(FBI), crawl(INTERPOL))
+
+    started_at = time.monotonic()
+    asyncio.run(main())
+    elapsed = time.monotonic() - started_at
+    assert elapsed < 0.7, "wall time should approach the slowest host, not the sum of both hosts"
+
+
+def test_rate_limit_feedback(requests_mock: Mocker, tmp_path):
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    requests_mock.get(FBI, [{'status_code': 429, 'headers': {'Retry-After': '0'}},
+                            {'status_code': 200, 'text': '<html></html>', 'headers': {'Content-Type': 'text/html'}}])
+    assert crawler.get_content(FBI) == b'<html></html>', "request should be retried after a 429"
+    assert requests_mock.call_count == 2, "429 should cost exactly one extra request"
+    assert crawler.scheduler.host_delay(FBI) > 0, "host should stay slowed down after a 429"
+
+
+def test_rate_limited_responses_are_closed(requests_mock: Mocker, tmp_path, monkeypatch):
+    closed = []
+    close = Response.close
+    monkeypatch.setattr(Response, 'close', lambda res: closed.append(res.status_code) or close(res))
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    requests_mock.get(FBI, [{'status_code': 429, 'headers': {'Retry-After': '0'}},
+                            {'status_code': 200, 'text': '<html></html>', 'headers': {'Content-Type': 'text/html'}}])
+    assert crawler.get_content(FBI) == b'<html></html>', "request should be retried after a 429"
+    assert closed[0] == 429, "the 429 response should be closed before the retry to free its connection"
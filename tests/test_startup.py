@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+
+# imported on first use only: rendering, perceptual hashes, bs4 parsing and async crawls
+LAZY_MODULES = ['selenium', 'numpy', 'bs4', 'asyncio', 'aiohttp']
+
+PROBE = '''
+import json, sys
+loaded = lambda: [name for name in %r if name in sys.modules]
+from crawler.config import CrawlerConfig
+from logger.logger import get_logger
+imported = loaded()
+config = CrawlerConfig(get_logger(), think_time=0)
+built_before = len(config._crawlers)
+crawler = config.crawler(config.workload[0])
+print(json.dumps({'imported': imported, 'started': loaded(), 'built_before': built_before}))
+'''
+
+
+def probe() -> dict:
+    output = subprocess.run([sys.executable, '-c', PROBE % LAZY_MODULES], check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def test_heavy_modules_are_imported_lazily():
+    startup = probe()
+    assert startup['imported'] == [], "importing the crawler should not import heavy optional modules"
+    assert startup['started'] == [], "building a crawler should not import heavy optional modules"
+    assert startup['built_before'] == 0, "no crawler should be built before its unit is crawled"
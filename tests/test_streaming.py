@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler.blob_store import AssetTooLarge
+from crawler.budget import ByteBudget
+from crawler.html_crawler import HtmlCrawler
+from logger.logger import get_logger
+
+BODY_SIZE = 32 * 1024 * 1024
+CHUNK = bytes(range(256)) * 256  # 64 KiB
+
+
+class LargeFileHandler(BaseHTTPRequestHandler):
+    """ Serves BODY_SIZE bytes of image data; /chunked omits Content-Length.
+    """
+
+    def _headers(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        if self.path != '/chunked':
+            self.send_header('Content-Length', str(BODY_SIZE))
+        self.end_headers()
+
+    def do_HEAD(self):  # pylint: disable=C0103
+        self._headers()
+
+    def do_GET(self):  # pylint: disable=C0103
+        self._headers()
+        for _ in range(BODY_SIZE // len(CHUNK)):
+            self.wfile.write(CHUNK)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), LargeFileHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_streams_with_bounded_memory(server, tmp_path):
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path))
+    tracemalloc.start()
+    try:
+        destination = crawler.download_file(f'{server}/large.png')
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert os.path.getsize(destination) == BODY_SIZE, "whole body should be stored"
+    assert peak < 4 * 1024 * 1024, "peak memory should not grow with the body size"
+    assert not list(tmp_path.glob('.blob-*')), "temp file should be renamed into place"
+
+
+def test_size_cap(server, tmp_path):
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), max_asset_bytes=1024 * 1024)
+    with pytest.raises(AssetTooLarge):
+        crawler.download_file(f'{server}/large.png')  # refused from the advertised Content-Length
+    with pytest.raises(AssetTooLarge):
+        crawler.download_file(f'{server}/chunked')  # aborted while streaming
+    assert not list(tmp_path.glob('**/*.png')), "oversized assets should not be stored"
+    assert not list(tmp_path.glob('.blob-*')), "partial temp files should be removed"
+
+
+def test_byte_budget():
+    budget = ByteBudget(100)
+    budget.acquire(60)
+    assert not budget.try_acquire(60), "reservation over budget should not be admitted"
+    released_at = []
+
+    def worker():
+        with budget.reserve(60):
+            released_at.append(time.monotonic())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(0.05)
+    assert not released_at, "worker should wait for the budget"
+    budget.release(60)
+    thread.join(1)
+    assert released_at, "worker should run once the budget is released"
+    assert budget.in_flight == 0, "all bytes should be returned"
+    assert budget.peak == 60, "peak in-flight bytes should be tracked"
+    with budget.reserve(1000):
+        assert budget.in_flight == 1000, "oversized reservation is admitted when idle"
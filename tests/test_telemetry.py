@@ -0,0 +1,103 @@
+import pickle
+import re
+import urllib.request
+
+import pytest
+from requests_mock.mocker import Mocker
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.telemetry import Histogram, Telemetry
+from logger.logger import get_logger
+
+SITE = 'https://example.com/'
+PAGE = '<html><img src="/a.png"></html>'
+
+
+@pytest.fixture
+def telemetry():
+    return Telemetry(buckets=(0.1, 1.0))
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1], "values should fall into their buckets"
+    assert histogram.quantile(0.5) == 0.1, "median should be the upper bound of its bucket"
+    assert histogram.quantile(0.99) == 2.0, "values beyond the last bucket report the maximum"
+    assert histogram.summary()['mean'] == 0.65, "mean should be reported"
+
+
+def test_counters_and_histograms(telemetry):
+    telemetry.count('pages_total', host='a')
+    telemetry.count('pages_total', 2, host='b')
+    telemetry.observe('request_seconds', 0.05, method='GET', host='a')
+    with telemetry.timer('parse_seconds'):
+        pass
+    assert telemetry.counter('pages_total', host='b') == 2, "counters should be labelled"
+    assert telemetry.counter('pages_total') == 3, "unlabelled lookups should sum every label"
+    assert telemetry.histogram('request_seconds').count == 1, "observations should be recorded"
+    assert telemetry.histogram('parse_seconds').count == 1, "timers should observe the block"
+
+
+def test_report(telemetry):
+    telemetry.count('pages_total', 4, host='a')
+    telemetry.count('images_total', 8, host='a')
+    telemetry.count('cache_total', 3, result='hit')
+    telemetry.count('cache_total', 1, result='miss')
+    report = telemetry.report()
+    assert report['hosts']['a']['pages'] == 4 and report['hosts']['a']['images_per_s'] > 0, \
+        "per host throughput should be reported"
+    assert report['cache_hit_ratio'] == 0.75, "cache hit ratio should be reported"
+    assert report['counters']['pages_total'] == {'{host="a"}': 4}, "counters should be reported by label"
+
+
+def test_prometheus(telemetry, tmp_path):
+    telemetry.count('pages_total', host='a"b')
+    telemetry.observe('request_seconds', 0.5, method='GET', host='a')
+    text = telemetry.prometheus()
+    assert '# TYPE crawler_pages_total counter\ncrawler_pages_total{host="a\\"b"} 1\n' in text, \
+        "counters should be exported with escaped labels"
+    assert 'crawler_request_seconds_bucket{host="a",method="GET",le="0.1"} 0\n' in text, "buckets are cumulative"
+    assert 'crawler_request_seconds_bucket{host="a",method="GET",le="+Inf"} 1\n' in text, "+Inf counts everything"
+    assert 'crawler_request_seconds_count{host="a",method="GET"} 1\n' in text, "histogram count should be exported"
+    telemetry.write_prometheus(str(tmp_path / 'crawler.prom'))
+    assert (tmp_path / 'crawler.prom').read_text() == text, "the metrics file should be written"
+    server = telemetry.serve(0)
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics') as res:
+            assert res.read().decode('utf-8') == text, "the metrics should be served over HTTP"
+    finally:
+        server.shutdown()
+
+
+def test_merge(telemetry):
+    worker = Telemetry(buckets=(0.1, 1.0))
+    worker.count('pages_total', host='a')
+    worker.observe('parse_seconds', 0.5)
+    telemetry.count('pages_total', host='a')
+    telemetry.merge(pickle.loads(pickle.dumps(worker.export())))
+    assert telemetry.counter('pages_total', host='a') == 2, "counters should be added up"
+    assert telemetry.histogram('parse_seconds').counts == [0, 1, 0], "histograms should be added up"
+
+
+def test_crawler_instrumentation(requests_mock: Mocker, tmp_path):
+    def image(request, context):
+        context.headers = {'Content-Type': 'image/png', 'ETag': '"1"'}
+        context.status_code = 304 if request.headers.get('If-None-Match') == '"1"' else 200
+        return b'png' if context.status_code == 200 else b''
+    requests_mock.get(SITE, text=PAGE, headers={'Content-Type': 'text/html'})
+    requests_mock.get(re.compile(r'.*\.png$'), content=image)
+    telemetry = Telemetry()
+    crawler = HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), telemetry=telemetry)
+    crawler.crawl([SITE])
+    crawler.download_file(SITE + 'a.png')
+    assert telemetry.counter('pages_total', host='example.com') == 1, "pages should be counted per host"
+    assert telemetry.counter('images_total', host='example.com') == 2, "images should be counted per host"
+    assert telemetry.histogram('request_seconds', method='GET', host='example.com').count == 3, \
+        "request latency should be recorded"
+    assert telemetry.histogram('think_seconds').count == 3, "think time should be recorded"
+    assert telemetry.histogram('parse_seconds').count == 1, "parse time should be recorded"
+    assert telemetry.counter('downloaded_bytes_total', host='example.com') == len(PAGE) + 3, \
+        "downloaded bytes should be counted"
+    assert telemetry.report()['cache_hit_ratio'] == 0.333, "the revalidated image is a cache hit"
@@ -0,0 +1,106 @@
+import pickle
+import shutil
+import ssl
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.transport import Transport
+from logger.logger import get_logger
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):  # pylint: disable=C0103
+        body = b'<html><img src="/a.png"></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+class TlsServer(ThreadingHTTPServer):
+    daemon_threads = True
+    handshakes = 0
+
+    def get_request(self):
+        (sock, address) = super().get_request()  # the TLS handshake happens on accept
+        self.handshakes += 1
+        return (sock, address)
+
+
+@pytest.fixture
+def tls_server(tmp_path, monkeypatch):
+    if not shutil.which('openssl'):
+        pytest.skip("openssl is needed to create a certificate")
+    (cert, key) = (str(tmp_path / 'cert.pem'), str(tmp_path / 'key.pem'))
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+                    '-days', '1', '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1'],
+                   check=True, capture_output=True)
+    for name in ('REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE'):  # requests prefers these over Session.verify
+        monkeypatch.setenv(name, cert)
+    server = TlsServer(('127.0.0.1', 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f'https://127.0.0.1:{server.server_address[1]}/'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch_pages(crawlers, url: str, pages: int):
+    for crawler in crawlers:
+        for num in range(pages):
+            crawler.get_content(f'{url}page{num}')
+
+
+def test_shared_transport_reuses_connections(tls_server, tmp_path):
+    unshared = [HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), transport=Transport(http_retries=0))
+                for _ in range(3)]
+    fetch_pages(unshared, tls_server.url, 5)
+    assert tls_server.handshakes == 3, "every transport should open its own connection"
+
+    transport = Transport(http_retries=0)
+    shared = [HtmlCrawler(get_logger(), think_time=0, output=str(tmp_path), transport=transport) for _ in range(3)]
+    fetch_pages(shared, tls_server.url, 5)
+    assert tls_server.handshakes == 4, "crawlers sharing a transport should reuse its connection"
+    stats = transport.stats()
+    assert (stats['requests'], stats['connections'], stats['reused']) == (15, 1, 14), \
+        "connection reuse should be reported"
+    assert stats['hosts'][tls_server.url.rstrip('/')]['requests'] == 15, "stats should be reported per host"
+
+
+def test_host_pool_sizes():
+    transport = Transport(host_pool_sizes={'cdn.example.com': 32})
+    adapter = transport.session.get_adapter('https://cdn.example.com/a.png')
+    assert adapter._pool_maxsize == 32, "busy hosts should get their own pool size"  # pylint: disable=W0212
+    assert transport.session.get_adapter('https://example.com/')._pool_maxsize == 10, \
+        "other hosts should use the default pool size"  # pylint: disable=W0212
+
+
+def test_shared():
+    transport = Transport.shared(http_retries=1)
+    assert Transport.shared(http_retries=1, retry_backoff=5) is transport, "equal options share a transport"
+    assert Transport.shared(http_retries=2) is not transport, "other options get their own transport"
+    assert pickle.loads(pickle.dumps(transport)) is transport, "unpickling should use the process's transport"
+    assert HtmlCrawler(get_logger(), http_retries=1).transport is HtmlCrawler(get_logger(), http_retries=2).transport \
+        is Transport.shared(http_retries=0), "crawlers should share a transport without inline retries"
+
+
+def test_http2_needs_httpx():
+    try:
+        import httpx  # noqa: F401 pylint: disable=C0415,W0611
+        pytest.skip("httpx is installed")
+    except ImportError:
+        with pytest.raises(ValueError):
+            Transport(http2=True)
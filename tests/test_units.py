@@ -0,0 +1,151 @@
+import json
+import os
+
+import pytest
+
+from crawler.async_html_crawler import AsyncHtmlCrawler
+from crawler.budget import ByteBudget
+from crawler.config import CrawlerConfig
+from crawler.health import HealthTracker
+from crawler.html_crawler import HtmlCrawler
+from crawler.responsive import ImagePolicy
+from crawler.scheduler import HostScheduler
+from crawler.units import ConfigError, load_units
+from logger.logger import get_logger
+
+LOGGER = get_logger()
+
+TOML = '''
+[defaults]
+think_time = 0
+max_depth = 2
+
+[[units]]
+name = "fbi"
+targets = ["https://www.fbi.gov/wanted/topten"]
+download_workers = 8
+request_timeout = 20
+max_inflight_bytes = 1048576
+rate_limit = { delay = 2.5, jitter = 1.0 }
+circuit_breaker = { window = 10, cooldown = 5 }
+image_policy = "largest"
+
+[[units]]
+name = "interpol"
+targets = ["https://www.interpol.int/en/How-we-work/Notices/View-Red-Notices"]
+max_depth = 1
+'''
+
+
+def write(tmp_path, name: str, text: str) -> str:
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_load_toml(tmp_path):
+    (fbi, interpol) = load_units(write(tmp_path, 'units.toml', TOML))
+    assert fbi['name'] == 'fbi', "units should keep their order"
+    assert fbi['targets'] == ['https://www.fbi.gov/wanted/topten'], "targets should be loaded"
+    options = fbi['options']
+    assert options['download_workers'] == 8, "plain options should be passed as they are"
+    assert options['max_depth'] == 2, "defaults should apply to every unit"
+    assert interpol['options']['max_depth'] == 1, "unit options should override defaults"
+    assert isinstance(options['byte_budget'], ByteBudget), "max_inflight_bytes should build a ByteBudget"
+    assert options['byte_budget'].max_bytes == 1048576, "the budget should have the configured size"
+    assert isinstance(options['scheduler'], HostScheduler), "rate_limit should build a HostScheduler"
+    assert options['scheduler'].delay == 2.5, "the scheduler should have the configured delay"
+    assert isinstance(options['health'], HealthTracker), "circuit_breaker should build a HealthTracker"
+    assert options['health'].cooldown == 5, "the tracker should have the configured cooldown"
+    assert isinstance(options['image_policy'], ImagePolicy), "image_policy should build an ImagePolicy"
+    assert isinstance(interpol['options']['scheduler'], HostScheduler), "think_time should give a unit its scheduler"
+    assert interpol['options']['scheduler'] is not options['scheduler'], "units should not share their schedulers"
+
+
+DATA = {'units': [{'name': 'fbi', 'targets': ['https://www.fbi.gov/'], 'fetch_workers': 3}]}
+
+
+def test_load_json(tmp_path):
+    units = load_units(write(tmp_path, 'units.json', json.dumps(DATA)))
+    assert units[0]['options'] == {'fetch_workers': 3}, "JSON units should be loaded"
+
+
+def test_load_yaml(tmp_path):
+    yaml = pytest.importorskip('yaml')  # optional: pip install pyyaml
+    units = load_units(write(tmp_path, 'units.yaml', yaml.safe_dump(DATA)))
+    assert units[0]['options'] == {'fetch_workers': 3}, "YAML units should be loaded"
+
+
+def test_example_file():
+    units = load_units(os.path.join(os.path.dirname(__file__), '..', 'units.example.toml'))
+    assert [unit['name'] for unit in units] == ['fbi', 'interpol'], "the shipped example should load"
+
+
+def test_async_options(tmp_path):
+    path = write(tmp_path, 'units.toml', '[[units]]\nname = "fbi"\ntargets = ["https://www.fbi.gov/"]\nconcurrency = 20\n')
+    assert load_units(path, AsyncHtmlCrawler)[0]['options'] == {'concurrency': 20}, \
+        "options of the crawler class should be accepted"
+    with pytest.raises(ConfigError):
+        load_units(path, HtmlCrawler)
+
+
+def test_every_problem_is_reported(tmp_path):
+    path = write(tmp_path, 'units.toml', '''
+[defaults]
+thnk_time = 5
+
+[[units]]
+name = "fbi"
+targets = "https://www.fbi.gov/"
+download_workers = 0
+render = "yes"
+scheduler = "none"
+rate_limit = { delay = 1, burst = 2 }
+circuit_breaker = { failure_ratio = 1.5 }
+
+[[units]]
+name = "fbi"
+targets = ["https://www.fbi.gov/"]
+''')
+    with pytest.raises(ConfigError) as info:
+        load_units(path)
+    problems = '\n'.join(info.value.problems)
+    assert info.value.path == path, "the error should name the file"
+    assert "unknown option thnk_time; did you mean think_time?" in problems, "typos should get a suggestion"
+    assert "targets must be a non-empty list of URLs" in problems, "bad targets should be reported"
+    assert "download_workers must be at least 1" in problems, "worker counts should be positive"
+    assert "render must be a boolean, not str" in problems, "wrong types should be reported"
+    assert "scheduler cannot be set in a units file; use rate_limit" in problems, "objects should point at their group"
+    assert "rate_limit: unknown option burst" in problems, "group settings should be checked"
+    assert "circuit_breaker: failure_ratio must be between 0 and 1" in problems, "fractions should be checked"
+    assert "duplicate unit names: ['fbi']" in problems, "duplicate names should be reported"
+
+
+def test_jitter(tmp_path):
+    path = write(tmp_path, 'units.toml', '[[units]]\nname = "a"\ntargets = ["https://x/"]\nrate_limit = { jitter = 2.0 }\n')
+    with pytest.raises(ConfigError, match='rate_limit: jitter must be between 0 and 1'):
+        load_units(path)
+
+
+def test_bad_files(tmp_path):
+    with pytest.raises(ConfigError, match='unsupported format'):
+        load_units(write(tmp_path, 'units.ini', ''))
+    with pytest.raises(ConfigError, match='cannot read'):
+        load_units(str(tmp_path / 'missing.toml'))
+    with pytest.raises(ConfigError, match='cannot parse'):
+        load_units(write(tmp_path, 'units.json', '{'))
+    with pytest.raises(ConfigError, match='non-empty list of units'):
+        load_units(write(tmp_path, 'units.json', '{"units": []}'))
+
+
+def test_config_with_units_file(tmp_path):
+    config = CrawlerConfig(LOGGER, think_time=0, units_path=write(tmp_path, 'units.toml', TOML))
+    assert [unit['name'] for unit in config.workload] == ['fbi', 'interpol'], "the file should replace the built-in units"
+    fbi = config.crawler(config.workload[0])
+    interpol = config.crawler(config.workload[1])
+    assert fbi.download_workers == 8, "unit options should reach the crawler"
+    assert fbi.request_timeout == 20, "the request timeout should reach the crawler"
+    assert fbi.max_depth == 2, "defaults should reach the crawler"
+    assert fbi.scheduler is not config.scheduler, "rate_limit should replace the shared scheduler"
+    assert interpol.health is config.health, "units without circuit_breaker should share the health tracker"
+    assert interpol.request_timeout == 30.0, "units should keep the default request timeout"
@@ -0,0 +1,300 @@
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from requests import ConnectionError as RequestsConnectionError
+
+from crawler.html_crawler import HtmlCrawler
+from crawler.queue_worker import QueueWorker
+from crawler.scheduler import HostScheduler
+from crawler.work_queue import (ADD_SCRIPT, CLAIM_SCRIPT, IMAGE, PAGE, RELEASE_SCRIPT, UNFINISHED_SCRIPT, RedisWorkQueue,
+                                SqliteWorkQueue, Task, queue_from_url)
+from logger.logger import get_logger
+
+PAGES = 12
+LATENCY = 0.03
+
+
+class FakeRedis:
+    """ In-memory stand-in for the redis-py commands and scripts the work queue uses.
+
+    Scripts run as their Python equivalents under the lock, atomic like in Redis.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sets = {}
+        self._lists = {}
+        self._zsets = {}
+        self._hashes = {}
+        self._scripts = {ADD_SCRIPT: self._add, CLAIM_SCRIPT: self._claim, RELEASE_SCRIPT: self._release,
+                         UNFINISHED_SCRIPT: self._unfinished}
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+    def register_script(self, script: str):
+        implementation = self._scripts[script]
+
+        def run(keys=(), args=()):
+            with self._lock:
+                return implementation(keys, args)
+        return run
+
+    def _add(self, keys, args) -> int:
+        if not self.sadd(keys[0], args[0]):
+            return 0
+        self.rpush(keys[1], args[1])
+        return 1
+
+    def _claim(self, keys, args):
+        for member in self.zrangebyscore(keys[1], '-inf', args[0]):
+            self.zrem(keys[1], member)
+            self.rpush(keys[0], member)
+        member = self.lpop(keys[0])
+        if member is not None:
+            self.zadd(keys[1], {member: args[1]})
+        return member
+
+    def _release(self, keys, args) -> int:
+        attempts = self._hashes.setdefault(keys[1], {}).get(self._bytes(args[0]), 0)
+        if attempts >= args[2]:
+            self.zrem(keys[0], args[0])
+            return 0
+        self._hashes[keys[1]][self._bytes(args[0])] = attempts + 1
+        self.zadd(keys[0], {args[0]: args[1] + args[3] * 2 ** attempts})
+        return 1
+
+    def _unfinished(self, keys, args) -> int:  # pylint: disable=W0613
+        return self.llen(keys[0]) + self.zcard(keys[1])
+
+    def sadd(self, name, value) -> int:
+        with self._lock:
+            members = self._sets.setdefault(name, set())
+            if self._bytes(value) in members:
+                return 0
+            members.add(self._bytes(value))
+            return 1
+
+    def rpush(self, name, value) -> int:
+        with self._lock:
+            self._lists.setdefault(name, []).append(self._bytes(value))
+            return len(self._lists[name])
+
+    def lpop(self, name):
+        with self._lock:
+            values = self._lists.get(name)
+            return values.pop(0) if values else None
+
+    def llen(self, name) -> int:
+        with self._lock:
+            return len(self._lists.get(name, []))
+
+    def zadd(self, name, mapping: dict) -> int:
+        with self._lock:
+            self._zsets.setdefault(name, {}).update({self._bytes(key): score for (key, score) in mapping.items()})
+            return len(mapping)
+
+    def zrem(self, name, value) -> int:
+        with self._lock:
+            return 1 if self._zsets.get(name, {}).pop(self._bytes(value), None) is not None else 0
+
+    def zrangebyscore(self, name, low, high) -> list:
+        low = float(low)
+        with self._lock:
+            return [key for (key, score) in self._zsets.get(name, {}).items() if low <= score <= float(high)]
+
+    def zcard(self, name) -> int:
+        with self._lock:
+            return len(self._zsets.get(name, {}))
+
+    def delete(self, *names) -> int:
+        with self._lock:
+            return sum(bool(store.pop(name, None)) for name in names
+                       for store in (self._sets, self._lists, self._zsets, self._hashes))
+
+
+class Handler(BaseHTTPRequestHandler):
+    fetched = Counter()
+
+    def do_GET(self):  # pylint: disable=C0103
+        Handler.fetched[self.path] += 1
+        time.sleep(LATENCY)
+        if self.path.endswith('.png'):
+            self._send(self.path.encode('utf-8'), 'image/png')
+            return
+        links = ''.join(f'<a href="/page{page}">p</a>' for page in range(PAGES))
+        self._send(f'<html><img src="{self.path.rstrip("/")}.png">{links}</html>'.encode('utf-8'), 'text/html')
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+@pytest.fixture(scope='module')
+def site():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def new_queue(request, tmp_path):
+    """ Factory of queue handles that share one crawl, like workers on different nodes.
+    """
+    client = FakeRedis()
+    queues = []
+
+    def create(lease_seconds=300.0, name='crawl', max_attempts=3):
+        if request.param == 'sqlite':
+            work_queue = SqliteWorkQueue(str(tmp_path / f'{name}.sqlite'), lease_seconds=lease_seconds,
+                                         max_attempts=max_attempts)
+        else:
+            work_queue = RedisWorkQueue(client, name=name, lease_seconds=lease_seconds, max_attempts=max_attempts)
+        queues.append(work_queue)
+        return work_queue
+    yield create
+    for work_queue in queues:
+        work_queue.close()
+
+
+def test_queue(new_queue):
+    work_queue = new_queue()
+    other = new_queue()
+    assert work_queue.finished(), "a new queue should be finished"
+    assert work_queue.add('https://x/a'), "new pages should be queued"
+    assert not other.add('https://x/a', 1), "pages should be queued once across workers"
+    assert other.add_image('https://x/a'), "images are tracked apart from pages"
+    assert not work_queue.add_image('https://x/a'), "images should be queued once across workers"
+    page = work_queue.claim()
+    assert page == Task(PAGE, 'https://x/a', 0), "tasks should be claimed in order"
+    image = other.claim()
+    assert image == Task(IMAGE, 'https://x/a', 0), "other workers should claim the next task"
+    assert work_queue.claim() is None, "nothing should be left to claim"
+    work_queue.complete(page)
+    assert not work_queue.finished(), "leased tasks keep the crawl going"
+    other.complete(image)
+    assert work_queue.finished(), "the crawl is finished once every task is complete"
+
+
+def test_expired_lease_is_requeued(new_queue):
+    work_queue = new_queue(lease_seconds=0.05)
+    work_queue.add('https://x/a')
+    assert work_queue.claim() is not None, "the task should be claimed"
+    assert new_queue().claim() is None, "a leased task should not be handed out twice"
+    time.sleep(0.1)
+    task = new_queue().claim()
+    assert task == Task(PAGE, 'https://x/a', 0), "the task of a dead worker should be handed out again"
+
+
+def test_failed_task_is_released(new_queue):
+    work_queue = new_queue(max_attempts=2)
+    work_queue.add('https://x/a')
+    task = work_queue.claim()
+    assert work_queue.release(task, 0.05), "a failed task should be handed out again"
+    assert work_queue.claim() is None, "a released task should wait for its retry"
+    assert not work_queue.finished(), "a task waiting for its retry keeps the crawl going"
+    time.sleep(0.06)
+    assert work_queue.claim() == task, "the task should be handed out again after the delay"
+    assert work_queue.release(task, 0.0), "the task should have a second retry"
+    assert work_queue.release(work_queue.claim(), 0.0) is False, "the task should run out of attempts"
+    assert work_queue.finished(), "a task out of attempts is done"
+
+
+def test_clear(new_queue):
+    work_queue = new_queue()
+    work_queue.add('https://x/a')
+    work_queue.complete(work_queue.claim())
+    work_queue.clear()
+    assert work_queue.add('https://x/a'), "a cleared queue should forget the seen urls"
+
+
+def test_concurrent_claims(new_queue):
+    work_queue = new_queue()
+    for page in range(50):
+        work_queue.add(f'https://x/{page}')
+    claimed = []
+
+    def claim():
+        other = new_queue()
+        task = other.claim()
+        while task:
+            claimed.append(task.url)
+            task = other.claim()
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(f'https://x/{page}' for page in range(50)), "every task should be claimed once"
+    assert not work_queue.finished(), "claimed tasks should stay leased until they are complete"
+
+
+def test_queue_from_url(tmp_path):
+    work_queue = queue_from_url(f'sqlite:///{tmp_path}/queue.sqlite?lease=5&attempts=1', name='fbi')
+    assert work_queue.path == f'{tmp_path}/queue-fbi.sqlite', "each unit should get its own database"
+    assert work_queue.lease_seconds == 5, "the lease should be configurable"
+    assert work_queue.max_attempts == 1, "the attempts should be configurable"
+    work_queue.close()
+    with pytest.raises(ValueError):
+        queue_from_url('amqp://localhost/')
+
+
+def distributed_crawl(site: str, new_queue, tmp_path, nodes: int) -> (list, list):
+    Handler.fetched.clear()
+    crawlers = [HtmlCrawler(get_logger(), think_time=0, max_depth=1, output=str(tmp_path / f'node{node}'),
+                            scheduler=HostScheduler(0.0)) for node in range(nodes)]
+    workers = [QueueWorker(get_logger(), new_queue(name=f'crawl{nodes}'), crawler, poll=0.01) for crawler in crawlers]
+    results = [None] * nodes
+
+    def run(node: int):
+        results[node] = workers[node].crawl([site])
+
+    threads = [threading.Thread(target=run, args=(node,)) for node in range(nodes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (results, workers)
+
+
+def test_distributed_crawl(site, new_queue, tmp_path):
+    (results, workers) = distributed_crawl(site, new_queue, tmp_path, nodes=3)
+    assert sum(files for (files, _) in results) == PAGES + 1, "every image should be downloaded once"
+    assert not any(exceptions for (_, exceptions) in results), "no exceptions expected"
+    assert max(Handler.fetched.values()) == 1, "no url should be fetched twice across workers"
+    assert len(Handler.fetched) == 2 * (PAGES + 1), "every page and image should be fetched"
+    tasks = [worker.pages + worker.images for worker in workers]
+    assert all(tasks), "every worker should take part"
+    assert sum(tasks) == 2 * (PAGES + 1), "every task should be run by exactly one worker"
+
+
+def test_consecutive_crawls(site, new_queue, tmp_path):
+    (first, _) = distributed_crawl(site, new_queue, tmp_path, nodes=2)
+    (second, _) = distributed_crawl(site, new_queue, tmp_path, nodes=2)
+    assert sum(files for (files, _) in first) == PAGES + 1, "the first run should download every image"
+    assert sum(files for (files, _) in second) == PAGES + 1, "the next run should crawl again, not find a done queue"
+
+
+def test_failed_tasks_are_retried(requests_mock, new_queue, tmp_path):
+    image = 'https://x/a.png'
+    requests_mock.get(image, [{'exc': RequestsConnectionError}, {'content': b'png', 'headers': {'Content-Type': 'image/png'}}])
+    crawler = HtmlCrawler(get_logger(), think_time=0, retry_backoff=0, output=str(tmp_path),
+                          scheduler=HostScheduler(0.0))
+    work_queue = new_queue()
+    work_queue.add_image(image)
+    (files_downloaded, exceptions) = QueueWorker(get_logger(), work_queue, crawler, poll=0.01).crawl([])
+    assert files_downloaded == 1, "a failed download should be retried"
+    assert not exceptions, "a task that succeeded on retry should not be reported"
+    assert requests_mock.call_count == 2, "the image should be fetched twice"